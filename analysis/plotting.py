@@ -1,10 +1,17 @@
-from pytz import utc
+"""
+Monthly average of the daily highs of a stock, run from the repository
+root with
+PLOT_SYMBOL=AAPL python -m analysis.plotting
+"""
+
+import os
+
 import justpy as jp
-import pandas as pd
+import numpy as np
+
+from services import history, rollups
 
-df = pd.read_csv("data/AAPL.csv", parse_dates=["Date"])
-df["Month"] = df["Date"].dt.strftime("%Y-%m")
-df_mon = df.groupby(["Month"]).mean()
+SYMBOL = os.getenv("PLOT_SYMBOL", "AAPL").upper()
 
 aapl_chart = """
 {
@@ -71,10 +78,22 @@ aapl_chart = """
 def app():
     wp = jp.QuasarPage(dark=True)
     hc1 = jp.HighCharts(a=wp, options=aapl_chart)
-    hc1.options.xAxis.categories = list(df_mon.index)
-    hc1.options.series[0].data = list(df_mon["High"])
+    hc1.options.title.text = f"{SYMBOL} Stock Price Variation"
+
+    # Daily bars from the history store, updated as new days come in
+    bars = history.get_bars(SYMBOL)
+    if bars is None:
+        jp.Div(text=f"No history available for {SYMBOL}", a=wp)
+        return wp
+    keys = rollups.period_keys(bars[0], "1mo")
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+    days = np.diff(np.append(starts, bars.shape[1]))
+    months = bars[0, starts].astype("datetime64[ms]").astype("datetime64[M]")
+    hc1.options.xAxis.categories = np.datetime_as_string(months).tolist()
+    hc1.options.series[0].data = (np.add.reduceat(bars[2], starts) / days).tolist()
 
     return wp
 
 
-jp.justpy(app)
+if __name__ == "__main__":
+    jp.justpy(app)
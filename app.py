@@ -1,19 +1,32 @@
 # Imports
 import datetime as dt
-import glob
 import json
+import math
 import os
+import queue
 import random
-from pathlib import Path
+import threading
+import time
 
-import pandas as pd
-import requests
-import yfinance as yf
 from dotenv import load_dotenv
-from flask import Flask, g, redirect, render_template, request, session, url_for
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    g,
+    redirect,
+    render_template,
+    request,
+    session,
+    url_for,
+)
 
-from models import contactus, stock, users
-from utils import Currency_Conversion, get_current_stock_price, send_mail
+# Services built on pandas and numpy (charts, fx, history, indicators,
+# rollups, stream, valuation and utils) are imported by the views that
+# use them, so a worker only serving the login pages never loads them
+from models import contactus, db, migrations, stock, users
+from services import mailer, metrics, orderbook, passwords, symbols
+from services.cache import TTLCache
 
 
 # Import environment variables
@@ -21,60 +34,160 @@ load_dotenv()
 RAZORPAY_ID = os.getenv("RAZORPAY_ID")
 RAZORPAY_PASSWD = os.getenv("RAZORPAY_PASSWD")
 
-# Initialize Payment Session
-request_payment = requests.Session()
-request_payment.auth = (RAZORPAY_ID, RAZORPAY_PASSWD)
-payment_data = json.load(open("payment_data.json"))
-
-# App configuration
-app = Flask(__name__, template_folder=os.path.abspath("./templates"))
-app.secret_key = "somekey"
-app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0
-
-# Create tables
-DB_PATH = "app.db"
-users.create_table(DB_PATH)
-contactus.create_table(DB_PATH)
-stock.create_table(DB_PATH)
-
-# List of stock symbols from URL containing NASDAQ listings
-url = (
-    "https://pkgstore.datahub.io/core/nasdaq-listings/nasdaq-listed_csv/" + 
-    "data/7665719fb51081ba0bd834fde71ce822/nasdaq-listed_csv.csv"
-)
-STOCK_SYMBOLS = (
-    pd
-    .read_csv(url)
-    .loc[:, "Symbol"]
-    .to_list()
-)
+DB_PATH = os.getenv("DB_PATH", "app.db")
+MAX_QUOTE_SYMBOLS = 200
+MIN_CHART_POINTS = 100
+MAX_CHART_POINTS = 10000
+# Seconds between keepalive comments on idle quote streams
+STREAM_KEEPALIVE = 15
+
+
+# Endpoints that never need the user in session
+PUBLIC_ENDPOINTS = {
+    "static",
+    "views.home",
+    "views.login",
+    "views.register",
+    "views.recovery",
+    "views.reset",
+    "views.metrics_page",
+}
+# Recently seen users, so most requests skip the database lookup
+user_cache = TTLCache(maxsize=4096, ttl=float(os.getenv("USER_CACHE_TTL", 300)))
+
+views = Blueprint("views", __name__)
+_payment = None
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def get_payment() -> tuple:
+    """Gets the Razorpay session and payment link template, created on first use
+
+    Returns:
+        tuple: (requests.Session, dict)
+    """
+    global _payment
+    if _payment is None:
+        import requests
+
+        request_payment = requests.Session()
+        request_payment.auth = (RAZORPAY_ID, RAZORPAY_PASSWD)
+        with open("payment_data.json") as f:
+            _payment = (request_payment, json.load(f))
+    return _payment
+
+
+def init_once():
+    """
+    Start-up work deferred to the first request of each worker: creates
+    the tables, brings existing databases up to the current schema, starts
+    sending queued mails in the background and recovers the order books
+    The stock symbol registry is loaded on its first lookup
+    """
+    global _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                migrations.migrate(DB_PATH)
+                db.close()
+                mailer.start(DB_PATH)
+                orderbook.get_engine(DB_PATH)
+                _initialized = True
+
+
+def start_timer():
+    """
+    Starts timing the request, before any other request hook
+    """
+    g.request_start = time.perf_counter()
+
+
+def record_timing(response):
+    """
+    Records the request latency per route, method and status
+    Streamed responses are timed until their first byte
+    """
+    start = g.get("request_start")
+    if start is not None:
+        # The route pattern, not the path, keeps the number of series bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - start, route, request.method, str(response.status_code)
+        )
+    return response
 
 
-@app.before_request
 def security():
     """
     Sets current user (g.user) to none and checks if the user is in session
     If in session then email is fetched and g.user is updated to that email
     """
     g.user = None
-    if "user_email" in session:
-        emails = users.getemail(DB_PATH)
-        try:
-            useremail = [
-                email for email in emails if email[0] == session["user_email"]
-            ][0]
-            g.user = useremail
-        except Exception as e:
-            print("Failed")
+    if request.endpoint in PUBLIC_ENDPOINTS:
+        return
+    email = session.get("user_email")
+    if email:
+        user = user_cache.get(email)
+        if user is None:
+            user = users.get_user(DB_PATH, email)
+            if user is not None:
+                user_cache.set(email, user)
+        g.user = user
+
+
+def close_db(exception):
+    """
+    Closes the database connections opened while handling the request
+    """
+    db.close()
 
 
-@app.route("/", methods=["GET", "POST"])
+def hashing_busy(exception):
+    """
+    Too many logins, registrations or resets are being hashed at once
+    Shown on the page of the form that was submitted
+    """
+    return (
+        render_template(
+            f"{request.endpoint.rsplit('.', 1)[-1]}.html",
+            error="The server is busy, please try again",
+        ),
+        503,
+    )
+
+
+def create_app() -> Flask:
+    """Creates the Flask app
+    Nothing is initialized until the first request (see init_once)
+
+    Returns:
+        Flask
+    """
+    app = Flask(__name__, template_folder=os.path.abspath("./templates"))
+    app.secret_key = "somekey"
+    app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0
+
+    # Request hooks run in the order they are registered
+    app.before_request(start_timer)
+    app.before_request(init_once)
+    app.before_request(security)
+    app.after_request(record_timing)
+    app.teardown_appcontext(close_db)
+    app.register_error_handler(passwords.HashingBusy, hashing_busy)
+    app.register_blueprint(views)
+    return app
+
+
+@views.route("/", methods=["GET", "POST"])
 def home():
     return redirect("/login")
 
 
-@app.route("/login", methods=["GET", "POST"])
+@views.route("/login", methods=["GET", "POST"])
 def login():
+    if "user_email" in session:
+        user_cache.invalidate(session["user_email"])
     session.clear()
     if not request.method == "POST":
         return render_template("login.html")
@@ -106,7 +219,7 @@ def login():
             return redirect("/index")
 
 
-@app.route("/register", methods=["GET", "POST"])
+@views.route("/register", methods=["GET", "POST"])
 def register():
     if not request.method == "POST":
         return render_template("register.html")
@@ -147,7 +260,7 @@ def register():
             return redirect("/index")
 
 
-@app.route("/recovery", methods=["GET", "POST"])
+@views.route("/recovery", methods=["GET", "POST"])
 def recovery():
     if not request.method == "POST":
         return render_template("recovery.html")
@@ -180,7 +293,7 @@ def recovery():
                 .replace('  ', '')
             )
             users.add_code(DB_PATH, code, email)
-            send_mail(email, subject, body)
+            mailer.queue_mail(DB_PATH, email, subject, body)
             
             return render_template(
                 "recovery.html",
@@ -188,7 +301,7 @@ def recovery():
             )
 
 
-@app.route("/reset", methods=["GET", "POST"])
+@views.route("/reset", methods=["GET", "POST"])
 def reset():
     """
     Reset Password Page
@@ -217,7 +330,7 @@ def reset():
             return redirect("/")
 
 
-@app.route("/index", methods=["GET", "POST"])
+@views.route("/index", methods=["GET", "POST"])
 def index():
     """
     Home Page
@@ -227,18 +340,21 @@ def index():
     return redirect("/")
 
 
-@app.route("/inv", methods=["GET", "POST"])
+@views.route("/inv", methods=["GET", "POST"])
 def inv():
     """
     Analysis Page - displays historical stock data
     """
     if g.user:
+        from services import history
+
         if request.method == "POST":
             stock_id = request.form["stocksym"]
             stock_id = stock_id.upper()
 
-            if stock_id in STOCK_SYMBOLS:
-                df_stock = yf.download(stock_id, start="1950-01-01", period="1d")
+            if symbols.is_valid(stock_id):
+                # Brings the local history store up to date for /pipe
+                bars = history.get_bars(stock_id)
 
             else:
                 return render_template(
@@ -246,50 +362,44 @@ def inv():
                     error="Incorrect Stock Symbol. Please Enter Valid Symbol",
                 )
 
-            df_stock.drop("Adj Close", axis="columns", inplace=True)
-            df_stock.reset_index(inplace=True)
-            df_stock["Date"] = pd.to_datetime(df_stock["Date"])
-            df_stock["Date"] = (
-                df_stock["Date"] - dt.datetime(1970, 1, 1)
-            ).dt.total_seconds()
-            df_stock["Date"] = df_stock["Date"] * 1000
-
-            files = glob.glob(
-                "/home/nvombat/Desktop/Investment-WebApp/analysis/data/*_mod.json"
-            )
-
-            if len(files) != 0:
-                file_rem = Path(files[0]).name
-                location = "/home/nvombat/Desktop/Investment-WebApp/analysis/data/"
-                os.remove(os.path.join(location, file_rem))
-
-            df_stock.to_json(
-                "/home/nvombat/Desktop/Investment-WebApp/analysis/data/"
-                + stock_id
-                + "_mod.json",
-                orient="values",
-            )
+            if bars is None:
+                return render_template(
+                    "inv.html",
+                    error="Stock data is unavailable right now. Please try again later",
+                )
             return render_template("inv.html", name=stock_id)
 
         return render_template("inv.html")
     return redirect("/")
 
 
-@app.route("/trade", methods=["GET", "POST"])
+@views.route("/trade", methods=["GET", "POST"])
 def trade():
     """
     Trade Page - Buy, Sell & View the price of stocks
     """
     if g.user:
+        from services import fx, valuation
+        from utils import get_current_stock_price
+
         user_email = g.user
-        transactions = stock.query(user_email[0], DB_PATH)
+        # None in workers that do not own the order books
+        engine = orderbook.get_engine(DB_PATH)
+        orders = engine.open_orders(user_email[0]) if engine else []
+
+        def render(**context):
+            # Holdings are only read and valued when the page is shown,
+            # trades that go through redirect back to it
+            transactions = stock.query(user_email[0], DB_PATH)
+            return render_template(
+                "trade.html",
+                transactions=transactions,
+                portfolio=valuation.get_portfolio(transactions),
+                orders=orders,
+                **context,
+            )
 
         if request.method == "POST":
-            url = str.__add__(
-                "http://data.fixer.io/api/latest?access_key=",
-                os.getenv("FIXER_API_KEY"),
-            )
-            c = Currency_Conversion(url)
             from_country = "USD"
             to_country = "INR"
 
@@ -299,23 +409,30 @@ def trade():
                 quant = request.form["amount"]
 
                 symb = symb.upper()
-                if symb in STOCK_SYMBOLS:
+                if symbols.is_valid(symb):
                     date = dt.datetime.now()
                     date = date.strftime("%m/%d/%Y, %H:%M:%S")
 
                     quant = int(quant)
-                    stock_price = get_current_stock_price(symb)
-                    total = quant * stock_price
+                    price = get_current_stock_price(symb)
+                    total = quant * price
 
-                    stock_price = "{:.2f}".format(stock_price)
+                    # Stored as a number, formatted for the receipt only
+                    stock_price = "{:.2f}".format(price)
                     total = "{:.2f}".format(total)
 
-                    stock_price_rupees = c.convert(
-                        from_country, to_country, stock_price
-                    )
+                    try:
+                        stock_price_rupees = fx.get_rates().convert(
+                            from_country, to_country, price
+                        )
+                    except fx.RatesUnavailable:
+                        return render(
+                            error="Exchange rates are unavailable right now. Please try again later"
+                        )
                     stock_price_int = int(stock_price_rupees)
                     stock_price_int *= 100
 
+                    # request_payment, payment_data = get_payment()
                     # ref_id = binascii.b2a_hex(os.urandom(20))
                     # payment_data["amount"] = stock_price_int
                     # payment_data["reference_id"] = ref_id.decode()
@@ -332,7 +449,7 @@ def trade():
                     # return redirect(payment_link, code=303)
 
                     stock.buy(
-                        "stock", (date, symb, stock_price, quant, user_email[0]), DB_PATH
+                        "stock", (date, symb, price, quant, user_email[0]), DB_PATH
                     )
 
                     subject = "Stock Transaction Receipt: BUY"
@@ -343,7 +460,7 @@ def trade():
                         Here is your transaction receipt for your {user_email[0]} account.
                         
                         You bought {quant} units of the {symb} stock on {date} 
-                        at a rate of $ {price} per stock unit. Your total expenditure was $ {total}. 
+                        at a rate of $ {stock_price} per stock unit. Your total expenditure was $ {total}. 
                             
                         Thank you.
                         
@@ -352,15 +469,13 @@ def trade():
                         .replace('  ', '')
 
                     )
-                    send_mail(user_email[0], subject, body)
+                    mailer.queue_mail(DB_PATH, user_email[0], subject, body)
 
-                    return redirect(url_for("trade"))
+                    return redirect(url_for(".trade"))
 
                 else:
-                    return render_template(
-                        "trade.html",
-                        error="Incorrect Stock Symbol. Please Enter Valid Symbol",
-                        transactions=transactions,
+                    return render(
+                        error="Incorrect Stock Symbol. Please Enter Valid Symbol"
                     )
 
             # SELLING
@@ -369,18 +484,26 @@ def trade():
                 quant = request.form["amount"]
                 symb = symb.upper()
 
-                if symb in STOCK_SYMBOLS:
+                if symbols.is_valid(symb):
                     quant = int(quant)
-                    stock_price = get_current_stock_price(symb)
-                    total = quant * stock_price
-                    stock_price = "{:.2f}".format(stock_price)
+                    price = get_current_stock_price(symb)
+                    total = quant * price
+                    # Stored as a number, formatted for the receipt only
+                    stock_price = "{:.2f}".format(price)
                     total = "{:.2f}".format(total)
 
                     date = dt.datetime.now()
                     date = date.strftime("%m/%d/%Y, %H:%M:%S")
-                    data = (symb, quant, user_email[0], stock_price)
 
-                    if stock.sell("stock", data, DB_PATH):
+                    # Shares promised to open sell orders cannot be sold again,
+                    # fills of orders the user no longer has the shares for
+                    # are dropped if the sell goes through another worker
+                    if engine is not None:
+                        sold = engine.sell(user_email[0], symb, quant, price, date)
+                    else:
+                        data = (date, symb, quant, user_email[0], price)
+                        sold = stock.sell("stock", data, DB_PATH)
+                    if sold:
                         subject = "Stock Transaction Receipt: SELL"
                         body = (
                             f"""
@@ -389,7 +512,7 @@ def trade():
                             Here is your transaction receipt for your {user_email[0]} account.
                             
                             You sold {quant} units of the {symb} stock on {date} 
-                            at a rate of $ {price} per stock unit. Your total earning was $ {total}. 
+                            at a rate of $ {stock_price} per stock unit. Your total earning was $ {total}. 
                                 
                             Thank you.
                             
@@ -397,29 +520,55 @@ def trade():
                             """
                             .replace('  ', '')
                         )
-                        send_mail(user_email[0], subject, body)
+                        mailer.queue_mail(DB_PATH, user_email[0], subject, body)
+
+                        return redirect(url_for(".trade"))
 
                     else:
-                        return render_template(
-                            "trade.html",
-                            error="You either DO NOT own this stock or are trying to sell more than you own! Please check again!",
-                            transactions=transactions,
+                        return render(
+                            error="You either DO NOT own this stock or are trying to sell more than you own! Please check again!"
                         )
 
                 else:
-                    return render_template(
-                        "trade.html",
-                        error="Incorrect Stock Symbol. Please Enter Valid Symbol",
-                        transactions=transactions,
+                    return render(
+                        error="Incorrect Stock Symbol. Please Enter Valid Symbol"
                     )
 
+            # LIMIT ORDERS, filled by the order book at the limit or better
+            elif request.form.get("lb1") or request.form.get("ls1"):
+                symb = request.form["stockid"].upper()
+                side = orderbook.BUY if request.form.get("lb1") else orderbook.SELL
+
+                if engine is None:
+                    error = "Limit orders are not available right now. Please try again later"
+                elif not request.form.get("limit"):
+                    error = "Please Enter a Limit Price"
+                elif symbols.is_valid(symb):
+                    try:
+                        engine.submit(
+                            user_email[0], symb, side,
+                            int(request.form["amount"]), float(request.form["limit"]),
+                        )
+                        return redirect(url_for(".trade"))
+                    except ValueError as e:
+                        error = str(e)
+                else:
+                    error = "Incorrect Stock Symbol. Please Enter Valid Symbol"
+                return render(error=error)
+
+            # CANCEL ORDER
+            elif request.form.get("c1"):
+                if engine is not None:
+                    engine.cancel(user_email[0], int(request.form["c1"]))
+                return redirect(url_for(".trade"))
+
             # FIND PRICE
             elif request.form.get("p1"):
                 sym = request.form["stockid"]
                 quant = request.form["amount"]
                 sym = sym.upper()
 
-                if sym in STOCK_SYMBOLS:
+                if symbols.is_valid(sym):
                     quant = int(quant)
                     price = get_current_stock_price(sym)
                     price = float(price)
@@ -444,22 +593,116 @@ def trade():
                         + " per unit"
                     )
 
-                    return render_template(
-                        "trade.html", transactions=transactions, error=err_str
-                    )
+                    return render(error=err_str)
 
                 else:
-                    return render_template(
-                        "trade.html",
-                        error="Incorrect Stock Symbol. Please Enter Valid Symbol",
-                        transactions=transactions,
+                    return render(
+                        error="Incorrect Stock Symbol. Please Enter Valid Symbol"
                     )
 
-        return render_template("trade.html", transactions=transactions)
+        return render()
     return redirect("/")
 
 
-@app.route("/about")
+def requested_symbols() -> tuple:
+    """Reads the comma separated symbols query parameter
+
+    Returns:
+        tuple: (symbols, None) or (None, error response)
+    """
+    requested = [
+        sym.strip().upper()
+        for sym in request.args.get("symbols", "").split(",")
+        if sym.strip()
+    ]
+    if not requested:
+        return None, ({"error": "You must provide symbols"}, 400)
+    elif len(requested) > MAX_QUOTE_SYMBOLS:
+        return None, ({"error": f"At most {MAX_QUOTE_SYMBOLS} symbols per request"}, 400)
+
+    invalid = [sym for sym in requested if not symbols.is_valid(sym)]
+    if invalid:
+        return None, ({"error": "Incorrect Stock Symbol: " + ", ".join(invalid)}, 400)
+    return requested, None
+
+
+@views.route("/api/quotes")
+def quotes():
+    """
+    Quotes API - current prices of many stocks in one call
+    e.g. /api/quotes?symbols=AAPL,MSFT
+    """
+    if not g.user:
+        return {"error": "You must be logged in"}, 401
+
+    requested, error = requested_symbols()
+    if error:
+        return error
+
+    from utils import get_current_stock_prices
+
+    try:
+        prices = get_current_stock_prices(requested)
+    except Exception as e:
+        print(f"Failed to get quotes: {e}")
+        return {"error": "Stock data is unavailable right now"}, 503
+    return {
+        "quotes": {
+            sym: None if math.isnan(price) else round(float(price), 2)
+            for sym, price in prices.items()
+        }
+    }
+
+
+@views.route("/stream")
+def stream_quotes():
+    """
+    Live quotes as Server-Sent Events
+    e.g. /stream?symbols=AAPL,MSFT
+    Every event is a JSON object with the prices that changed
+    """
+    if not g.user:
+        return {"error": "You must be logged in"}, 401
+
+    requested, error = requested_symbols()
+    if error:
+        return error
+
+    from services import stream
+
+    def events():
+        hub = stream.get_hub()
+        sub = hub.subscribe(requested)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    quotes = sub.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    # Comments keep proxies from closing idle connections
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"data: {json.dumps(quotes)}\n\n"
+        finally:
+            # Also runs when the client disconnects and the generator is closed
+            hub.unsubscribe(sub)
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@views.route("/metrics")
+def metrics_page():
+    """
+    Latency histograms in the Prometheus text format
+    """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@views.route("/about")
 def about():
     """
     About Us Page
@@ -469,7 +712,7 @@ def about():
     return redirect("/")
 
 
-@app.route("/doc")
+@views.route("/doc")
 def doc():
     """
     Trading Guide Page
@@ -479,7 +722,7 @@ def doc():
     return redirect("/")
 
 
-@app.route("/contact", methods=["GET", "POST"])
+@views.route("/contact", methods=["GET", "POST"])
 def contact():
     """
     Contact Us Page
@@ -505,24 +748,82 @@ def contact():
     return redirect("/")
 
 
-@app.route("/pipe", methods=["GET", "POST"])
+def parse_date(value: str) -> float:
+    """Parses a chart date given in ms since the epoch or as YYYY-MM-DD
+
+    Args:
+        value: Date from the query string
+
+    Returns:
+        float: Date in ms since the epoch, None if not given
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        date = dt.datetime.strptime(value, "%Y-%m-%d")
+        return (date - dt.datetime(1970, 1, 1)).total_seconds() * 1000
+
+
+@views.route("/pipe", methods=["GET", "POST"])
 def pipe():
     """
-    Analysis Substitute Page
+    Chart data for the Analysis page
+    e.g. /pipe?symbol=AAPL&start=2020-01-01&end=2021-01-01&points=1600
+    points caps the number of bars, long ranges are downsampled
+    format=bin returns the binary columnar format of services.charts
+    interval=1wk, 1mo or 1y returns weekly, monthly or yearly bars
+    indicators=sma20,rsi14,... appends indicator columns to every bar
     """
-    files = glob.glob(
-        "/home/nvombat/Desktop/Investment-WebApp/analysis/data/*_mod.json"
-    )
-    if len(files) == 0:
-        with open(
-            "/home/nvombat/Desktop/Investment-WebApp/analysis/data/AAPL.json"
-        ) as f:
-            r = json.load(f)
-            return {"res": r}
+    if not g.user:
+        return {"error": "You must be logged in"}, 401
+
+    from services import charts, indicators, rollups
+
+    symbol = request.args.get("symbol", "AAPL").upper()
+    if not symbols.is_valid(symbol):
+        return {"error": "Incorrect Stock Symbol. Please Enter Valid Symbol"}, 400
+    try:
+        start = parse_date(request.args.get("start"))
+        end = parse_date(request.args.get("end"))
+    except ValueError:
+        return {"error": "Dates must be in ms or YYYY-MM-DD"}, 400
+    points = request.args.get("points", type=int)
+    if points is not None:
+        points = min(max(points, MIN_CHART_POINTS), MAX_CHART_POINTS)
+
+    fmt = request.args.get("format", "json")
+    if fmt not in charts.ENCODERS:
+        return {"error": "Format must be json or bin"}, 400
+
+    interval = request.args.get("interval", "1d")
+    if interval != "1d" and interval not in rollups.PERIODS:
+        return {"error": "Interval must be 1d, 1wk, 1mo or 1y"}, 400
+
+    names = request.args.get("indicators", "")
+    names = tuple(dict.fromkeys(name for name in names.split(",") if name))
+    if not set(names) <= set(indicators.NAMES):
+        return {"error": f"Indicators must be in {', '.join(indicators.NAMES)}"}, 400
+
+    payload = charts.get_payload(symbol, start, end, points, fmt, interval, names)
+    if payload is None:
+        return {"error": "Stock data is unavailable right now"}, 503
+
+    if request.if_none_match.contains(payload.etag):
+        response = Response(status=304)
+    elif "gzip" in request.accept_encodings:
+        response = Response(payload.gzipped, mimetype=payload.mimetype)
+        response.headers["Content-Encoding"] = "gzip"
     else:
-        with open(files[0]) as f:
-            r = json.load(f)
-            return {"res": r}
+        response = Response(payload.body, mimetype=payload.mimetype)
+    response.set_etag(payload.etag)
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+app = create_app()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+"""
+Benchmarks and load tests.
+Run each one from the repository root with python -m benchmarks.<name>
+"""
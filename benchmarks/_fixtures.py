@@ -0,0 +1,20 @@
+"""
+Fixtures shared by the benchmarks and the tests
+Nothing happens on import, so benchmarks keep their own provider setup
+"""
+
+import numpy as np
+
+
+def synthetic_bars(n: int, seed: int = 0) -> np.ndarray:
+    """Random-walk daily bars in history.COLUMNS order"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.integers(1e5, 1e8, n).astype(np.float64)
+    dates = (np.datetime64("1970-01-01") + np.arange(n)).astype("datetime64[ms]")
+    return np.vstack(
+        [dates.astype(np.int64).astype(np.float64), open_, high, low, close, volume]
+    )
@@ -0,0 +1,46 @@
+"""
+Chart payload size and build time at full resolution and downsampled,
+for a synthetic 50-year daily series
+
+    python -m benchmarks.bench_downsample --years 50 --points 1600
+"""
+
+import argparse
+import gzip
+import json
+import time
+
+import numpy as np
+
+from benchmarks._fixtures import synthetic_bars
+from services.downsample import downsample
+
+
+def serialize(bars: np.ndarray) -> bytes:
+    return json.dumps({"res": bars.T.tolist()}, separators=(",", ":")).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=50)
+    parser.add_argument("--points", type=int, default=1600)
+    args = parser.parse_args()
+
+    bars = synthetic_bars(args.years * 252)
+    print(f"{bars.shape[1]} bars")
+    for name, method in (("full", None), ("lttb", "lttb"), ("minmax", "minmax")):
+        start = time.perf_counter()
+        selected = bars if method is None else downsample(bars, args.points, method)
+        body = serialize(selected)
+        elapsed = (time.perf_counter() - start) * 1000
+        close = np.interp(bars[0], selected[0], selected[4])
+        error = np.max(np.abs(close - bars[4]) / bars[4]) * 100
+        print(
+            f"{name:>7}: {selected.shape[1]:6d} bars  {len(body) / 1024:8.1f} KiB  "
+            f"{len(gzip.compress(body)) / 1024:7.1f} KiB gzip  {elapsed:6.1f} ms  "
+            f"max deviation {error:5.2f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
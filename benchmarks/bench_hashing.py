@@ -0,0 +1,75 @@
+"""
+Login throughput: password verifications per second through the hashing
+pool, overall and per worker process (one worker per core)
+
+    python -m benchmarks.bench_hashing --logins 200
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from services import passwords
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    stored = passwords.hash_password("abc123ABC")
+    print(f"scheme {stored.split('$')[1]} cost {stored.split('$')[2]}, {cores} cores")
+
+    start = time.perf_counter()
+    for _ in range(max(args.logins // 10, 1)):
+        passwords.verify_password("abc123ABC", stored)
+    inline = max(args.logins // 10, 1) / (time.perf_counter() - start)
+    print(f"{'inline':>10}: {inline:8.1f} logins/s")
+
+    for n_workers in args.workers or sorted({1, max(cores // 2, 1), cores}):
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            # Warm the workers up before timing
+            wait(
+                [
+                    pool.submit(passwords.verify_password, "x", stored)
+                    for _ in range(n_workers)
+                ]
+            )
+            start = time.perf_counter()
+            futures = [
+                pool.submit(passwords.verify_password, "abc123ABC", stored)
+                for _ in range(args.logins)
+            ]
+            wait(futures)
+            elapsed = time.perf_counter() - start
+        rate = args.logins / elapsed
+        print(
+            f"{n_workers:>3} workers: {rate:8.1f} logins/s  {rate / n_workers:8.1f} logins/s/core"
+        )
+
+    # Request threads going through passwords.run, including the queue limit
+    rejected = 0
+
+    def login():
+        nonlocal rejected
+        try:
+            passwords.run(passwords.verify_password, "abc123ABC", stored)
+        except passwords.HashingBusy:
+            rejected += 1
+
+    with ThreadPoolExecutor(max_workers=4 * passwords.QUEUE_DEPTH) as threads:
+        start = time.perf_counter()
+        wait([threads.submit(login) for _ in range(args.logins)])
+        elapsed = time.perf_counter() - start
+    print(
+        f"{'run()':>10}: {(args.logins - rejected) / elapsed:8.1f} logins/s "
+        f"with {passwords.WORKERS} workers, {rejected} rejected as busy "
+        f"(queue depth {passwords.QUEUE_DEPTH})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Lookup time of the models layer as the tables grow, with and without
+the keys and indexes of schema version 2. Both runs use the latest
+schema, so the same queries are timed against the same columns
+
+    python -m benchmarks.bench_lookup --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from models import db, migrations, stock, users
+
+# Added by version 2, dropped again for the unindexed run
+INDEXES = ("user_email", "user_code", "stock_email_symbol")
+
+
+def seed(path: str, n_rows: int, indexed: bool) -> None:
+    migrations.migrate(path, target=1)
+    conn = db.connect(path)
+    conn.executemany(
+        "INSERT INTO user VALUES (?, ?, ?, ?)",
+        (
+            (f"user{i}@gmail.com", f"User {i}", "x" * 192, str(1000 + i))
+            for i in range(n_rows)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO stock VALUES (?, ?, ?, ?, ?)",
+        (("19-09-2021", "AAPL", 150.0, 1, f"user{i}@gmail.com") for i in range(n_rows)),
+    )
+    conn.commit()
+    migrations.migrate(path)
+    if not indexed:
+        for index in INDEXES:
+            conn.execute(f"DROP INDEX {index}")
+        conn.commit()
+
+
+def time_lookups(path: str, n_rows: int, n_lookups: int) -> dict:
+    rng = random.Random(0)
+    ids = [rng.randrange(n_rows) for _ in range(n_lookups)]
+    lookups = {
+        "check_user_exist": lambda i: users.check_user_exist(
+            path, f"user{i}@gmail.com"
+        ),
+        "check_code": lambda i: users.check_code(path, str(1000 + i)),
+        "stock.query": lambda i: stock.query(f"user{i}@gmail.com", path),
+    }
+    res = {}
+    for name, fn in lookups.items():
+        start = time.perf_counter()
+        for i in ids:
+            fn(i)
+        res[name] = (time.perf_counter() - start) / n_lookups * 1e6
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000]
+    )
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>9} {'indexes':>7} {'check_user_exist':>17} {'check_code':>11} {'stock.query':>12}  (us/lookup)"
+    )
+    for n_rows in args.sizes:
+        for indexed in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.db")
+                seed(path, n_rows, indexed)
+                # Unindexed scans are slow, keep the run time bounded
+                n_lookups = (
+                    args.lookups if indexed else max(args.lookups * 1000 // n_rows, 5)
+                )
+                res = time_lookups(path, n_rows, n_lookups)
+                db.close()
+            print(
+                f"{n_rows:>9} {'yes' if indexed else 'no':>7} {res['check_user_exist']:>17.1f} "
+                f"{res['check_code']:>11.1f} {res['stock.query']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Overhead of the latency histograms: a timed call against a plain one,
+from one thread and from several threads sharing the same series
+
+    python -m benchmarks.bench_metrics --calls 200000 --threads 8
+"""
+
+import argparse
+import threading
+import time
+
+from services import metrics
+
+
+def noop():
+    return None
+
+
+def per_call(fn, calls: int, threads: int) -> float:
+    """Wall time per call of fn in nanoseconds, calls split over threads"""
+
+    def run():
+        for _ in range(calls // threads):
+            fn()
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    histogram = metrics.Histogram(
+        "bench_seconds", "Bench", ("function",), register=False
+    )
+    timed = metrics.timed(histogram)(noop)
+
+    def labelled():
+        with histogram.time("/trade"):
+            pass
+
+    print(f"{'threads':>7} {'plain':>10} {'@timed':>10} {'.time()':>10}")
+    for threads in sorted({1, args.threads}):
+        plain = per_call(noop, args.calls, threads)
+        print(
+            f"{threads:7d} {plain:7.0f} ns {per_call(timed, args.calls, threads):7.0f} ns "
+            f"{per_call(labelled, args.calls, threads):7.0f} ns"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Microbenchmarks of the models layer and utils hot paths on seeded
+databases, with regression checks against a stored baseline
+
+    python -m benchmarks.bench_models --sizes 1000 100000 1000000
+    python -m benchmarks.bench_models --save-baseline
+    python -m benchmarks.bench_models --baseline benchmarks/baselines/bench_models.json
+
+Exits with status 1 when an operation is slower than the baseline by more
+than --threshold (a fraction, 1.0 = twice as slow). Timings depend on the
+machine: save the baseline where the check runs. The default threshold
+leaves room for the noise of shared machines while still catching
+regressions such as a lost index, which cost orders of magnitude
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from models import db, migrations, stock, users
+from services import providers, symbols
+from utils import Currency_Conversion
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "bench_models.json")
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests", "data")
+OUTPUT = os.path.join(os.getenv("DATA_DIR", "data"), "benchmarks", "bench_models.json")
+RATES = {"EUR": 1.0, "USD": 1.18, "GBP": 0.86, "INR": 86.9, "JPY": 129.9}
+PASSWORD = "abc123ABC"
+
+
+def seed(path: str, n_rows: int) -> None:
+    """Creates a database at the current schema with n_rows users, each
+    holding one stock bought through the ledger"""
+    migrations.migrate(path)
+    pwd_hash = users.hash_pwd(PASSWORD)
+    conn = db.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO user VALUES (?, ?, ?, ?)",
+            (
+                (f"user{i}@gmail.com", f"User {i}", pwd_hash, str(1000 + i))
+                for i in range(n_rows)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO trades (Date, Email, Stock_Symbol, Side, Quantity, Price)"
+            " VALUES (?, ?, ?, 'BUY', 1000, 150.0)",
+            (
+                ("09/19/2021, 10:00:00", f"user{i}@gmail.com", "AAPL")
+                for i in range(n_rows)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO stock VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    "09/19/2021, 10:00:00",
+                    "AAPL",
+                    150.0,
+                    1000,
+                    f"user{i}@gmail.com",
+                    150000.0,
+                )
+                for i in range(n_rows)
+            ),
+        )
+
+
+def time_calls(fn, args: list, rounds: int = 5) -> float:
+    """Time per call of fn(*a) over args, in microseconds
+    The calls are split in rounds and the fastest round is kept, like
+    timeit, which is far less noisy than single calls"""
+    size = max(len(args) // rounds, 1)
+    best = float("inf")
+    for i in range(0, len(args), size):
+        chunk = args[i : i + size]
+        start = time.perf_counter()
+        for a in chunk:
+            fn(*a)
+        best = min(best, (time.perf_counter() - start) / len(chunk))
+    return best * 1e6
+
+
+def run(path: str, n_rows: int, repeat: int) -> dict:
+    rng = random.Random(0)
+
+    def emails(n):
+        return [f"user{rng.randrange(n_rows)}@gmail.com" for _ in range(n)]
+
+    converter = Currency_Conversion(rates=RATES)
+    # Hashing and full table reads cost far more per call, fewer calls suffice
+    n_hash = min(repeat, 10)
+    n_scan = max(3, min(repeat, 100000 // n_rows))
+    return {
+        "check_user_exist": time_calls(
+            lambda e: users.check_user_exist(path, e), [(e,) for e in emails(repeat)]
+        ),
+        "check_hash": time_calls(
+            lambda e: users.check_hash(path, PASSWORD, e),
+            [(e,) for e in emails(n_hash)],
+        ),
+        "getemail": time_calls(lambda: users.getemail(path), [()] * n_scan),
+        "stock.buy": time_calls(
+            lambda e: stock.buy(
+                "stock", ("10/01/2021, 10:00:00", "MSFT", 300.0, 1, e), path
+            ),
+            [(e,) for e in emails(repeat)],
+        ),
+        "stock.sell": time_calls(
+            lambda e: stock.sell("stock", ("19-09-2021", "AAPL", 1, e, 160.0), path),
+            [(e,) for e in emails(repeat)],
+        ),
+        "stock.query": time_calls(
+            lambda e: stock.query(e, path), [(e,) for e in emails(repeat)]
+        ),
+        "Currency_Conversion.convert": time_calls(
+            lambda amount: converter.convert("USD", "INR", amount),
+            [(rng.uniform(1, 1000),) for _ in range(repeat)],
+        ),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Lists the operations slower than the baseline by more than threshold"""
+    regressions = []
+    for size, ops in results["sizes"].items():
+        for op, us in ops.items():
+            base = baseline["sizes"].get(size, {}).get(op)
+            if base is not None and us > base * (1 + threshold):
+                regressions.append((size, op, base, us))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=1.0)
+    args = parser.parse_args()
+
+    # Nothing here should reach the network
+    providers.set_provider(providers.ReplayProvider(REPLAY_DIR))
+    symbols.set_symbols(["AAPL", "MSFT"])
+
+    results = {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    print(f"{'rows':>9} {'operation':>28} {'per call':>12}")
+    for n_rows in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            start = time.perf_counter()
+            seed(path, n_rows)
+            print(f"seeded {n_rows} rows in {time.perf_counter() - start:.1f}s")
+            ops = run(path, n_rows, args.repeat)
+            db.close()
+        results["sizes"][str(n_rows)] = ops
+        for op, us in ops.items():
+            print(f"{n_rows:>9} {op:>28} {us:>9.1f} us")
+
+    output = BASELINE if args.save_baseline else args.output
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for size, op, base, us in regressions:
+            print(f"REGRESSION {op} at {size} rows: {base:.1f} us -> {us:.1f} us")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression past {args.threshold:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Throughput of the matching engine: limit orders per second placed and
+matched, without and with the journal, and fills per second written to
+the ledger one by one against in batches
+
+    python -m benchmarks.bench_orderbook --orders 50000 --symbols 20
+
+Orders are random limit buys and sells within 2% of a fixed quote of
+100, from traders seeded with enough shares to sell, on a temporary
+database
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import models.stock as st
+from models import db, migrations
+from services.orderbook import BUY, SELL, MatchingEngine
+
+TRADERS = 50
+
+
+def setup(tmp: str, names: list) -> str:
+    path = os.path.join(tmp, "bench.db")
+    migrations.migrate(path)
+    traders = [
+        (f"trader{i}@example.com", name) for i in range(TRADERS) for name in names
+    ]
+    rows = [
+        (seq, seq, "01/01/2021, 00:00:00", email, name, BUY, 10**9, 100.0)
+        for seq, (email, name) in enumerate(traders, 1)
+    ]
+    st.apply_fills(rows, path, "seed")
+    return path
+
+
+def random_orders(n: int, names: list, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [
+        (
+            f"trader{rng.randrange(TRADERS)}@example.com",
+            rng.choice(names),
+            rng.choice((BUY, SELL)),
+            rng.randint(1, 100),
+            round(100 * rng.uniform(0.98, 1.02), 2),
+        )
+        for _ in range(n)
+    ]
+
+
+def place(engine: MatchingEngine, orders: list) -> tuple:
+    """Orders per second submitted, and the number of fills"""
+    fills = 0
+    start = time.perf_counter()
+    for order in orders:
+        fills += len(engine.submit(*order)[1])
+    return len(orders) / (time.perf_counter() - start), fills
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    names = [f"SYM{i}" for i in range(args.symbols)]
+    orders = random_orders(args.orders, names)
+    quote = lambda symbol: 100.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = setup(tmp, names)
+        print(f"{args.orders} limit orders on {args.symbols} symbols")
+
+        engine = MatchingEngine(path, None, quote=quote)
+        rate, fills = place(engine, orders)
+        print(f"{'no journal':>12} {rate:10.0f} orders/s, {fills} fills")
+
+        engine = MatchingEngine(
+            path, os.path.join(tmp, "orderbook.journal"), quote=quote
+        )
+        engine.recover()
+        rate, _ = place(engine, orders)
+        print(f"{'journal':>12} {rate:10.0f} orders/s")
+
+        pending = [fill[:8] for fill in engine.pending]
+        engine.pending = []
+        engine.stop()
+
+        # Sequence numbers above the watermark left by recover()
+        single = pending[: min(len(pending), 2000)]
+        start = time.perf_counter()
+        for fill in single:
+            st.apply_fills([fill], path, "single")
+        print(
+            f"{'one by one':>12} {len(single) / (time.perf_counter() - start):10.0f} fills/s"
+        )
+
+        start = time.perf_counter()
+        for i in range(0, len(pending), args.batch):
+            st.apply_fills(pending[i : i + args.batch], path, "batched")
+        print(
+            f"{f'batch {args.batch}':>12} {len(pending) / (time.perf_counter() - start):10.0f} fills/s"
+        )
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cold start of one app worker: time to import the app and resident memory
+after the import, after a first /login and after a first /trade
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --root /path/to/older/checkout
+
+Every run is a fresh interpreter on a temporary database, with replayed
+market data and mail discarded. --root measures another checkout of the
+repository, e.g. one from before a change, to compare against
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPLAY_DIR = os.path.join(ROOT, "tests", "data")
+
+# Runs in the worker, prints one JSON object
+PROBE = """
+import json, time
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+start = time.perf_counter()
+import app
+result = {"import_s": time.perf_counter() - start, "import_mb": rss_mb()}
+
+client = app.app.test_client()
+start = time.perf_counter()
+client.get("/login")
+result["login_s"] = time.perf_counter() - start
+result["login_mb"] = rss_mb()
+
+with client.session_transaction() as session:
+    session["user_email"] = "bench@gmail.com"
+app.users.insert(app.DB_PATH, "user", ("bench@gmail.com", "Bench", "x", 0))
+start = time.perf_counter()
+client.get("/trade")
+result["trade_s"] = time.perf_counter() - start
+result["trade_mb"] = rss_mb()
+print(json.dumps(result))
+"""
+
+
+def probe(root: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DB_PATH=os.path.join(tmp, "app.db"),
+            DATA_DIR=os.path.join(tmp, "data"),
+            MARKET_DATA_PROVIDER="replay",
+            REPLAY_DIR=REPLAY_DIR,
+            MAIL_BACKEND="null",
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=root,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--root", default=ROOT)
+    args = parser.parse_args()
+
+    runs = [probe(args.root) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts of {args.root}, medians")
+    print(f"{'stage':>8} {'time':>10} {'RSS':>10}")
+    for stage in ("import", "login", "trade"):
+        seconds = statistics.median(run[f"{stage}_s"] for run in runs)
+        mb = statistics.median(run[f"{stage}_mb"] for run in runs)
+        print(f"{stage:>8} {seconds * 1000:7.0f} ms {mb:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
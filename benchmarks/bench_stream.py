@@ -0,0 +1,112 @@
+"""
+Load test of the shared quote poller: many streaming clients on a few
+symbols should cost one upstream fetch per distinct symbol per tick
+
+    python -m benchmarks.bench_stream --clients 1000 --symbols 50 --ticks 5
+"""
+
+import argparse
+import queue
+import statistics
+import threading
+import time
+
+import pandas as pd
+
+from services.stream import QuoteHub
+
+
+class Upstream:
+    """Stands in for the quote provider, counting what is fetched"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.symbols = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, symbols):
+        with self.lock:
+            self.calls += 1
+            self.symbols += len(symbols)
+        time.sleep(self.latency)
+        now = time.time()
+        return pd.Series({sym: now for sym in symbols})
+
+
+def client(sub, stop: threading.Event, delays: list) -> None:
+    while not stop.is_set():
+        try:
+            quotes = sub.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        # Prices are the time the upstream answered
+        received = time.time()
+        delays.extend(received - sent for sent in quotes.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    upstream = Upstream(args.latency)
+    # Ticks are driven here instead of by the poller thread, to count them
+    hub = QuoteHub(fetch=upstream, interval=args.interval)
+    names = [f"SYM{i}" for i in range(args.symbols)]
+
+    stop = threading.Event()
+    delays = []
+    threads = []
+    subs = []
+    for i in range(args.clients):
+        sub = hub.subscribe([names[i % args.symbols]])
+        subs.append(sub)
+        thread = threading.Thread(target=client, args=(sub, stop, delays), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    ticks = []
+    for _ in range(args.ticks):
+        calls, fetched = upstream.calls, upstream.symbols
+        start = time.perf_counter()
+        changed = hub.poll_once()
+        ticks.append(
+            (
+                upstream.calls - calls,
+                upstream.symbols - fetched,
+                len(changed),
+                (time.perf_counter() - start) * 1000,
+            )
+        )
+        time.sleep(args.interval)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    for sub in subs:
+        hub.unsubscribe(sub)
+
+    print(f"{args.clients} clients on {args.symbols} symbols, {args.ticks} ticks")
+    print(
+        f"{'tick':>4} {'upstream calls':>15} {'symbols fetched':>16} {'changed':>8} {'poll+fan-out':>13}"
+    )
+    for i, (calls, fetched, changed, ms) in enumerate(ticks):
+        print(f"{i:4d} {calls:15d} {fetched:16d} {changed:8d} {ms:10.1f} ms")
+    print(f"Naive per-client polling would fetch {args.clients} symbols per tick")
+    if delays:
+        delays.sort()
+        print(
+            f"delivery latency: p50 {statistics.median(delays) * 1000:.1f} ms  "
+            f"p99 {delays[int(len(delays) * 0.99)] * 1000:.1f} ms  "
+            f"({len(delays)} updates delivered)"
+        )
+    print(f"symbols still polled after every client left: {len(hub.refcounts)}")
+
+
+if __name__ == "__main__":
+    main()
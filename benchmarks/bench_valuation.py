@@ -0,0 +1,70 @@
+"""
+Trade dashboard valuation time with warm quote caches, for portfolios of
+growing size (target: under 50 ms for hundreds of positions)
+
+    python -m benchmarks.bench_valuation --positions 10 100 500 2000
+"""
+
+import argparse
+import os
+import random
+import time
+
+import jinja2
+
+from services import valuation
+from utils import quote_cache
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+
+def holdings(n: int) -> list:
+    rng = random.Random(0)
+    return [
+        (
+            "09/19/2021, 10:00:00",
+            f"SYM{i}",
+            rng.uniform(10, 500),
+            rng.randint(1, 100),
+            "user@gmail.com",
+            rng.uniform(100, 50000),
+        )
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--positions", type=int, nargs="+", default=[10, 100, 500, 2000]
+    )
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATES))
+    template = env.get_template("trade.html")
+
+    print(f"{'positions':>9} {'value':>9} {'render':>9} {'total':>9}  (ms/request)")
+    for n in args.positions:
+        rows = holdings(n)
+        # Warm caches: every quote is already cached
+        for i, row in enumerate(rows):
+            quote_cache.set(row[1], row[2] * random.Random(i).uniform(0.8, 1.2))
+
+        value_time = render_time = 0.0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            portfolio = valuation.get_portfolio(rows, "USD")
+            middle = time.perf_counter()
+            template.render(transactions=rows, portfolio=portfolio)
+            end = time.perf_counter()
+            value_time += middle - start
+            render_time += end - middle
+
+        value_ms = value_time / args.repeat * 1000
+        render_ms = render_time / args.repeat * 1000
+        print(f"{n:9d} {value_ms:9.2f} {render_ms:9.2f} {value_ms + render_ms:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Chart wire formats for a 50-year daily series: the original /inv + /pipe
+path (to_json, json.load, serialize again), the JSON payload and the binary
+columnar payload of services.charts
+
+    python -m benchmarks.bench_wire --years 50
+"""
+
+import argparse
+import gzip
+import io
+import json
+import time
+
+import numpy as np
+
+from benchmarks._fixtures import synthetic_bars
+from services import charts, history
+
+
+def timed(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - start)
+    return res, best * 1000
+
+
+def original_path(bars: np.ndarray) -> bytes:
+    """DataFrame.to_json into a file, json.load in /pipe, then jsonify"""
+    f = io.StringIO()
+    history.to_frame(bars).to_json(f, orient="values")
+    f.seek(0)
+    return json.dumps({"res": json.load(f)}).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=50)
+    args = parser.parse_args()
+
+    bars = synthetic_bars(args.years * 252)
+    print(f"{bars.shape[1]} bars")
+    encoders = (
+        ("original", original_path, lambda body: json.loads(body)["res"]),
+        ("json", charts.encode_json, lambda body: json.loads(body)["res"]),
+        ("binary", charts.encode_binary, charts.decode_binary),
+    )
+    for name, encode, decode in encoders:
+        body, encode_ms = timed(lambda: encode(bars))
+        _, decode_ms = timed(lambda: decode(body))
+        _, gzip_ms = timed(lambda: gzip.compress(body, compresslevel=6), repeat=1)
+        print(
+            f"{name:>9}: {len(body) / 1024:8.1f} KiB  "
+            f"{len(gzip.compress(body, compresslevel=6)) / 1024:7.1f} KiB gzip  "
+            f"encode {encode_ms:7.2f} ms  decode {decode_ms:7.2f} ms  gzip {gzip_ms:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
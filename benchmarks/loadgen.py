@@ -0,0 +1,383 @@
+"""
+End-to-end load generator for the Flask app: concurrent virtual users
+register, log in, trade, and open the analysis page and chart data, and
+the latency percentiles and error rate of every route are reported
+
+    python -m benchmarks.loadgen --users 20 --duration 30
+    python -m benchmarks.loadgen --mix buy=50,sell=20,pipe=30 --symbols 20
+    python -m benchmarks.loadgen --url http://127.0.0.1:5000 --users 5
+
+Without --url the app is started locally in a subprocess, on a temporary
+database and data directory, with market data and exchange rates replayed
+from synthetic CSV files and mail discarded, so nothing reaches the
+network. With --url an already running app is loaded instead, its symbols
+must then include the ones given by --symbols (SYM0, SYM1, ...)
+"""
+
+import argparse
+import datetime as dt
+import logging
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+import requests
+
+from benchmarks._fixtures import synthetic_bars
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Relative weight of each operation a virtual user picks from
+MIX = {
+    "buy": 30,
+    "sell": 15,
+    "price": 15,
+    "portfolio": 5,
+    "inv": 10,
+    "pipe": 20,
+    "login": 5,
+}
+PASSWORD = "abc123ABC"
+# Where the app redirects requests without a logged in user
+LOGGED_OUT = ("/", "/login")
+STARTUP_TIMEOUT = 60
+# Message paragraph of the trade and analysis pages, errors are shown in it
+MESSAGE = re.compile(r'<p id="the-msg">(.*?)</p>', re.S)
+
+
+def parse_mix(text: str) -> dict:
+    """Parses an operation mix such as buy=30,sell=15,pipe=20"""
+    mix = {}
+    for item in text.split(","):
+        op, _, weight = item.partition("=")
+        op = op.strip()
+        if op not in MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {op}")
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def write_replay_data(directory: str, n_symbols: int, n_days: int) -> list:
+    """Writes random-walk daily bars ending today for SYM0..SYMn, in the
+    format read by the replay provider"""
+    dates = pd.bdate_range(end=dt.date.today(), periods=n_days)
+    names = []
+    for i in range(n_symbols):
+        bars = synthetic_bars(n_days, seed=i)
+        df = pd.DataFrame(
+            {
+                "Date": dates.strftime("%Y-%m-%d"),
+                "Open": bars[1].round(2),
+                "High": bars[2].round(2),
+                "Low": bars[3].round(2),
+                "Close": bars[4].round(2),
+                "Adj Close": bars[4].round(2),
+                "Volume": bars[5].astype("int64"),
+            }
+        )
+        name = f"SYM{i}"
+        df.to_csv(os.path.join(directory, f"{name}.csv"), index=False)
+        names.append(name)
+    return names
+
+
+def start_server(tmp: str, port: int, replay_dir: str) -> subprocess.Popen:
+    """Starts the app in a subprocess on a temporary database and data
+    directory, with replayed market data and mail discarded"""
+    env = dict(
+        os.environ,
+        DB_PATH=os.path.join(tmp, "app.db"),
+        DATA_DIR=os.path.join(tmp, "data"),
+        MARKET_DATA_PROVIDER="replay",
+        REPLAY_DIR=replay_dir,
+        MAIL_BACKEND="null",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.loadgen", "serve", "--port", str(port)],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+def wait_ready(url: str, server: subprocess.Popen = None) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"App exited with status {server.returncode}")
+        try:
+            if requests.get(f"{url}/login", timeout=1).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App did not answer on {url} within {STARTUP_TIMEOUT}s")
+
+
+def serve(port: int) -> None:
+    """Runs the app with a threaded development server"""
+    from werkzeug.serving import run_simple
+
+    from app import app
+
+    # One log line per request would cost more than some of the requests
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    run_simple("127.0.0.1", port, app, threaded=True)
+
+
+class Stats:
+    """Latencies and errors per route, shared by the virtual users"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        with self.lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class VirtualUser:
+    """One browser session, issuing requests one after the other"""
+
+    def __init__(self, url: str, email: str, names: list, stats: Stats, seed: int):
+        self.url = url
+        self.email = email
+        self.names = names
+        self.stats = stats
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        self.logged_in = False
+        # Shares bought by this user, so sells are for shares it owns
+        self.holdings = defaultdict(int)
+
+    def request(
+        self,
+        route: str,
+        method: str,
+        path: str,
+        redirects: bool = False,
+        check=None,
+        **kwargs,
+    ) -> bool:
+        start = time.perf_counter()
+        try:
+            # Redirects are what the forms answer on success, not followed,
+            # except the one to the login page, sent once the session is lost
+            response = self.session.request(
+                method, self.url + path, allow_redirects=False, timeout=30, **kwargs
+            )
+            location = response.headers.get("Location")
+            if location in LOGGED_OUT:
+                self.logged_in = False
+            ok = response.status_code < 400 and location not in LOGGED_OUT
+            if redirects:
+                # Forms that only redirect on success, errors render the form
+                ok = ok and location is not None
+            elif check is not None:
+                # Pages rendered either way, check takes the page message
+                match = MESSAGE.search(response.text)
+                ok = ok and check(match.group(1).strip() if match else "")
+        except requests.RequestException:
+            ok = False
+        self.stats.record(route, time.perf_counter() - start, ok)
+        return ok
+
+    def trade(self, route: str, button: str, symbol: str, amount: int) -> bool:
+        form = {"stockid": symbol, "amount": str(amount), button: button}
+        if button == "p1":
+            check = lambda message: message.startswith("The price for")
+            return self.request(route, "POST", "/trade", check=check, data=form)
+        # Buys and sells redirect back to the trade page when they go through
+        return self.request(route, "POST", "/trade", True, data=form)
+
+    def buy(self) -> None:
+        symbol = self.rng.choice(self.names)
+        amount = self.rng.randint(1, 10)
+        if self.trade("POST /trade buy", "b1", symbol, amount):
+            self.holdings[symbol] += amount
+
+    def sell(self) -> None:
+        owned = [symbol for symbol, amount in self.holdings.items() if amount]
+        if not owned:
+            self.buy()
+            return
+        symbol = self.rng.choice(owned)
+        amount = self.rng.randint(1, self.holdings[symbol])
+        if self.trade("POST /trade sell", "s1", symbol, amount):
+            self.holdings[symbol] -= amount
+
+    def sign_in(self, route: str, path: str, form: dict, stop: threading.Event) -> None:
+        # The app turns logins and registrations away while too many
+        # passwords are hashed, a user tries again like in a browser
+        while not stop.is_set():
+            if self.request(route, "POST", path, True, data=form):
+                self.logged_in = True
+                return
+            time.sleep(self.rng.uniform(0.5, 1.0))
+
+    def login(self, stop: threading.Event) -> None:
+        form = {"email": self.email, "password": PASSWORD}
+        self.sign_in("POST /login", "/login", form, stop)
+
+    def run(self, ops: list, weights: list, stop: threading.Event) -> None:
+        form = {
+            "name": "Load Test",
+            "email": self.email,
+            "password": PASSWORD,
+            "rpassword": PASSWORD,
+        }
+        self.sign_in("POST /register", "/register", form, stop)
+        while not stop.is_set():
+            if not self.logged_in:
+                # A failed login ends the session, as in the app
+                self.login(stop)
+                continue
+            op = self.rng.choices(ops, weights)[0]
+            if op == "buy":
+                self.buy()
+            elif op == "sell":
+                self.sell()
+            elif op == "price":
+                symbol = self.rng.choice(self.names)
+                self.trade("POST /trade price", "p1", symbol, self.rng.randint(1, 10))
+            elif op == "portfolio":
+                self.request("GET /trade", "GET", "/trade")
+            elif op == "inv":
+                form = {"stocksym": self.rng.choice(self.names)}
+                # The analysis page only shows a message when it failed
+                self.request(
+                    "POST /inv",
+                    "POST",
+                    "/inv",
+                    check=lambda message: not message,
+                    data=form,
+                )
+            elif op == "pipe":
+                params = {
+                    "symbol": self.rng.choice(self.names),
+                    "points": self.rng.choice([500, 1600]),
+                    "format": self.rng.choice(["json", "bin"]),
+                }
+                self.request("GET /pipe", "GET", "/pipe", params=params)
+            elif op == "login":
+                self.logged_in = False
+                self.login(stop)
+
+
+def run_load(url: str, names: list, users: int, duration: float, mix: dict) -> tuple:
+    stats = Stats()
+    stop = threading.Event()
+    ops, weights = list(mix), list(mix.values())
+    tag = f"{os.getpid()}-{int(time.time())}"
+    threads = []
+    for i in range(users):
+        user = VirtualUser(url, f"load{i}-{tag}@example.com", names, stats, seed=i)
+        thread = threading.Thread(
+            target=user.run, args=(ops, weights, stop), daemon=True
+        )
+        threads.append(thread)
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - start
+
+
+def report(stats: Stats, elapsed: float) -> None:
+    print(
+        f"{'route':<20} {'count':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}"
+    )
+    total = errors = 0
+    for route in sorted(stats.latencies):
+        latencies = sorted(stats.latencies[route])
+        count = len(latencies)
+        total += count
+        errors += stats.errors[route]
+        print(
+            f"{route:<20} {count:7d} {count / elapsed:8.1f} "
+            f"{percentile(latencies, 0.50) * 1000:6.1f} ms "
+            f"{percentile(latencies, 0.95) * 1000:6.1f} ms "
+            f"{percentile(latencies, 0.99) * 1000:6.1f} ms "
+            f"{stats.errors[route] / count:6.1%}"
+        )
+    # Only trades that went through
+    trades = sum(
+        len(stats.latencies[route]) - stats.errors[route]
+        for route in ("POST /trade buy", "POST /trade sell")
+    )
+    print(
+        f"{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s, "
+        f"{trades / elapsed:.1f} trades/s, {errors / max(total, 1):.2%} errors"
+    )
+
+
+def main():
+    if sys.argv[1:2] == ["serve"]:
+        parser = argparse.ArgumentParser(
+            description="Runs the app for the load generator"
+        )
+        parser.add_argument("serve")
+        parser.add_argument("--port", type=int, default=5000)
+        serve(parser.parse_args().port)
+        return
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--mix", type=parse_mix, default=dict(MIX))
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--days", type=int, default=2520)
+    args = parser.parse_args()
+
+    names = [f"SYM{i}" for i in range(args.symbols)]
+    if args.url:
+        wait_ready(args.url)
+        stats, elapsed = run_load(args.url, names, args.users, args.duration, args.mix)
+        report(stats, elapsed)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        replay_dir = os.path.join(tmp, "replay")
+        os.makedirs(replay_dir)
+        write_replay_data(replay_dir, args.symbols, args.days)
+        url = f"http://127.0.0.1:{args.port}"
+        server = start_server(tmp, args.port, replay_dir)
+        try:
+            wait_ready(url, server)
+            print(
+                f"{args.users} users for {args.duration:.0f}s on {url}, mix {args.mix}"
+            )
+            stats, elapsed = run_load(url, names, args.users, args.duration, args.mix)
+        finally:
+            # Interrupted rather than terminated, so the app exits cleanly
+            # and its password hashing processes with it
+            server.send_signal(signal.SIGINT)
+            server.wait()
+        report(stats, elapsed)
+
+
+if __name__ == "__main__":
+    main()
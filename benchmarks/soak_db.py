@@ -0,0 +1,103 @@
+"""
+Soak test for the models layer: runs many simulated requests against a
+seeded database and reports per-request latency and open file descriptors
+for one connection per call (the old behaviour) and for models.db
+
+    python -m benchmarks.soak_db --requests 20000
+"""
+
+import argparse
+import gc
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from models import db, migrations, stock, users
+
+
+def open_fds() -> int:
+    """Counts the file descriptors open in this process (Linux only)"""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def seed(path: str, n_users: int) -> None:
+    migrations.migrate(path)
+    conn = db.connect(path)
+    conn.executemany(
+        "INSERT INTO user VALUES (?, ?, ?, ?)",
+        ((f"user{i}@gmail.com", f"User {i}", "x" * 192, "0") for i in range(n_users)),
+    )
+    conn.executemany(
+        "INSERT INTO stock(Date, Stock_Symbol, Price, Quantity, Email, Cost) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            ("19-09-2021", "AAPL", 150.0, 1, f"user{i}@gmail.com", 150.0)
+            for i in range(n_users)
+        ),
+    )
+    conn.commit()
+    db.close()
+
+
+def request_per_call(path: str, email: str) -> None:
+    """One request as handled before models.db: a new connection per query"""
+    for query in (
+        f"SELECT * FROM user WHERE Email='{email}'",
+        f"SELECT Name FROM user WHERE Email='{email}'",
+        f"SELECT * FROM stock WHERE Email ='{email}'",
+    ):
+        conn = sqlite3.connect(path)
+        conn.execute(query).fetchall()
+
+
+def request_pooled(path: str, email: str) -> None:
+    """One request with models.db, closed on teardown like the Flask app"""
+    users.check_user_exist(path, email)
+    users.getname(path, (email,))
+    stock.query(email, path)
+    db.close()
+
+
+def run(fn, path: str, n_requests: int, n_users: int) -> dict:
+    gc.collect()
+    fds_before = open_fds()
+    latencies = []
+    for i in range(n_requests):
+        email = f"user{i % n_users}@gmail.com"
+        start = time.perf_counter()
+        fn(path, email)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    fds_after = open_fds()
+    gc.collect()
+    latencies.sort()
+    return {
+        "mean_us": statistics.fmean(latencies),
+        "p99_us": latencies[int(len(latencies) * 0.99) - 1],
+        "fd_growth": fds_after - fds_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "soak.db")
+        seed(path, args.users)
+        for name, fn in (("per-call", request_per_call), ("pooled", request_pooled)):
+            res = run(fn, path, args.requests, args.users)
+            print(
+                f"{name:>9}: mean {res['mean_us']:8.1f} us  "
+                f"p99 {res['p99_us']:8.1f} us  fd growth {res['fd_growth']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
-import sqlite3 as s
+from models import db, migrations
+from services import metrics
 
 
 def create_table(path: str) -> None:
     """Creates the contact_us table in the database
+    The schema is defined by the migrations, the database is brought up
+    to the latest version
 
     Args:
         path: Path to database
@@ -10,14 +13,10 @@ def create_table(path: str) -> None:
     Returns:
         None
     """
-    conn = s.connect(path)
-    cur = conn.cursor()
-
-    tbl = "CREATE TABLE IF NOT EXISTS contact_us(Email TEXT, Message TEXT)"
-    cur.execute(tbl)
-    conn.commit()
+    migrations.migrate(path)
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def insert(email: str, message: str, path: str) -> None:
     """Inserts message and email id from Contact_Us Page
 
@@ -29,7 +28,7 @@ def insert(email: str, message: str, path: str) -> None:
     Returns:
         None
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     insrt = f"INSERT INTO contact_us VALUES('{email}','{message}')"
@@ -0,0 +1,107 @@
+import os
+import random
+import sqlite3 as s
+import threading
+import time
+from typing import Any, Callable
+
+# Applied to every new connection
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+    f"PRAGMA cache_size={int(os.getenv('SQLITE_CACHE_SIZE', -16000))}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+_local = threading.local()
+
+
+def connect(path: str) -> s.Connection:
+    """Gets the connection to a database for the current thread
+    The connection is opened and tuned on first use, then reused
+    until close() is called from the same thread
+
+    Args:
+        path: Path to database
+
+    Returns:
+        sqlite3.Connection
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = s.connect(path, timeout=5)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        connections[path] = conn
+    return conn
+
+
+def close(path: str = None) -> None:
+    """Closes the connections of the current thread
+    Uncommitted changes are rolled back
+
+    Args:
+        path: Path to database (all databases if None)
+
+    Returns:
+        None
+    """
+    connections = getattr(_local, "connections", None)
+    if not connections:
+        return
+
+    paths = list(connections) if path is None else [path]
+    for key in paths:
+        conn = connections.pop(key, None)
+        if conn is not None:
+            conn.close()
+
+
+def is_busy(error: Exception) -> bool:
+    """Checks if an error means another connection holds the write lock
+
+    Args:
+        error: Exception raised by sqlite3
+
+    Returns:
+        bool
+    """
+    msg = str(error).lower()
+    return isinstance(error, s.OperationalError) and (
+        "database is locked" in msg or "database is busy" in msg
+    )
+
+
+def immediate(path: str, fn: Callable[[s.Cursor], Any], retries: int = 5) -> Any:
+    """Runs fn inside a BEGIN IMMEDIATE transaction and commits it
+    The write lock is taken up front, so concurrent writers are serialized
+    instead of failing at commit. If the database stays busy past
+    busy_timeout the transaction is retried with jittered backoff
+
+    Args:
+        path: Path to database
+        fn: Function receiving a cursor, its result is returned
+        retries: Attempts after the first one when the database is busy
+
+    Returns:
+        Any: Result of fn
+    """
+    conn = connect(path)
+    for attempt in range(retries + 1):
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            result = fn(cur)
+            conn.commit()
+            return result
+        except Exception as e:
+            conn.rollback()
+            if not is_busy(e) or attempt == retries:
+                raise
+        time.sleep(0.01 * 2**attempt * random.random())
@@ -0,0 +1,171 @@
+import sqlite3 as s
+import sys
+import time
+
+from models import db
+
+
+def _create_tables(cur: s.Cursor) -> None:
+    """Version 1: the tables as the app first created them"""
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS user(Email TEXT, Name TEXT, Password TEXT, Code TEXT)"
+    )
+    cur.execute("CREATE TABLE IF NOT EXISTS contact_us(Email TEXT, Message TEXT)")
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS stock(Date Date, Stock_Symbol Text, Price real, Quantity int, Email Text)"
+    )
+
+
+def _add_keys(cur: s.Cursor) -> None:
+    """Version 2: unique keys on user and stock, index on the reset code
+    Duplicate rows left by concurrent requests are merged first
+    """
+    cur.execute(
+        "DELETE FROM user WHERE rowid NOT IN (SELECT MIN(rowid) FROM user GROUP BY Email)"
+    )
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS user_email ON user(Email)")
+    cur.execute("CREATE INDEX IF NOT EXISTS user_code ON user(Code)")
+
+    cur.execute("""
+        UPDATE stock SET Quantity = (
+            SELECT SUM(dup.Quantity) FROM stock AS dup
+            WHERE dup.Email = stock.Email AND dup.Stock_Symbol = stock.Stock_Symbol
+        )
+        WHERE rowid IN (
+            SELECT MIN(rowid) FROM stock
+            GROUP BY Email, Stock_Symbol HAVING COUNT(*) > 1
+        )
+        """)
+    cur.execute("""
+        DELETE FROM stock WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM stock GROUP BY Email, Stock_Symbol
+        )
+        """)
+    cur.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS stock_email_symbol ON stock(Email, Stock_Symbol)"
+    )
+
+
+def _add_ledger(cur: s.Cursor) -> None:
+    """Version 3: append-only trades ledger and cost basis on holdings
+    Every existing holding is recorded as its opening trade, so replaying
+    the ledger reproduces the current holdings
+    """
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(stock)")]
+    if "Cost" not in columns:
+        cur.execute("ALTER TABLE stock ADD COLUMN Cost real DEFAULT 0")
+        cur.execute("UPDATE stock SET Cost = Price * Quantity")
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS trades(
+            Id INTEGER PRIMARY KEY,
+            Date Date,
+            Email Text,
+            Stock_Symbol Text,
+            Side Text CHECK (Side IN ('BUY', 'SELL')),
+            Quantity int,
+            Price real
+        )
+        """)
+    cur.execute("CREATE INDEX IF NOT EXISTS trades_email ON trades(Email)")
+    if cur.execute("SELECT COUNT(*) FROM trades").fetchone()[0] == 0:
+        cur.execute("""
+            INSERT INTO trades(Date, Email, Stock_Symbol, Side, Quantity, Price)
+            SELECT Date, Email, Stock_Symbol, 'BUY', Quantity, Price FROM stock
+            ORDER BY rowid
+            """)
+    for action in ("UPDATE", "DELETE"):
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trades_no_{action.lower()} "
+            f"BEFORE {action} ON trades "
+            "BEGIN SELECT RAISE(ABORT, 'trades is append-only'); END"
+        )
+
+
+def _add_outbox(cur: s.Cursor) -> None:
+    """Version 4: outbox of mails waiting to be sent"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS outbox(
+            Id INTEGER PRIMARY KEY,
+            Email Text,
+            Subject Text,
+            Body Text,
+            Status Text DEFAULT 'pending',
+            Attempts int DEFAULT 0,
+            Next_Attempt real,
+            Last_Error Text,
+            Created real,
+            Lease_Owner Text
+        )
+        """)
+    cur.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox(Status, Next_Attempt)")
+
+
+def _add_fill_watermark(cur: s.Cursor) -> None:
+    """Version 5: last order book fill written to the ledger, per journal"""
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS fill_watermark(Journal Text PRIMARY KEY, Seq int)"
+    )
+
+
+# (version, description, function) in the order they are applied
+MIGRATIONS = [
+    (1, "create tables", _create_tables),
+    (2, "add keys and indexes", _add_keys),
+    (3, "add trades ledger", _add_ledger),
+    (4, "add mail outbox", _add_outbox),
+    (5, "add order book fill watermark", _add_fill_watermark),
+]
+
+
+def get_version(path: str) -> int:
+    """Gets the schema version of a database
+
+    Args:
+        path: Path to database
+
+    Returns:
+        int: Version of the last migration applied (0 for a new database)
+    """
+    conn = db.connect(path)
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(path: str, target: int = None) -> int:
+    """Upgrades a database in place to the latest schema version
+    Each migration runs in its own transaction together with the
+    version bump, so a failed migration leaves the previous version intact
+
+    Args:
+        path: Path to database
+        target: Version to stop at (latest if None)
+
+    Returns:
+        int: Schema version after migrating
+    """
+    version = get_version(path)
+    target = MIGRATIONS[-1][0] if target is None else target
+
+    for number, description, fn in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+
+        def apply(cur, number=number, fn=fn):
+            # Another process may have migrated while we waited for the lock
+            if cur.execute("PRAGMA user_version").fetchone()[0] >= number:
+                return False
+            fn(cur)
+            cur.execute(f"PRAGMA user_version={number}")
+            return True
+
+        if db.immediate(path, apply):
+            print(f"Applied migration {number}: {description}")
+        version = number
+    return get_version(path)
+
+
+if __name__ == "__main__":
+    test_path = sys.argv[1] if len(sys.argv) > 1 else "app.db"
+    start = time.perf_counter()
+    print(f"{test_path} is at version {migrate(test_path)}")
+    print(f"Took {time.perf_counter() - start:.2f}s")
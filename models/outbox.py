@@ -0,0 +1,153 @@
+import time
+
+from models import db, migrations
+from services import metrics
+
+
+def create_table(path: str) -> None:
+    """Creates the outbox table in the database
+    The schema is owned by the migrations
+
+    Args:
+        path: Path to database
+
+    Returns:
+        None
+    """
+    migrations.migrate(path)
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
+def enqueue(path: str, email: str, subject: str, body: str) -> int:
+    """Adds a mail to the outbox
+
+    Args:
+        path: Path to database
+        email: Recipient email id
+        subject: Mail subject
+        body: Mail body
+
+    Returns:
+        int: Outbox id of the mail
+    """
+    now = time.time()
+
+    def insert(cur):
+        cur.execute(
+            "INSERT INTO outbox(Email, Subject, Body, Next_Attempt, Created) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (email, subject, body, now, now),
+        )
+        return cur.lastrowid
+
+    return db.immediate(path, insert)
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
+def claim(path: str, limit: int, lease: float, owner: str) -> list:
+    """Claims a batch of mails that are due for sending
+    Claimed mails are leased to the caller; if it dies before marking
+    them, they become due again once the lease expires
+
+    Args:
+        path: Path to database
+        limit: Maximum number of mails
+        lease: Seconds the mails stay claimed
+        owner: Lease token, unique per claim
+
+    Returns:
+        list: (Id, Email, Subject, Body, Attempts) rows
+    """
+    now = time.time()
+
+    def lease_batch(cur):
+        cur.execute(
+            "UPDATE outbox SET Status='sending', Next_Attempt=?, Lease_Owner=? "
+            "WHERE Id IN ("
+            "SELECT Id FROM outbox WHERE Status IN ('pending', 'sending') "
+            "AND Next_Attempt<=? ORDER BY Next_Attempt LIMIT ?"
+            ") RETURNING Id, Email, Subject, Body, Attempts",
+            (now + lease, owner, now, limit),
+        )
+        return sorted(cur.fetchall())
+
+    return db.immediate(path, lease_batch)
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
+def mark_sent(path: str, ids: list, owner: str) -> int:
+    """Marks mails as sent
+    Mails whose lease expired and was claimed by another worker are left alone
+
+    Args:
+        path: Path to database
+        ids: Outbox ids
+        owner: Lease token the mails were claimed with
+
+    Returns:
+        int: Number of mails marked
+    """
+
+    def update(cur):
+        cur.executemany(
+            "UPDATE outbox SET Status='sent', Attempts=Attempts+1 "
+            "WHERE Id=? AND Status='sending' AND Lease_Owner=?",
+            [(mail_id, owner) for mail_id in ids],
+        )
+        return cur.rowcount
+
+    return db.immediate(path, update)
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
+def mark_failed(
+    path: str, mail_id: int, owner: str, error: str, retry_in: float = None
+) -> bool:
+    """Records a failed attempt and schedules a retry
+    Without retry_in the mail is dead-lettered and never retried
+
+    Args:
+        path: Path to database
+        mail_id: Outbox id
+        owner: Lease token the mail was claimed with
+        error: Error message
+        retry_in: Seconds until the next attempt
+
+    Returns:
+        bool: False if the lease was lost to another worker
+    """
+
+    def update(cur):
+        if retry_in is None:
+            cur.execute(
+                "UPDATE outbox SET Status='dead', Attempts=Attempts+1, Last_Error=? "
+                "WHERE Id=? AND Status='sending' AND Lease_Owner=?",
+                (error, mail_id, owner),
+            )
+        else:
+            cur.execute(
+                "UPDATE outbox SET Status='pending', Attempts=Attempts+1, "
+                "Last_Error=?, Next_Attempt=? "
+                "WHERE Id=? AND Status='sending' AND Lease_Owner=?",
+                (error, time.time() + retry_in, mail_id, owner),
+            )
+        return cur.rowcount == 1
+
+    return db.immediate(path, update)
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
+def counts(path: str) -> dict:
+    """Counts the mails in the outbox by status
+
+    Args:
+        path: Path to database
+
+    Returns:
+        dict: Number of mails per status
+    """
+    conn = db.connect(path)
+    cur = conn.cursor()
+
+    cur.execute("SELECT Status, COUNT(*) FROM outbox GROUP BY Status")
+    return dict(cur.fetchall())
@@ -1,19 +1,16 @@
-import io
-import sqlite3 as s
+import sys
+from itertools import groupby, islice
+from operator import itemgetter
 from typing import Tuple
 
-import pandas as pd
-import requests
-
-# List of stock symbols from URL containing NASDAQ listings
-url = "https://pkgstore.datahub.io/core/nasdaq-listings/nasdaq-listed_csv/data/7665719fb51081ba0bd834fde71ce822/nasdaq-listed_csv.csv"
-data = requests.get(url).content
-df_data = pd.read_csv(io.StringIO(data.decode("utf-8")))
-symbols = df_data["Symbol"].to_list()
+from models import db, migrations
+from services import metrics, symbols
 
 
 def create_table(path: str) -> None:
-    """Creates the stock table in the database
+    """Creates the stock (holdings) and trades (ledger) tables in the database
+    The schema is defined by the migrations, the database is brought up
+    to the latest version
 
     Args:
         path: Path to database
@@ -21,16 +18,25 @@ def create_table(path: str) -> None:
     Returns:
         None
     """
-    conn = s.connect(path)
-    cur = conn.cursor()
+    migrations.migrate(path)
 
-    tbl = "CREATE TABLE IF NOT EXISTS stock(Date Date, Stock_Symbol Text, Price real, Quantity int, Email Text)"
-    cur.execute(tbl)
-    conn.commit()
 
+def _record(
+    cur, date: str, email: str, symb: str, side: str, quant: int, price: float
+) -> None:
+    """Appends a trade to the ledger"""
+    cur.execute(
+        "INSERT INTO trades(Date, Email, Stock_Symbol, Side, Quantity, Price) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (date, email, symb, side, quant, price),
+    )
 
+
+@metrics.timed(metrics.MODEL_SECONDS)
 def buy(tablename: str, data: Tuple[str, str, float, int, str], path: str) -> bool:
     """Updates table when user BUYS stocks
+    Appends the trade to the ledger and inserts or adds to the holding
+    with a single UPSERT, in one transaction
 
     Args:
         tablename: Tablename
@@ -43,31 +49,34 @@ def buy(tablename: str, data: Tuple[str, str, float, int, str], path: str) -> bo
     if not (isinstance(data[1], str)):
         raise TypeError("Invalid Type")
 
-    elif data[1].upper() in symbols:
-        conn = s.connect(path)
-        cur = conn.cursor()
-
-        cmnd = f"SELECT * FROM {tablename} WHERE Stock_Symbol='{data[1]}' AND Email='{data[4]}'"
-        cur.execute(cmnd)
-        res = cur.fetchall()
+    elif symbols.is_valid(data[1]):
+        date, symb, price, quant, email = data
 
-        if len(res) == 0:
-            b1 = f"INSERT INTO {tablename} VALUES {data}"
-            cur.execute(b1)
-            conn.commit()
+        def upsert(cur):
+            _record(cur, date, email, symb, "BUY", quant, price)
+            b1 = (
+                f"INSERT INTO {tablename}(Date, Stock_Symbol, Price, Quantity, Email, Cost) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(Email, Stock_Symbol) DO UPDATE SET "
+                "Quantity=Quantity+excluded.Quantity, Price=excluded.Price, "
+                "Cost=Cost+excluded.Cost"
+            )
+            cur.execute(
+                b1, (date, symb, price, quant, email, float(price) * int(quant))
+            )
             return True
 
-        else:
-            b2 = f"UPDATE {tablename} SET Quantity=Quantity+'{data[3]}', Price='{data[2]}' WHERE Stock_Symbol = '{data[1]}' AND Email = '{data[4]}'"
-            cur.execute(b2)
-            conn.commit()
-            return True
+        return db.immediate(path, upsert)
     else:
         return False
 
 
-def sell(tablename: str, data: Tuple[str, int, str, float], path: str) -> bool:
+@metrics.timed(metrics.MODEL_SECONDS)
+def sell(tablename: str, data: Tuple[str, str, int, str, float], path: str) -> bool:
     """Updates table when user SELLS stocks
+    The quantity is only decremented if the user owns enough of the stock,
+    the cost basis is reduced at average cost, the holding is removed once
+    it reaches zero and the trade is appended to the ledger, in one transaction
 
     Args:
         tablename: Tablename
@@ -77,39 +86,215 @@ def sell(tablename: str, data: Tuple[str, int, str, float], path: str) -> bool:
     Returns:
         bool
     """
-    if not (isinstance(data[0], str)):
+    if not (isinstance(data[1], str)):
         raise TypeError("Invalid Type")
 
-    elif data[0].upper() in symbols:
-        conn = s.connect(path)
-        cur = conn.cursor()
-
-        rem = f"SELECT * FROM {tablename} WHERE Stock_Symbol='{data[0]}' AND Email = '{data[2]}'"
-        cur.execute(rem)
-        res = cur.fetchall()
+    elif symbols.is_valid(data[1]):
+        date, symb, quant, email, price = data
 
-        if len(res) == 0:
-            return False
-        else:
-            curr_quant = int(res[0][3])
-            if data[1] > curr_quant:
+        def decrement(cur):
+            s1 = (
+                f"UPDATE {tablename} SET Quantity=Quantity-?, Price=?, "
+                "Cost=Cost*(Quantity-?)/Quantity "
+                "WHERE Stock_Symbol=? AND Email=? AND Quantity>=? "
+                "RETURNING Quantity"
+            )
+            cur.execute(s1, (quant, price, quant, symb, email, quant))
+            res = cur.fetchone()
+            if res is None:
                 return False
 
-            elif data[1] - curr_quant == 0:
-                s1 = f"DELETE FROM {tablename} WHERE Stock_Symbol='{data[0]}' AND Email = '{data[2]}'"
-                cur.execute(s1)
-                conn.commit()
-                return True
+            if res[0] == 0:
+                s2 = f"DELETE FROM {tablename} WHERE Stock_Symbol=? AND Email=?"
+                cur.execute(s2, (symb, email))
+            _record(cur, date, email, symb, "SELL", quant, price)
+            return True
 
-            else:
-                s2 = f"UPDATE {tablename} SET Quantity=Quantity-'{data[1]}', Price='{data[3]}' WHERE Stock_Symbol='{data[0]}' AND Email = '{data[2]}'"
-                cur.execute(s2)
-                conn.commit()
-                return True
+        return db.immediate(path, decrement)
     else:
         return False
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
+def apply_fills(fills: list, path: str, journal: str = "orderbook") -> int:
+    """Writes a batch of order book fills to the ledger and the holdings
+    in one transaction
+    Fills up to the watermark stored with the previous batch are skipped,
+    so a batch replayed from the journal after a crash is written once.
+    The fills of one trade are written together: if the seller no longer
+    owns enough of the stock the whole trade is dropped, so the buyer
+    never receives shares that were not sold
+
+    Args:
+        fills: (Seq, Trade, Date, Email, Stock_Symbol, Side, Quantity, Price)
+            rows in Seq order, the fills of a trade next to each other
+        path: Path to database
+        journal: Name of the journal the fills come from
+
+    Returns:
+        int: Number of fills written
+    """
+
+    def write_fill(cur, date, email, symb, side, quant, price) -> bool:
+        if side == "BUY":
+            cur.execute(
+                "INSERT INTO stock(Date, Stock_Symbol, Price, Quantity, Email, Cost) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(Email, Stock_Symbol) DO UPDATE SET "
+                "Quantity=Quantity+excluded.Quantity, Price=excluded.Price, "
+                "Cost=Cost+excluded.Cost",
+                (date, symb, price, quant, email, price * quant),
+            )
+        else:
+            cur.execute(
+                "UPDATE stock SET Quantity=Quantity-?, Price=?, "
+                "Cost=Cost*(Quantity-?)/Quantity "
+                "WHERE Stock_Symbol=? AND Email=? AND Quantity>=? "
+                "RETURNING Quantity",
+                (quant, price, quant, symb, email, quant),
+            )
+            res = cur.fetchone()
+            if res is None:
+                return False
+            if res[0] == 0:
+                cur.execute(
+                    "DELETE FROM stock WHERE Stock_Symbol=? AND Email=?", (symb, email)
+                )
+        _record(cur, date, email, symb, side, quant, price)
+        return True
+
+    def write(cur):
+        cur.execute("SELECT Seq FROM fill_watermark WHERE Journal=?", (journal,))
+        row = cur.fetchone()
+        watermark = row[0] if row else 0
+        trades = groupby(
+            (fill for fill in fills if fill[0] > watermark), key=itemgetter(1)
+        )
+        written = 0
+        for trade, rows in trades:
+            rows = list(rows)
+            cur.execute("SAVEPOINT trade")
+            if all(write_fill(cur, *row[2:]) for row in rows):
+                written += len(rows)
+            else:
+                cur.execute("ROLLBACK TO trade")
+                print(
+                    f"Dropped trade {trade}: a seller does not own enough {rows[0][4]}"
+                )
+            cur.execute("RELEASE trade")
+        if fills:
+            cur.execute(
+                "INSERT INTO fill_watermark(Journal, Seq) VALUES (?, ?) "
+                "ON CONFLICT(Journal) DO UPDATE SET Seq=MAX(Seq, excluded.Seq)",
+                (journal, fills[-1][0]),
+            )
+        return written
+
+    return db.immediate(path, write)
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
+def fill_watermark(path: str, journal: str = "orderbook") -> int:
+    """Gets the last order book fill written to the ledger
+
+    Args:
+        path: Path to database
+        journal: Name of the journal the fills come from
+
+    Returns:
+        int: Seq of the last fill written (0 if none)
+    """
+    conn = db.connect(path)
+    cur = conn.cursor()
+
+    cur.execute("SELECT Seq FROM fill_watermark WHERE Journal=?", (journal,))
+    res = cur.fetchone()
+    return res[0] if res else 0
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
+def holding(email: str, symb: str, path: str) -> int:
+    """Gets the quantity of a stock held by a user
+
+    Args:
+        email: User Email ID
+        symb: Stock Symbol
+        path: Path to database
+
+    Returns:
+        int: Quantity (0 if not held)
+    """
+    conn = db.connect(path)
+    cur = conn.cursor()
+
+    cur.execute(
+        "SELECT Quantity FROM stock WHERE Email=? AND Stock_Symbol=?", (email, symb)
+    )
+    res = cur.fetchone()
+    return res[0] if res else 0
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
+def rebuild_holdings(path: str, chunk_size: int = 10000) -> int:
+    """Rebuilds the stock (holdings) table by replaying the trades ledger
+    The ledger is streamed in chunks, so memory grows with the number of
+    holdings rather than the number of trades
+
+    Args:
+        path: Path to database
+        chunk_size: Trades read and holdings written per batch
+
+    Returns:
+        int: Number of holdings written
+    """
+
+    def replay(cur):
+        # (Email, Stock_Symbol) -> [Date, Price, Quantity, Cost]
+        positions = {}
+        cur.execute(
+            "SELECT Date, Email, Stock_Symbol, Side, Quantity, Price FROM trades ORDER BY Id"
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            for date, email, symb, side, quant, price in rows:
+                pos = positions.get((email, symb))
+                if side == "BUY":
+                    if pos is None:
+                        pos = positions[(email, symb)] = [date, price, 0, 0.0]
+                    pos[1] = price
+                    pos[2] += quant
+                    pos[3] += price * quant
+                elif pos is not None:
+                    pos[3] = pos[3] * (pos[2] - quant) / pos[2]
+                    pos[1] = price
+                    pos[2] -= quant
+                    if pos[2] <= 0:
+                        del positions[(email, symb)]
+
+        cur.execute("DELETE FROM stock")
+        items = iter(positions.items())
+        while True:
+            batch = [
+                (date, symb, price, quant, email, cost)
+                for (email, symb), (date, price, quant, cost) in islice(
+                    items, chunk_size
+                )
+            ]
+            if not batch:
+                break
+            cur.executemany(
+                "INSERT INTO stock(Date, Stock_Symbol, Price, Quantity, Email, Cost) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+        return len(positions)
+
+    return db.immediate(path, replay)
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
 def query(email: str, path: str) -> list:
     """Fetch all stocks purchased by a particular user
 
@@ -120,19 +305,23 @@ def query(email: str, path: str) -> list:
     Returns:
         List
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
-    que = f"SELECT * FROM stock WHERE Email ='{email}'"
-    cur.execute(que)
+    que = "SELECT Date, Stock_Symbol, Price, Quantity, Email, Cost FROM stock WHERE Email=?"
+    cur.execute(que, (email,))
     res = cur.fetchall()
     return res
 
 
-if __name__ == "__main__":
+if __name__ == "__main__" and sys.argv[1:2] == ["rebuild"]:
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "app.db"
+    print(f"Rebuilt {rebuild_holdings(db_path)} holdings from the ledger")
+
+elif __name__ == "__main__":
     test_path = "../test.db"
     print(create_table(test_path))
     print(buy("stock", ("19-9-2000", "NVDI", 354.9, 1, "test@gmail.com"), test_path))
     print(buy("stock", ("23-7-2002", "AAPL", 162.4, 2, "test@gmail.com"), test_path))
-    print(sell("stock", ("NVDI", 1, "test@gmail.com", 354.9), test_path))
-    print(sell("stock", ("AAPL", 2, "test@gmail.com", 162.4), test_path))
+    print(sell("stock", ("20-9-2000", "NVDI", 1, "test@gmail.com", 354.9), test_path))
+    print(sell("stock", ("24-7-2002", "AAPL", 2, "test@gmail.com", 162.4), test_path))
@@ -2,24 +2,29 @@
 Test folder for all unittests related
 to models.
 """
-from back import get_current_stock_price
+import os
+
+from services import providers
 from models.users import hash_pwd
 
+# Prices are replayed from tests/data, the tests never hit the network
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "tests", "data")
+
 
 class Base:
-    def __init__(self) -> None:
-        test_price = float(get_current_stock_price("AAPL"))
+    def __init__(self, path: str) -> None:
+        test_price = float(providers.ReplayProvider(DATA_DIR).quote("AAPL"))
         user_pwd = hash_pwd("abc123ABC")
         test_pwd = hash_pwd("test123")
 
         self.contact_us_data = {
-            "path": "app.db",
+            "path": path,
             "message": "test message",
             "email": "ronaldo72emiway@gmail.com",
         }
 
         self.stock_data = {
-            "path": "app.db",
+            "path": path,
             "tablename": "stock",
             "email": "ronaldo72emiway@gmail.com",
             "stock_symbol": "AAPL",
@@ -29,7 +34,7 @@ class Base:
         }
 
         self.user_data = {
-            "path": "app.db",
+            "path": path,
             "tablename": "user",
             "email": "ronaldo72emiway@gmail.com",
             "name": "Nikhill Vombatkere",
@@ -39,7 +44,7 @@ class Base:
         }
 
         self.test_data = {
-            "path": "test.db",
+            "path": path,
             "message": "test message",
             "email": "test@gmail.com",
             "name": "Test User",
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import models.stock as st
+from models import db, migrations
+from services import symbols
+
+N_THREADS = 16
+N_ORDERS = 50
+
+
+def hammer(fn, n_threads: int, n_orders: int) -> list:
+    """Calls fn n_orders times from each of n_threads threads at once"""
+    barrier = threading.Barrier(n_threads)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        done = [fn() for _ in range(n_orders)]
+        db.close()
+        with lock:
+            results.extend(done)
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class TestConcurrency(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(symbols, "_symbols", frozenset(["AAPL"]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "stress.db")
+        migrations.migrate(self.path)
+        db.close()
+
+    def tearDown(self):
+        db.close()
+        self.tmp.cleanup()
+
+    def quantity(self):
+        res = st.query("test@gmail.com", self.path)
+        return res[0][3] if res else 0
+
+    def test_concurrent_buys_are_exact(self):
+        buy = lambda: st.buy(
+            "stock", ("19-09-2021", "AAPL", 150.0, 1, "test@gmail.com"), self.path
+        )
+        results = hammer(buy, N_THREADS, N_ORDERS)
+        self.assertTrue(all(results))
+        self.assertEqual(len(st.query("test@gmail.com", self.path)), 1)
+        self.assertEqual(self.quantity(), N_THREADS * N_ORDERS)
+
+    def test_concurrent_sells_never_oversell(self):
+        owned = N_THREADS * N_ORDERS // 2
+        st.buy(
+            "stock", ("19-09-2021", "AAPL", 150.0, owned, "test@gmail.com"), self.path
+        )
+        sell = lambda: st.sell(
+            "stock", ("19-09-2021", "AAPL", 1, "test@gmail.com", 150.0), self.path
+        )
+        results = hammer(sell, N_THREADS, N_ORDERS)
+        self.assertEqual(results.count(True), owned)
+        self.assertEqual(st.query("test@gmail.com", self.path), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
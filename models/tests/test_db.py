@@ -1,20 +1,69 @@
 import os
 import sqlite3
+import tempfile
 import unittest
+from unittest import mock
 
 import models.stock as st
 import models.users as us
+from models import db, migrations
+from services import symbols
 
 from . import Base
 
-data = Base()
-
 
 class TestDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Passwords are hashed once, every test gets a fresh database
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.data = Base(os.path.join(cls.tmp.name, "test.db"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        patcher = mock.patch.object(symbols, "_symbols", frozenset(["AAPL"]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        data = self.data
+        migrations.migrate(data.user_data["path"])
+        us.insert(
+            data.user_data["path"],
+            data.user_data["tablename"],
+            (
+                data.user_data["email"],
+                data.user_data["name"],
+                data.user_data["password"],
+                data.user_data["code"],
+            ),
+        )
+        st.buy(
+            data.stock_data["tablename"],
+            (
+                data.stock_data["date"],
+                data.stock_data["stock_symbol"],
+                data.stock_data["price"],
+                data.stock_data["quantity"],
+                data.test_data["email"],
+            ),
+            data.stock_data["path"],
+        )
+
+    def tearDown(self):
+        db.close()
+        path = self.data.user_data["path"]
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
     def test_path(self):
-        self.assertEqual("True", str(os.path.exists(data.contact_us_data["path"])))
+        self.assertTrue(os.path.exists(self.data.contact_us_data["path"]))
 
     def test_stock_buy(self):
+        data = self.data
         self.assertTrue(
             st.buy(
                 data.test_data["tablename"],
@@ -57,10 +106,12 @@ class TestDatabase(unittest.TestCase):
             )
 
     def test_stock_sell(self):
+        data = self.data
         self.assertTrue(
             st.sell(
                 data.test_data["tablename"],
                 (
+                    data.test_data["date"],
                     data.test_data["stock_symbol"],
                     data.test_data["quantity"],
                     data.test_data["email"],
@@ -74,6 +125,7 @@ class TestDatabase(unittest.TestCase):
             st.sell(
                 data.test_data["tablename"],
                 (
+                    data.test_data["date"],
                     data.test_data["stock_symbol"],
                     100,
                     data.test_data["email"],
@@ -87,6 +139,7 @@ class TestDatabase(unittest.TestCase):
             st.sell(
                 data.test_data["tablename"],
                 (
+                    data.test_data["date"],
                     "XYZ",
                     data.test_data["quantity"],
                     data.test_data["email"],
@@ -100,6 +153,7 @@ class TestDatabase(unittest.TestCase):
             st.sell(
                 data.test_data["tablename"],
                 (
+                    data.test_data["date"],
                     1,
                     data.test_data["quantity"],
                     data.test_data["email"],
@@ -109,18 +163,22 @@ class TestDatabase(unittest.TestCase):
             )
 
     def test_stock_query(self):
-        assert type(st.query(data.test_data["email"], data.test_data["path"])) == list
+        data = self.data
+        holdings = st.query(data.test_data["email"], data.test_data["path"])
+        self.assertEqual(type(holdings), list)
+        self.assertEqual(holdings[0][1:4], ("AAPL", data.test_data["price"], 1))
 
     def test_user_exists(self):
-        assert (
-            us.check_user_exist(data.user_data["path"], data.user_data["email"]) == True
+        data = self.data
+        self.assertTrue(
+            us.check_user_exist(data.user_data["path"], data.user_data["email"])
         )
-        assert (
+        self.assertFalse(
             us.check_user_exist(data.user_data["path"], data.test_data["email"])
-            == False
         )
 
     def test_user_insert(self):
+        data = self.data
         self.assertIsNone(
             us.insert(
                 data.test_data["path"],
@@ -146,25 +204,19 @@ class TestDatabase(unittest.TestCase):
                 ),
             )
 
-    def test_user_add_code(self):
+    def test_user_codes(self):
+        data = self.data
         self.assertIsNone(
-            us.add_code(data.test_data["path"], 1000, data.test_data["email"])
+            us.add_code(data.user_data["path"], "1000", data.user_data["email"])
         )
+        self.assertTrue(us.check_code(data.user_data["path"], "1000"))
+        self.assertFalse(us.check_code(data.user_data["path"], "4321"))
 
-        with self.assertRaises(TypeError):
-            us.add_code(data.test_data["path"], "1000", data.test_data["email"])
-
-    def test_user_check_code(self):
-        assert us.check_code(data.test_data["path"], 1000) == True
-        assert us.check_code(data.test_data["path"], 4321) == False
-        with self.assertRaises(TypeError):
-            us.check_code(data.test_data["path"], "4321")
-
-    def test_user_reset_code(self):
-        with self.assertRaises(TypeError):
-            us.reset_code(data.test_data["path"], "4321")
+        self.assertIsNone(us.reset_code(data.user_data["path"], "1000"))
+        self.assertFalse(us.check_code(data.user_data["path"], "1000"))
 
     def test_user_get_name(self):
+        data = self.data
         self.assertEqual(
             data.user_data["name"],
             us.getname(data.user_data["path"], (data.user_data["email"],)),
@@ -175,9 +227,13 @@ class TestDatabase(unittest.TestCase):
         )
 
     def test_user_get_emails(self):
-        assert type(us.getemail(data.test_data["path"])) == list
+        data = self.data
+        self.assertEqual(
+            us.getemail(data.test_data["path"]), [(data.user_data["email"],)]
+        )
 
     def test_user_contact_us(self):
+        data = self.data
         self.assertTrue(
             us.check_contact_us(
                 data.user_data["path"], data.user_data["email"], data.user_data["email"]
@@ -195,6 +251,7 @@ class TestDatabase(unittest.TestCase):
         self.assertNotEqual("testpwd123", us.hash_pwd("testpwd123"))
 
     def test_user_check_hash(self):
+        data = self.data
         self.assertTrue(
             us.check_hash(
                 data.user_data["path"],
@@ -211,14 +268,6 @@ class TestDatabase(unittest.TestCase):
             )
         )
 
-        self.assertFalse(
-            us.check_hash(
-                data.test_data["path"],
-                data.test_data["password"],
-                data.test_data["email"],
-            )
-        )
-
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import models.stock as st
+from models import db, migrations
+from services import symbols
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(symbols, "_symbols", frozenset(["AAPL", "NVDA"]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ledger.db")
+        migrations.migrate(self.path)
+
+    def tearDown(self):
+        db.close()
+        self.tmp.cleanup()
+
+    def trade(self):
+        st.buy("stock", ("19-09-2021", "AAPL", 100.0, 4, "test@gmail.com"), self.path)
+        st.buy("stock", ("20-09-2021", "AAPL", 200.0, 4, "test@gmail.com"), self.path)
+        st.sell("stock", ("20-09-2021", "AAPL", 2, "test@gmail.com", 300.0), self.path)
+        st.buy("stock", ("21-09-2021", "NVDA", 50.0, 1, "test@gmail.com"), self.path)
+        st.sell("stock", ("21-09-2021", "NVDA", 1, "test@gmail.com", 60.0), self.path)
+
+    def test_every_trade_is_recorded(self):
+        self.trade()
+        conn = db.connect(self.path)
+        sides = conn.execute("SELECT Side FROM trades ORDER BY Id").fetchall()
+        self.assertEqual(
+            [side for (side,) in sides], ["BUY", "BUY", "SELL", "BUY", "SELL"]
+        )
+
+    def test_trades_keep_the_caller_date(self):
+        self.trade()
+        conn = db.connect(self.path)
+        dates = conn.execute("SELECT Date FROM trades ORDER BY Id").fetchall()
+        self.assertEqual(
+            [date for (date,) in dates],
+            ["19-09-2021", "20-09-2021", "20-09-2021", "21-09-2021", "21-09-2021"],
+        )
+
+    def test_create_table_runs_the_migrations(self):
+        path = os.path.join(self.tmp.name, "legacy.db")
+        st.create_table(path)
+        self.assertEqual(migrations.get_version(path), migrations.MIGRATIONS[-1][0])
+
+    def test_holdings_are_maintained(self):
+        self.trade()
+        (holding,) = st.query("test@gmail.com", self.path)
+        self.assertEqual(holding[1:4], ("AAPL", 300.0, 6))
+        # Average cost of 150 per share for the 6 remaining shares
+        self.assertAlmostEqual(holding[5], 900.0)
+
+    def test_rebuild_matches_incremental(self):
+        self.trade()
+        incremental = st.query("test@gmail.com", self.path)
+        self.assertEqual(st.rebuild_holdings(self.path, chunk_size=2), 1)
+        self.assertEqual(st.query("test@gmail.com", self.path), incremental)
+
+    def test_ledger_is_append_only(self):
+        self.trade()
+        conn = db.connect(self.path)
+        with self.assertRaises(sqlite3.IntegrityError):
+            conn.execute("DELETE FROM trades")
+        conn.rollback()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,14 @@
 # Imports
-import binascii
-import hashlib
-import os
-import sqlite3 as s
 from typing import Tuple
 
+from models import db, migrations
+from services import metrics, passwords
+
 
 def create_table(path: str) -> None:
     """Creates user table in the database
+    The schema is defined by the migrations, the database is brought up
+    to the latest version
 
     Args:
         path: Path to database
@@ -15,14 +16,10 @@ def create_table(path: str) -> None:
     Returns:
         None
     """
-    conn = s.connect(path)
-    cur = conn.cursor()
-
-    tbl = "CREATE TABLE IF NOT EXISTS user(Email TEXT, Name TEXT, Password TEXT, Code TEXT)"
-    cur.execute(tbl)
-    conn.commit()
+    migrations.migrate(path)
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def insert(path: str, tablename: str, data: Tuple[str, str, str, int]) -> None:
     """Inserts user and related values into table
 
@@ -34,7 +31,7 @@ def insert(path: str, tablename: str, data: Tuple[str, str, str, int]) -> None:
     Returns:
         None
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     insrt = f"INSERT INTO {tablename} VALUES{data}"
@@ -42,6 +39,7 @@ def insert(path: str, tablename: str, data: Tuple[str, str, str, int]) -> None:
     conn.commit()
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def check_user_exist(path: str, email: str) -> bool:
     """Checks if user exists in database
 
@@ -52,7 +50,7 @@ def check_user_exist(path: str, email: str) -> bool:
     Returns:
         bool
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     chk = f"SELECT * FROM user WHERE Email='{email}'"
@@ -62,6 +60,7 @@ def check_user_exist(path: str, email: str) -> bool:
     return True if res else False
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def reset_pwd(path: str, pwd: str, code: int) -> None:
     """Resets password for a particular user
 
@@ -73,7 +72,7 @@ def reset_pwd(path: str, pwd: str, code: int) -> None:
     Returns:
         None
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     reset = f"UPDATE user SET Password='{pwd}' WHERE Code='{code}'"
@@ -81,6 +80,7 @@ def reset_pwd(path: str, pwd: str, code: int) -> None:
     conn.commit()
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def add_code(path: str, key: str, email: str) -> None:
     """Adds verification code for user
 
@@ -92,7 +92,7 @@ def add_code(path: str, key: str, email: str) -> None:
     Returns:
         None
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     cmnd = f"UPDATE user SET Code='{key}' WHERE Email='{email}'"
@@ -100,6 +100,7 @@ def add_code(path: str, key: str, email: str) -> None:
     conn.commit()
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def check_code(path: str, code: str) -> bool:
     """Checks if verification code is valid
 
@@ -110,7 +111,7 @@ def check_code(path: str, code: str) -> bool:
     Returns:
         bool
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     chk = f"SELECT Code FROM user WHERE Code='{code}'"
@@ -125,6 +126,7 @@ def check_code(path: str, code: str) -> bool:
     return True if code == stored_code else False
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def reset_code(path: str, code: str) -> None:
     """Resets the Verification code to 0
 
@@ -135,7 +137,7 @@ def reset_code(path: str, code: str) -> None:
     Returns:
         None
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     rstcd = f"UPDATE user SET Code='0' WHERE Code='{code}'"
@@ -143,6 +145,7 @@ def reset_code(path: str, code: str) -> None:
     conn.commit()
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def getname(path: str, email: tuple) -> str:
     """Gets name of user
 
@@ -154,7 +157,7 @@ def getname(path: str, email: tuple) -> str:
         str
     """
     email = email[0]
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     cmnd = f"SELECT Name FROM user WHERE Email='{email}'"
@@ -163,13 +166,14 @@ def getname(path: str, email: tuple) -> str:
     return res[0][0]
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def getemail(path: str):
     """Gets all user emails from table
 
     Args:
         path: Path to database
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     gml = "SELECT Email FROM user"
@@ -178,6 +182,26 @@ def getemail(path: str):
     return emails
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
+def get_user(path: str, email: str) -> tuple:
+    """Gets a single user email from table
+
+    Args:
+        path: Path to database
+        email: User email id
+
+    Returns:
+        tuple: (Email,) or None if the user does not exist
+    """
+    conn = db.connect(path)
+    cur = conn.cursor()
+
+    gml = "SELECT Email FROM user WHERE Email=? LIMIT 1"
+    cur.execute(gml, (email,))
+    return cur.fetchone()
+
+
+@metrics.timed(metrics.MODEL_SECONDS)
 def check_contact_us(path: str, email: str, curr_user: str) -> bool:
     """Checks if email is in database and is also the current user
     This is to allow the user to "contact_us"
@@ -190,7 +214,7 @@ def check_contact_us(path: str, email: str, curr_user: str) -> bool:
     Returns:
         bool
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
     chk = f"SELECT * FROM user WHERE Email='{email}'"
@@ -203,8 +227,10 @@ def check_contact_us(path: str, email: str, curr_user: str) -> bool:
         return False
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def hash_pwd(pwd: str) -> str:
     """Hashes password using salted password hashing
+    Hashing runs in the password hashing pool
 
     Args:
         pwd: Password to be hashed
@@ -212,15 +238,13 @@ def hash_pwd(pwd: str) -> str:
     Returns:
         str
     """
-    salt = hashlib.sha256(os.urandom(60)).hexdigest().encode("ascii")
-    pwd_hash = hashlib.pbkdf2_hmac("sha512", pwd.encode("utf-8"), salt, 100000)
-    pwd_hash = binascii.hexlify(pwd_hash)
-    final_hashed_pwd = (salt + pwd_hash).decode("ascii")
-    return final_hashed_pwd
+    return passwords.run(passwords.hash_password, pwd)
 
 
+@metrics.timed(metrics.MODEL_SECONDS)
 def check_hash(path: str, pwd: str, email: str) -> bool:
     """Verifies password with hashed database password
+    Hashes made with older parameters are replaced after a successful check
 
     Args:
         path: Path to database
@@ -230,27 +254,24 @@ def check_hash(path: str, pwd: str, email: str) -> bool:
     Returns:
         bool
     """
-    conn = s.connect(path)
+    conn = db.connect(path)
     cur = conn.cursor()
 
-    check = f"SELECT * FROM user where Email='{email}'"
-    cur.execute(check)
+    check = "SELECT Password FROM user WHERE Email=?"
+    cur.execute(check, (email,))
     res = cur.fetchall()
 
-    dbpwd = res[0][2]
-    salt = dbpwd[:64]
-    dbpwd = dbpwd[64:]
-
-    pwd_hash = hashlib.pbkdf2_hmac(
-        "sha512", pwd.encode("utf-8"), salt.encode("ascii"), 100000
-    )
-    pwd_hash = binascii.hexlify(pwd_hash).decode("ascii")
-
-    if pwd_hash == dbpwd:
-        return True
-    else:
+    dbpwd = res[0][0]
+    if not passwords.run(passwords.verify_password, pwd, dbpwd):
         return False
 
+    if passwords.needs_rehash(dbpwd):
+        new_pwd = passwords.run(passwords.hash_password, pwd)
+        rehash = "UPDATE user SET Password=? WHERE Email=? AND Password=?"
+        cur.execute(rehash, (new_pwd, email, dbpwd))
+        conn.commit()
+    return True
+
 
 if __name__ == "__main__":
     test_path = "../test.db"
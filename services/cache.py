@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    """
+    An upstream call in flight, shared by every caller waiting on the same key
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe cache with per-entry expiry, bounded LRU eviction and
+    single-flight loading: concurrent misses for the same key share one
+    call to the loader
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _lookup(self, key: Hashable, now: float):
+        """Returns (True, value) for a fresh entry, (False, None) otherwise
+        Must be called with the lock held
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires <= now:
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any, ttl: float = None) -> None:
+        """Stores a value and evicts the least recently used entries
+        Must be called with the lock held
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Gets a fresh value from the cache
+
+        Args:
+            key: Cache key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            Any: Cached value or default
+        """
+        with self._lock:
+            found, value = self._lookup(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: float = None) -> None:
+        """Stores a value in the cache
+
+        Args:
+            key: Cache key
+            value: Value to be cached
+            ttl: Seconds until the entry expires (defaults to the cache TTL)
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """Removes one entry, or every entry if no key is given
+
+        Args:
+            key: Cache key
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Gets a value from the cache, calling loader on a miss
+        If another thread is already loading the same key, waits for
+        its result instead of calling loader again
+
+        Args:
+            key: Cache key
+            loader: Function returning the value for key
+
+        Returns:
+            Any: Cached or freshly loaded value
+        """
+        with self._lock:
+            found, value = self._lookup(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader()
+        except Exception as e:
+            call.error = e
+            raise
+        else:
+            with self._lock:
+                self._store(key, call.value)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.event.set()
+        return call.value
+
+    def stats(self) -> dict:
+        """Returns the cache counters
+
+        Returns:
+            dict: hits, misses, coalesced loads and current size
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "size": len(self._data),
+            }
@@ -0,0 +1,176 @@
+"""
+Chart payloads for /pipe, as JSON or in a compact binary format
+
+Binary format, all little-endian:
+    header (16 bytes): magic b"RHCS", version (uint16), column count (uint16),
+                       row count (uint32), reserved (uint32)
+    columns, one after the other, each row count values long:
+        Date (int64, ms since the epoch), Open, High, Low, Close (float64),
+        Volume (int64), then any requested indicators (float64, NaN while
+        their window is not yet full)
+Every column starts on an 8-byte boundary, so clients can view them as
+typed arrays without copying
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from services import history, indicators, rollups
+from services.downsample import downsample
+from services.cache import TTLCache
+
+MAGIC = b"RHCS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+
+# Serialized chart payloads, keyed by request and stored history version
+payload_cache = TTLCache(
+    maxsize=int(os.getenv("CHART_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("CHART_CACHE_TTL", 60 * 60)),
+)
+
+
+class Payload:
+    """
+    A serialized chart response with its ETag and gzipped body
+    """
+
+    def __init__(self, body: bytes, mimetype: str):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.gzipped = gzip.compress(body, compresslevel=6)
+
+
+def select(bars: np.ndarray, start: float = None, end: float = None) -> np.ndarray:
+    """Selects the bars between two dates without copying
+
+    Args:
+        bars: (6, n) array in history.COLUMNS order
+        start: First date in ms (inclusive)
+        end: Last date in ms (inclusive)
+
+    Returns:
+        np.ndarray: View of the selected bars
+    """
+    lo = 0 if start is None else np.searchsorted(bars[0], start, side="left")
+    hi = bars.shape[1] if end is None else np.searchsorted(bars[0], end, side="right")
+    return bars[:, lo:hi]
+
+
+def encode_json(bars: np.ndarray) -> bytes:
+    """Serializes bars as JSON rows {"res": [[date, o, h, l, c, v, ...], ...]}
+    Missing indicator values are sent as null
+
+    Args:
+        bars: (6 + indicators, n) array in history.COLUMNS order
+
+    Returns:
+        bytes
+    """
+    if np.isnan(bars).any():
+        rows = np.where(np.isnan(bars), None, bars).T.tolist()
+    else:
+        rows = bars.T.tolist()
+    return json.dumps({"res": rows}, separators=(",", ":")).encode()
+
+
+def encode_binary(bars: np.ndarray) -> bytes:
+    """Serializes bars in the binary columnar format
+    Columns are converted straight from the NumPy buffers
+
+    Args:
+        bars: (6 + indicators, n) array in history.COLUMNS order
+
+    Returns:
+        bytes
+    """
+    n = bars.shape[1]
+    return b"".join(
+        [
+            HEADER.pack(MAGIC, VERSION, bars.shape[0], n, 0),
+            bars[0].astype("<i8").tobytes(),
+            np.ascontiguousarray(bars[1:5], dtype="<f8").tobytes(),
+            np.nan_to_num(bars[5]).astype("<i8").tobytes(),
+            np.ascontiguousarray(bars[6:], dtype="<f8").tobytes(),
+        ]
+    )
+
+
+def decode_binary(body: bytes) -> np.ndarray:
+    """Reads bars back from the binary columnar format
+
+    Args:
+        body: Binary payload
+
+    Returns:
+        np.ndarray: (6 + indicators, n) float64 array in history.COLUMNS order
+    """
+    magic, version, ncols, n, _ = HEADER.unpack_from(body)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a chart payload")
+    offset = HEADER.size
+    dates = np.frombuffer(body, "<i8", n, offset)
+    prices = np.frombuffer(body, "<f8", 4 * n, offset + 8 * n).reshape(4, n)
+    volume = np.frombuffer(body, "<i8", n, offset + 40 * n)
+    extra = np.frombuffer(body, "<f8", (ncols - 6) * n, offset + 48 * n)
+    return np.vstack([dates, prices, volume, extra.reshape(ncols - 6, n)]).astype(
+        np.float64
+    )
+
+
+ENCODERS = {
+    "json": (encode_json, "application/json"),
+    "bin": (encode_binary, "application/octet-stream"),
+}
+
+
+def get_payload(
+    symbol: str,
+    start: float = None,
+    end: float = None,
+    points: int = None,
+    fmt: str = "json",
+    interval: str = "1d",
+    names: tuple = (),
+) -> Payload:
+    """Gets the chart payload of a stock for a date range
+    Payloads are cached until the stored history changes
+
+    Args:
+        symbol: Stock Symbol
+        start: First date in ms
+        end: Last date in ms
+        points: Maximum number of bars, downsampled with LTTB (all if None)
+        fmt: json or bin
+        interval: 1d for daily bars, or a rollup period (1wk, 1mo or 1y)
+        names: Indicators (from indicators.NAMES) appended as extra columns
+
+    Returns:
+        Payload, or None if there is no history for the stock
+    """
+    bars = history.get_bars(symbol)
+    if bars is None:
+        return None
+    version = (bars.shape[1], float(bars[0, -1]) if bars.shape[1] else None)
+    key = (symbol, start, end, points, fmt, interval, names, version)
+    if interval != "1d":
+        bars = rollups.rollup_cache.get(symbol, bars, interval)
+    encode, mimetype = ENCODERS[fmt]
+
+    def build():
+        series = bars
+        if names:
+            values = indicators.indicator_cache.get(symbol, bars, interval)
+            series = np.vstack([bars, indicators.select(values, names)])
+        selected = select(series, start, end)
+        if points is not None:
+            selected = downsample(selected, points)
+        return Payload(encode(selected), mimetype)
+
+    return payload_cache.get_or_load(key, build)
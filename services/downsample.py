@@ -0,0 +1,89 @@
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Picks the points to keep with Largest-Triangle-Three-Buckets
+    The first and last points are always kept; every bucket in between
+    keeps the point forming the largest triangle with the previously kept
+    point and the average of the next bucket
+
+    Args:
+        x: Sorted x values (e.g. dates)
+        y: y values (e.g. closing prices)
+        threshold: Number of points to keep
+
+    Returns:
+        np.ndarray: Sorted indices of the points to keep
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n - 2 points between the first and last one
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Average of each bucket, computed for all buckets at once
+    sum_x = np.add.reduceat(x[: n - 1], starts)
+    sum_y = np.add.reduceat(y[: n - 1], starts)
+    counts = ends - starts
+    avg_x = np.append(sum_x / counts, x[-1])
+    avg_y = np.append(sum_y / counts, y[-1])
+
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = starts[i], ends[i]
+        bx, by = x[lo:hi], y[lo:hi]
+        # Twice the triangle area, the constant factor does not change argmax
+        area = np.abs(
+            (x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Picks the minimum and maximum point of each bucket
+    Faster than LTTB and fully vectorized, keeps every spike
+
+    Args:
+        y: y values
+        threshold: Number of points to keep (two per bucket)
+
+    Returns:
+        np.ndarray: Sorted indices of the points to keep
+    """
+    n = len(y)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    padded = np.pad(y, (0, size * buckets - n), mode="edge").reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lo = offsets + np.argmin(padded, axis=1)
+    hi = offsets + np.argmax(padded, axis=1)
+    return np.unique(np.minimum(np.concatenate([lo, hi]), n - 1))
+
+
+def downsample(bars: np.ndarray, threshold: int, method: str = "lttb") -> np.ndarray:
+    """Downsamples chart bars using the closing price
+
+    Args:
+        bars: (6, n) array in history.COLUMNS order
+        threshold: Number of bars to keep
+        method: lttb or minmax
+
+    Returns:
+        np.ndarray: (6, threshold) array of the kept bars
+    """
+    if bars.shape[1] <= threshold:
+        return bars
+    if method == "minmax":
+        keep = minmax(bars[4], threshold)
+    else:
+        keep = lttb(bars[0], bars[4], threshold)
+    return bars[:, keep]
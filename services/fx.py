@@ -0,0 +1,219 @@
+import datetime as dt
+import json
+import os
+import threading
+
+import requests
+
+from services import metrics, providers
+from utils import Currency_Conversion
+
+SNAPSHOT_PATH = os.path.join(os.getenv("DATA_DIR", "data"), "fx_rates.json")
+REFRESH_INTERVAL = float(os.getenv("FX_REFRESH_INTERVAL", 60 * 60))
+# Seconds between retries while no rates have been loaded at all
+RETRY_INTERVAL = float(os.getenv("FX_RETRY_INTERVAL", 60))
+
+_service = None
+_lock = threading.Lock()
+
+
+class RatesUnavailable(Exception):
+    """No exchange rates have been loaded yet"""
+
+
+class FxRates:
+    """
+    Process-wide exchange rate table
+    The last good snapshot is kept on disk so conversions keep working
+    offline and across restarts, and a daemon thread refreshes it on a schedule
+    Until the first rates arrive conversions raise RatesUnavailable and the
+    thread retries every retry_interval
+    """
+
+    def __init__(
+        self,
+        url: str = None,
+        path: str = SNAPSHOT_PATH,
+        interval: float = REFRESH_INTERVAL,
+        retry_interval: float = RETRY_INTERVAL,
+    ):
+        # Rates come from the market data provider unless a URL is given
+        self.url = url
+        self.path = path
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.fetched_at = None
+        self.converter = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self) -> None:
+        """Loads the rates from the disk snapshot, downloading them if
+        there is no snapshot yet
+
+        Returns:
+            None
+        """
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            self.refresh()
+        else:
+            self._swap(snapshot)
+
+    def refresh(self) -> None:
+        """Downloads the latest rates and stores them as the new snapshot
+        The current rates are kept if the download fails
+
+        Returns:
+            None
+        """
+        if self.url is None:
+            provider = providers.get_provider()
+            with metrics.EXTERNAL_SECONDS.time(f"{provider.name}.fx_rates"):
+                data = provider.fx_rates()
+        else:
+            with metrics.EXTERNAL_SECONDS.time("fixer"):
+                data = requests.get(self.url, timeout=10).json()
+        if "rates" not in data:
+            raise ValueError(f"No rates in response: {data.get('error')}")
+
+        snapshot = {
+            "fetched_at": dt.datetime.utcnow().isoformat(timespec="seconds"),
+            "base": data.get("base", "EUR"),
+            "rates": data["rates"],
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+        self._swap(snapshot)
+
+    def _swap(self, snapshot: dict) -> None:
+        # A new converter is built and swapped in as a whole, so readers
+        # never see the index and the matrix of two different snapshots
+        self.converter = Currency_Conversion(rates=snapshot["rates"])
+        self.fetched_at = snapshot.get("fetched_at")
+
+    def age(self) -> float:
+        """Returns the age of the current snapshot in seconds
+
+        Returns:
+            float: Seconds since the rates were fetched (inf if never)
+        """
+        try:
+            fetched_at = dt.datetime.fromisoformat(self.fetched_at)
+        except (TypeError, ValueError):
+            return float("inf")
+        return (dt.datetime.utcnow() - fetched_at).total_seconds()
+
+    def start(self) -> None:
+        """Starts the background refresh thread
+
+        Returns:
+            None
+        """
+        if self._thread is not None:
+            return
+
+        def next_wait():
+            if self.converter is None:
+                return self.retry_interval
+            return max(self.interval - self.age(), 0)
+
+        def run():
+            wait = next_wait()
+            while not self._stop.wait(wait):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Failed to refresh exchange rates: {e}")
+                wait = self.retry_interval if self.converter is None else self.interval
+
+        self._thread = threading.Thread(target=run, name="fx-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background refresh thread
+
+        Returns:
+            None
+        """
+        self._stop.set()
+
+    def _current(self) -> Currency_Conversion:
+        converter = self.converter
+        if converter is None:
+            raise RatesUnavailable("Exchange rates are unavailable right now")
+        return converter
+
+    def rate(self, from_currency, to_currency) -> float:
+        """Gets the current exchange rate between two currencies
+
+        Args:
+            from_currency: Currency to be converted from
+            to_currency: Currency to be converted to
+
+        Returns:
+            float: Units of to_currency per unit of from_currency
+
+        Raises:
+            RatesUnavailable: If no rates have been loaded yet
+        """
+        return self._current().rate(from_currency, to_currency)
+
+    def convert(self, from_currency, to_currency, amount) -> float:
+        """Converts one currency to another using the current rates
+
+        Args:
+            from_currency: Currency to be converted from
+            to_currency: Currency to be converted to
+            amount: amount to be converted
+
+        Returns:
+            float: Converted amount
+
+        Raises:
+            RatesUnavailable: If no rates have been loaded yet
+        """
+        return self._current().convert(from_currency, to_currency, amount)
+
+    def convert_many(self, from_currency, to_currency, amounts):
+        """Converts an array of amounts using the current rates
+
+        Args:
+            from_currency: Currency to be converted from
+            to_currency: Currency to be converted to
+            amounts: Array of amounts to be converted
+
+        Returns:
+            np.ndarray: Converted amounts
+
+        Raises:
+            RatesUnavailable: If no rates have been loaded yet
+        """
+        return self._current().convert_many(from_currency, to_currency, amounts)
+
+
+def get_rates() -> FxRates:
+    """Gets the process-wide exchange rate table, loading it on first use
+    If there is no snapshot and the download fails, the table starts empty
+    and the refresh thread keeps retrying, so callers fail fast meanwhile
+
+    Returns:
+        FxRates
+    """
+    global _service
+    if _service is None:
+        with _lock:
+            if _service is None:
+                service = FxRates()
+                try:
+                    service.load()
+                except Exception as e:
+                    print(f"Failed to load exchange rates: {e}")
+                service.start()
+                _service = service
+    return _service
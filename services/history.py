@@ -0,0 +1,247 @@
+import datetime as dt
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from services import metrics, providers
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+HISTORY_DIR = os.path.join(os.getenv("DATA_DIR", "data"), "history")
+# Seconds before the provider is asked for new bars again
+TTL = float(os.getenv("HISTORY_TTL", 60 * 60))
+START = "1950-01-01"
+
+# One row per column: Date is milliseconds since the epoch
+COLUMNS = ("Date", "Open", "High", "Low", "Close", "Volume")
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _path(symbol: str, directory: str = HISTORY_DIR) -> str:
+    return os.path.join(directory, f"{symbol.upper()}.npy")
+
+
+def _symbol_lock(symbol: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(symbol.upper(), threading.Lock())
+
+
+class _FileLock:
+    """
+    Exclusive lock between processes writing the same symbol
+    """
+
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self.f = None
+
+    def __enter__(self):
+        self.f = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+def load(symbol: str, directory: str = HISTORY_DIR) -> np.ndarray:
+    """Loads the stored history of a stock as a read-only memory map
+    Writers replace the file atomically, so a loaded array stays
+    consistent even while the history is being updated
+
+    Args:
+        symbol: Stock Symbol
+        directory: History store directory
+
+    Returns:
+        np.ndarray: (6, n) array in COLUMNS order, or None if nothing is stored
+    """
+    try:
+        return np.load(_path(symbol, directory), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def save(symbol: str, bars: np.ndarray, directory: str = HISTORY_DIR) -> None:
+    """Stores the history of a stock, replacing the previous file atomically
+
+    Args:
+        symbol: Stock Symbol
+        bars: (6, n) array in COLUMNS order
+        directory: History store directory
+
+    Returns:
+        None
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = _path(symbol, directory)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(bars, dtype=np.float64))
+    os.replace(tmp_path, path)
+
+
+def to_frame(bars: np.ndarray) -> pd.DataFrame:
+    """Wraps a stored history in a DataFrame without copying it
+
+    Args:
+        bars: (6, n) array in COLUMNS order
+
+    Returns:
+        pd.DataFrame: One row per day, Date in milliseconds since the epoch
+    """
+    return pd.DataFrame(bars.T, columns=list(COLUMNS), copy=False)
+
+
+def from_frame(df: pd.DataFrame) -> np.ndarray:
+    """Converts a provider download (indexed by date) into stored bars
+
+    Args:
+        df: DataFrame with Open, High, Low, Close and Volume columns
+
+    Returns:
+        np.ndarray: (6, n) array in COLUMNS order
+    """
+    if df.empty:
+        return np.empty((len(COLUMNS), 0))
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.droplevel(1, axis=1)
+    df = df.dropna(subset=["Close"])
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    dates = index.values.astype("datetime64[ms]").astype(np.int64)
+    return np.vstack(
+        [dates.astype(np.float64)]
+        + [df[col].to_numpy(dtype=np.float64) for col in COLUMNS[1:]]
+    )
+
+
+def fetch(symbol: str, start: str) -> np.ndarray:
+    """Downloads daily bars from start until today
+
+    Args:
+        symbol: Stock Symbol
+        start: First day to download (YYYY-MM-DD)
+
+    Returns:
+        np.ndarray: (6, n) array in COLUMNS order
+    """
+    provider = providers.get_provider()
+    with metrics.EXTERNAL_SECONDS.time(f"{provider.name}.history"):
+        frame = provider.history(symbol, start)
+    return from_frame(frame)
+
+
+def update(symbol: str, directory: str = HISTORY_DIR) -> np.ndarray:
+    """Appends the bars missing since the last stored one
+    The last stored day is fetched again and replaced, so a bar stored
+    while its day was still trading gets its closing values
+    Only one thread or process updates a symbol at a time
+
+    Args:
+        symbol: Stock Symbol
+        directory: History store directory
+
+    Returns:
+        np.ndarray: The updated history
+
+    Raises:
+        ValueError: The provider has no bars and nothing is stored, the
+            store is left untouched so the next request tries again
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = _path(symbol, directory)
+    with _symbol_lock(symbol), _FileLock(path):
+        bars = load(symbol, directory)
+        if bars is None or bars.shape[1] == 0:
+            start = START
+        else:
+            last = dt.datetime.utcfromtimestamp(bars[0, -1] / 1000)
+            start = last.strftime("%Y-%m-%d")
+
+        if start > dt.date.today().strftime("%Y-%m-%d"):
+            # Already up to date, only mark the store as fresh
+            os.utime(path)
+            return bars
+
+        new_bars = fetch(symbol, start)
+        if bars is not None and bars.shape[1]:
+            new_bars = new_bars[:, new_bars[0] >= bars[0, -1]]
+            if new_bars.shape[1] == 0 or (
+                new_bars.shape[1] == 1 and np.array_equal(new_bars[:, 0], bars[:, -1])
+            ):
+                # Nothing new since the last stored bar (e.g. over a weekend)
+                os.utime(path)
+                return bars
+            # The fetched bar of the last stored day replaces the stored one
+            keep = bars.shape[1] - (new_bars[0, 0] == bars[0, -1])
+            new_bars = np.concatenate([bars[:, :keep], new_bars], axis=1)
+        elif new_bars.shape[1] == 0:
+            raise ValueError(f"No history for {symbol}")
+        save(symbol, new_bars, directory)
+        return load(symbol, directory)
+
+
+def is_stale(symbol: str, directory: str = HISTORY_DIR) -> bool:
+    """Checks if the stored history was last updated more than TTL seconds ago
+
+    Args:
+        symbol: Stock Symbol
+        directory: History store directory
+
+    Returns:
+        bool
+    """
+    try:
+        return time.time() - os.path.getmtime(_path(symbol, directory)) > TTL
+    except OSError:
+        return True
+
+
+def get_bars(symbol: str, directory: str = HISTORY_DIR) -> np.ndarray:
+    """Gets the daily bars of a stock from the local store
+    New bars are fetched when the store is stale; if the provider is
+    down the stored history is served as it is
+
+    Args:
+        symbol: Stock Symbol
+        directory: History store directory
+
+    Returns:
+        np.ndarray: (6, n) array in COLUMNS order, or None if there is
+        no stored history and the provider is down
+    """
+    bars = load(symbol, directory)
+    if bars is None or bars.shape[1] == 0 or is_stale(symbol, directory):
+        try:
+            bars = update(symbol, directory)
+        except Exception as e:
+            print(f"Failed to update history of {symbol}: {e}")
+    return bars if bars is not None and bars.shape[1] else None
+
+
+def get_history(symbol: str, directory: str = HISTORY_DIR) -> pd.DataFrame:
+    """Gets the daily history of a stock from the local store as a DataFrame
+
+    Args:
+        symbol: Stock Symbol
+        directory: History store directory
+
+    Returns:
+        pd.DataFrame: Date (ms), Open, High, Low, Close and Volume columns,
+        or None if there is no stored history and the provider is down
+    """
+    bars = get_bars(symbol, directory)
+    return None if bars is None else to_frame(bars)
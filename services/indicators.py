@@ -0,0 +1,170 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Indicators served to charts, in row order
+NAMES = (
+    "sma20",
+    "sma50",
+    "ema20",
+    "rsi14",
+    "macd",
+    "macd_signal",
+    "macd_hist",
+    "bb_upper",
+    "bb_lower",
+    "volatility20",
+)
+# Smoothing state kept next to the indicators, to continue them incrementally
+ROWS = NAMES + ("_ema12", "_ema26", "_gain14", "_loss14")
+# Longest rolling window, bars before an update needed to refill the windows
+WINDOW = 50
+TRADING_DAYS = 252
+
+
+def _ewm(x: np.ndarray, alpha: float, prev: float = None) -> np.ndarray:
+    """Exponentially weighted mean, continued from a previous value if given"""
+    if prev is None:
+        return pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    x = np.concatenate([[prev], x])
+    return pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def compute(close: np.ndarray, prev: np.ndarray = None) -> np.ndarray:
+    """Computes every indicator over a series of closing prices in one pass
+    If the indicators of an earlier version of the series are given, only
+    the bars from its last one on are computed; the last bar is computed
+    again since it may have been a partial (e.g. monthly) bar
+
+    Args:
+        close: Closing prices
+        prev: Indicators previously computed by this function
+
+    Returns:
+        np.ndarray: (len(ROWS), n) array, NaN where a window is not yet full
+    """
+    n = len(close)
+    if prev is None or prev.shape[1] < 3 or prev.shape[1] > n:
+        first = 0
+    else:
+        first = prev.shape[1] - 1
+
+    out = np.empty((len(ROWS), n))
+    if first:
+        out[:, :first] = prev[:, :first]
+    row = ROWS.index
+
+    def seed(name):
+        return None if first == 0 else out[row(name), first - 1]
+
+    # Rolling windows, over enough earlier bars to fill them
+    lo = max(first - WINDOW, 0)
+    s = pd.Series(close[lo:])
+    tail = slice(first - lo, None)
+    sma20 = s.rolling(20).mean().to_numpy()[tail]
+    std20 = s.rolling(20).std(ddof=0).to_numpy()[tail]
+    out[row("sma20"), first:] = sma20
+    out[row("sma50"), first:] = s.rolling(50).mean().to_numpy()[tail]
+    out[row("bb_upper"), first:] = sma20 + 2 * std20
+    out[row("bb_lower"), first:] = sma20 - 2 * std20
+    returns = np.log(s).diff()
+    out[row("volatility20"), first:] = returns.rolling(20).std().to_numpy()[
+        tail
+    ] * np.sqrt(TRADING_DAYS)
+
+    # Exponential averages, continued from the state at the previous bar
+    x = close[first:]
+    out[row("ema20"), first:] = _ewm(x, 2 / 21, seed("ema20"))
+    ema12 = _ewm(x, 2 / 13, seed("_ema12"))
+    ema26 = _ewm(x, 2 / 27, seed("_ema26"))
+    macd = ema12 - ema26
+    signal = _ewm(macd, 2 / 10, seed("macd_signal"))
+    out[row("_ema12"), first:] = ema12
+    out[row("_ema26"), first:] = ema26
+    out[row("macd"), first:] = macd
+    out[row("macd_signal"), first:] = signal
+    out[row("macd_hist"), first:] = macd - signal
+
+    # RSI with Wilder's smoothing of gains and losses
+    if first == 0:
+        change = np.concatenate([[np.nan], np.diff(close)])
+    else:
+        change = np.diff(close[first - 1 :])
+    gain = _ewm(np.clip(change, 0, None), 1 / 14, seed("_gain14"))
+    loss = _ewm(np.clip(-change, 0, None), 1 / 14, seed("_loss14"))
+    out[row("_gain14"), first:] = gain
+    out[row("_loss14"), first:] = loss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[row("rsi14"), first:] = 100 - 100 / (1 + gain / loss)
+    out[row("rsi14"), first:14] = np.nan
+    return out
+
+
+class IndicatorCache:
+    """
+    Indicators per symbol and interval, updated incrementally when bars
+    are appended or the last bar changes
+    """
+
+    def __init__(self):
+        # (symbol, interval) -> (bar count, last close, indicators)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, bars: np.ndarray, interval: str = "1d") -> np.ndarray:
+        """Gets the indicators of a stock's bars
+
+        Args:
+            symbol: Stock Symbol
+            bars: (6, n) array in history.COLUMNS order
+            interval: Interval of the bars (1d, 1wk, 1mo or 1y)
+
+        Returns:
+            np.ndarray: (len(ROWS), n) array
+        """
+        key = (symbol.upper(), interval)
+        n = bars.shape[1]
+        last = float(bars[4, -1]) if n else None
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and entry[:2] == (n, last):
+            return entry[2]
+        values = compute(np.asarray(bars[4]), None if entry is None else entry[2])
+
+        with self._lock:
+            self._entries[key] = (n, last, values)
+        return values
+
+    def invalidate(self, symbol: str = None) -> None:
+        """Drops the cached indicators of one symbol, or of every symbol
+
+        Args:
+            symbol: Stock Symbol
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == symbol.upper()]:
+                    del self._entries[key]
+
+
+indicator_cache = IndicatorCache()
+
+
+def select(values: np.ndarray, names: tuple) -> np.ndarray:
+    """Picks the rows of some indicators
+
+    Args:
+        values: Indicators computed by compute
+        names: Indicator names, from NAMES
+
+    Returns:
+        np.ndarray: (len(names), n) array
+    """
+    return values[[ROWS.index(name) for name in names]]
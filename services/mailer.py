@@ -0,0 +1,294 @@
+import os
+import smtplib
+import threading
+import uuid
+from email.message import EmailMessage
+
+from models import db, outbox
+from services import metrics
+
+BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))
+MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 6))
+RETRY_DELAY = float(os.getenv("MAIL_RETRY_DELAY", 30))
+POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", 5))
+LEASE = 120
+
+_pool = None
+_lock = threading.Lock()
+
+
+class MailgunTransport:
+    """
+    Sends mails through the Mailgun HTTP API with one pooled session
+    MAILGUN_API_URL can point it at a local HTTP stand-in
+    """
+
+    name = "mailgun"
+
+    def __init__(self, url: str = None, sender: str = None, passwd: str = None):
+        # Only loaded when mail goes through Mailgun
+        import requests
+
+        MAILGUN_EMAIL = os.getenv("MAILGUN_EMAIL")
+        self.url = url or os.getenv(
+            "MAILGUN_API_URL",
+            f"https://api.mailgun.net/v3/{MAILGUN_EMAIL}.mailgun.org/messages",
+        )
+        self.sender = sender or (
+            f"Mailgun Sandbox <postmaster@{MAILGUN_EMAIL}.mailgun.org>"
+        )
+        self.session = requests.Session()
+        self.session.auth = ("api", passwd or os.getenv("MAILGUN_PASSWD"))
+
+    def send_batch(self, mails: list) -> dict:
+        """Sends a batch of mails over the pooled session
+
+        Args:
+            mails: (Id, Email, Subject, Body, Attempts) rows
+
+        Returns:
+            dict: Error message per outbox id that failed
+        """
+        import requests
+
+        errors = {}
+        for mail_id, email, subject, body, _ in mails:
+            try:
+                res = self.session.post(
+                    self.url,
+                    data={
+                        "from": self.sender,
+                        "to": email,
+                        "subject": subject,
+                        "text": body,
+                    },
+                    timeout=10,
+                )
+                res.raise_for_status()
+            except requests.RequestException as e:
+                errors[mail_id] = str(e)
+        return errors
+
+
+class SmtpTransport:
+    """
+    Sends mails through an SMTP server, one connection per batch
+    MAIL_SMTP_HOST and MAIL_SMTP_PORT can point it at a local debugging server
+    """
+
+    name = "smtp"
+
+    def __init__(self, host: str = None, port: int = None, sender: str = None):
+        self.host = host or os.getenv("MAIL_SMTP_HOST", "localhost")
+        self.port = port or int(os.getenv("MAIL_SMTP_PORT", 1025))
+        self.sender = sender or os.getenv("MAIL_SENDER", "noreply@localhost")
+
+    def send_batch(self, mails: list) -> dict:
+        """Sends a batch of mails over one SMTP connection
+
+        Args:
+            mails: (Id, Email, Subject, Body, Attempts) rows
+
+        Returns:
+            dict: Error message per outbox id that failed
+        """
+        errors = {}
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=10)
+        except OSError as e:
+            return {mail[0]: str(e) for mail in mails}
+
+        with smtp:
+            for mail_id, email, subject, body, _ in mails:
+                msg = EmailMessage()
+                msg["From"] = self.sender
+                msg["To"] = email
+                msg["Subject"] = subject
+                msg.set_content(body)
+                try:
+                    smtp.send_message(msg)
+                except smtplib.SMTPException as e:
+                    errors[mail_id] = str(e)
+        return errors
+
+
+class NullTransport:
+    """
+    Discards mails, for load tests and offline runs
+    """
+
+    name = "null"
+
+    def __init__(self):
+        self.sent = 0
+
+    def send_batch(self, mails: list) -> dict:
+        """Counts a batch of mails as sent without sending them
+
+        Args:
+            mails: (Id, Email, Subject, Body, Attempts) rows
+
+        Returns:
+            dict: No errors
+        """
+        self.sent += len(mails)
+        return {}
+
+
+def get_transport():
+    """Gets the transport selected by MAIL_BACKEND (mailgun, smtp or null)"""
+    backend = os.getenv("MAIL_BACKEND", "mailgun")
+    if backend == "smtp":
+        return SmtpTransport()
+    elif backend == "null":
+        return NullTransport()
+    return MailgunTransport()
+
+
+class OutboxWorkers:
+    """
+    Pool of threads draining the outbox
+    Failed mails are retried with exponential backoff and dead-lettered
+    after max_attempts
+    """
+
+    def __init__(
+        self,
+        path: str,
+        transport=None,
+        workers: int = 2,
+        batch_size: int = BATCH_SIZE,
+        max_attempts: int = MAX_ATTEMPTS,
+        retry_delay: float = RETRY_DELAY,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.path = path
+        self.transport = transport or get_transport()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        """Starts the worker threads
+
+        Returns:
+            None
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops the worker threads after their current batch
+
+        Args:
+            timeout: Seconds to wait for each thread
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self) -> None:
+        """Wakes the workers up, e.g. after a mail has been queued
+
+        Returns:
+            None
+        """
+        self._wakeup.set()
+
+    def drain_once(self) -> int:
+        """Claims and sends one batch of due mails
+
+        Returns:
+            int: Number of mails claimed
+        """
+        # A fresh token per batch, so a batch whose lease expired cannot
+        # overwrite the outcome of the worker that claimed it next
+        owner = uuid.uuid4().hex
+        mails = outbox.claim(self.path, self.batch_size, LEASE, owner)
+        if not mails:
+            return 0
+
+        try:
+            name = getattr(self.transport, "name", type(self.transport).__name__)
+            with metrics.EXTERNAL_SECONDS.time(f"mail.{name}"):
+                errors = self.transport.send_batch(mails)
+        except Exception as e:
+            errors = {mail[0]: str(e) for mail in mails}
+
+        sent = [mail[0] for mail in mails if mail[0] not in errors]
+        if sent:
+            outbox.mark_sent(self.path, sent, owner)
+        for mail_id, email, subject, body, attempts in mails:
+            if mail_id in errors:
+                if attempts + 1 >= self.max_attempts:
+                    print(f"Error Sending Mail {mail_id}, giving up: {errors[mail_id]}")
+                    outbox.mark_failed(self.path, mail_id, owner, errors[mail_id])
+                else:
+                    retry_in = self.retry_delay * 2**attempts
+                    outbox.mark_failed(
+                        self.path, mail_id, owner, errors[mail_id], retry_in
+                    )
+        return len(mails)
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    claimed = self.drain_once()
+                except Exception as e:
+                    print(f"Outbox worker failed: {e}")
+                    claimed = 0
+                if claimed < self.batch_size:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+        finally:
+            db.close()
+
+
+def start(path: str, workers: int = None) -> OutboxWorkers:
+    """Starts the process-wide outbox workers once
+
+    Args:
+        path: Path to database
+        workers: Number of worker threads
+
+    Returns:
+        OutboxWorkers
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = OutboxWorkers(
+                path, workers=workers or int(os.getenv("MAIL_WORKERS", 2))
+            )
+            _pool.start()
+    return _pool
+
+
+def queue_mail(path: str, email: str, subject: str, body: str) -> int:
+    """Queues a mail in the outbox; it is sent by the outbox workers
+
+    Args:
+        path: Path to database
+        email: Recipient email id
+        subject: Mail subject
+        body: Mail body
+
+    Returns:
+        int: Outbox id of the mail
+    """
+    mail_id = outbox.enqueue(path, email, subject, body)
+    if _pool is not None:
+        _pool.notify()
+    return mail_id
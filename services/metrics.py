@@ -0,0 +1,227 @@
+"""
+Latency histograms exported in the Prometheus text format on /metrics
+
+    http_request_duration_seconds    per route, method and status
+    external_call_duration_seconds   per upstream call (quotes, FX, mail)
+    model_call_duration_seconds      per models function
+
+An observation is one bisect and a few additions under a lock, a couple
+of microseconds (see benchmarks/bench_metrics.py) against requests that
+take milliseconds, cheap enough to leave on in production
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable
+
+# Upper bounds in seconds, from a cached lookup to a slow upstream
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = []
+
+
+class _Series:
+    """
+    Bucket counts, sum and count of one label combination
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        # One count per bucket plus +Inf, not cumulative until exported
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram:
+    """
+    Latency histogram with one series per label combination
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple,
+        buckets: tuple = BUCKETS,
+        register: bool = True,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        if register:
+            # Exported on /metrics
+            registry.append(self)
+
+    def labels(self, *values) -> _Series:
+        """Gets the series of a label combination, creating it on first use
+
+        Args:
+            values: One value per label name
+
+        Returns:
+            _Series
+        """
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                series = self._series.setdefault(values, _Series(self.buckets))
+        return series
+
+    def observe(self, seconds: float, *values) -> None:
+        self.labels(*values).observe(seconds)
+
+    def time(self, *values) -> "_Timer":
+        """Times a block of code
+
+        Args:
+            values: One value per label name
+
+        Returns:
+            _Timer: Context manager observing the time spent inside it
+        """
+        return _Timer(self.labels(*values))
+
+    def render(self) -> list:
+        """Renders the histogram in the Prometheus text format
+
+        Returns:
+            list: Lines
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            items = sorted(self._series.items())
+        for values, series in items:
+            counts, total = series.snapshot()
+            labels = [
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.labelnames, values)
+            ]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = ",".join(labels + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            label_text = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{label_text} {total!r}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class _Timer:
+    """
+    Context manager observing its duration, failed calls included
+    """
+
+    def __init__(self, series: _Series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.start)
+        return False
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def timed(histogram: Histogram, *values) -> Callable:
+    """Decorator timing every call of a function
+    The label defaults to the module and name of the function,
+    e.g. users.check_hash
+
+    Args:
+        histogram: Histogram to observe
+        values: One value per label name
+
+    Returns:
+        Callable: Decorator
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        # Bound once, the wrapper does no label lookup
+        series = histogram.labels(
+            *(values or (f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}",))
+        )
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                series.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def render() -> str:
+    """Renders every histogram in the Prometheus text format
+
+    Returns:
+        str
+    """
+    lines = []
+    for histogram in registry:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, until the response starts",
+    ("route", "method", "status"),
+)
+EXTERNAL_SECONDS = Histogram(
+    "external_call_duration_seconds",
+    "Time spent in calls to market data, exchange rate and mail services",
+    ("target",),
+)
+MODEL_SECONDS = Histogram(
+    "model_call_duration_seconds",
+    "Time spent in database model functions",
+    ("function",),
+)
@@ -0,0 +1,681 @@
+"""
+Limit order books and the matching engine for user orders
+
+Every symbol has a book of resting limit orders in price-time priority.
+An incoming order is matched against the resting orders on the other side
+and against the reference quote (the latest closing price), which stands
+for the rest of the market with unlimited size at that price. Resting
+orders fill when a later quote crosses their limit.
+
+Fills are written to the ledger and holdings in batches. Orders, fills
+and cancels are appended to a journal first, so the books and the fills
+not written yet are recovered on restart. The books live in one process:
+the engine holds an exclusive lock on its journal, and other workers
+sharing the data directory run without limit orders until it is released
+"""
+
+import collections
+import datetime as dt
+import heapq
+import json
+import math
+import os
+import threading
+import time
+
+from models import db, stock
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+BUY = "BUY"
+SELL = "SELL"
+JOURNAL_PATH = os.path.join(os.getenv("DATA_DIR", "data"), "orderbook.journal")
+FILL_BATCH_SIZE = int(os.getenv("FILL_BATCH_SIZE", 500))
+# Seconds between writes of the pending fills and between quote sweeps
+FLUSH_INTERVAL = float(os.getenv("FILL_FLUSH_INTERVAL", 0.5))
+SWEEP_INTERVAL = float(os.getenv("ORDER_SWEEP_INTERVAL", 15))
+# Bytes of journal after which the worker rewrites it as the open orders
+COMPACT_SIZE = int(os.getenv("JOURNAL_COMPACT_SIZE", 8 * 1024 * 1024))
+# Seconds before a worker without the journal lock tries to take it again
+LOCK_RETRY_INTERVAL = 30
+
+# The first eight fields are the rows taken by models.stock.apply_fills,
+# both sides of a trade between two users share the trade number
+Fill = collections.namedtuple(
+    "Fill", "seq trade date email symbol side quantity price order_id"
+)
+
+_engine = None
+_lock = threading.Lock()
+_retry_at = 0.0
+
+
+class JournalLocked(Exception):
+    """
+    Raised when another process holds the order book journal
+    """
+
+
+class Order:
+    """
+    A user order, a market order has no price
+    """
+
+    __slots__ = (
+        "id",
+        "email",
+        "symbol",
+        "side",
+        "quantity",
+        "price",
+        "remaining",
+        "cancelled",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        email: str,
+        symbol: str,
+        side: str,
+        quantity: int,
+        price: float = None,
+        remaining: int = None,
+    ):
+        self.id = id
+        self.email = email
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.remaining = quantity if remaining is None else remaining
+        self.cancelled = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.remaining > 0 and not self.cancelled
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__[:-1]}
+
+
+def _within(side: str, price: float, limit: float) -> bool:
+    """Checks if an order of side with limit accepts price"""
+    return price <= limit if side == BUY else price >= limit
+
+
+class OrderBook:
+    """
+    Resting limit orders of one symbol in price-time priority
+    Bids are a max-heap and asks a min-heap on (price, order id), orders
+    that were filled or cancelled are dropped lazily once they reach the top
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = []
+        self.asks = []
+
+    def _top(self, heap: list) -> Order:
+        while heap and not heap[0][2].is_open:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def best_bid(self) -> Order:
+        return self._top(self.bids)
+
+    def best_ask(self) -> Order:
+        return self._top(self.asks)
+
+    def rest(self, order: Order) -> None:
+        if order.side == BUY:
+            heapq.heappush(self.bids, (-order.price, order.id, order))
+        else:
+            heapq.heappush(self.asks, (order.price, order.id, order))
+
+    def match(self, order: Order, quote: float = None) -> list:
+        """Matches an incoming order
+        Resting orders priced at or better than the quote go first, then
+        the rest fills at the quote if it is within the limit
+
+        Args:
+            order: Incoming order, its remaining quantity is reduced
+            quote: Reference price, None to match the book only
+
+        Returns:
+            list: (resting order or None for the quote, price, quantity)
+        """
+        if order.price is not None:
+            limit = order.price
+        else:
+            limit = math.inf if order.side == BUY else 0.0
+        trades = []
+        while order.remaining:
+            best = self.best_ask() if order.side == BUY else self.best_bid()
+            if (
+                best is not None
+                and _within(order.side, best.price, limit)
+                and (quote is None or _within(order.side, best.price, quote))
+            ):
+                quantity = min(order.remaining, best.remaining)
+                best.remaining -= quantity
+                order.remaining -= quantity
+                trades.append((best, best.price, quantity))
+            elif quote is not None and _within(order.side, quote, limit):
+                trades.append((None, quote, order.remaining))
+                order.remaining = 0
+            else:
+                break
+        return trades
+
+    def cross(self, quote: float) -> list:
+        """Fills the resting orders whose limit the quote has reached
+
+        Args:
+            quote: Reference price
+
+        Returns:
+            list: (resting order, price, quantity)
+        """
+        trades = []
+        for heap in (self.bids, self.asks):
+            while True:
+                best = self._top(heap)
+                if best is None or not _within(best.side, quote, best.price):
+                    break
+                trades.append((best, quote, best.remaining))
+                best.remaining = 0
+        return trades
+
+
+def _reference_quote(symbol: str) -> float:
+    # Imported on first use, pandas is not needed to start the engine
+    from utils import get_current_price
+
+    return get_current_price(symbol)
+
+
+class MatchingEngine:
+    """
+    Order books of every symbol, their journal and the batched writing
+    of fills to the ledger
+    """
+
+    def __init__(
+        self,
+        path: str,
+        journal_path: str = JOURNAL_PATH,
+        quote=None,
+        batch_size: int = FILL_BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        sweep_interval: float = SWEEP_INTERVAL,
+        compact_size: int = COMPACT_SIZE,
+    ):
+        self.path = path
+        # No journal (None) means nothing survives a restart, for benchmarks
+        self.journal_path = journal_path
+        self.journal_name = (
+            os.path.basename(journal_path) if journal_path else "orderbook"
+        )
+        self.quote = quote or _reference_quote
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.compact_size = compact_size
+        self.books = {}
+        self.orders = {}
+        self.pending = []
+        self.next_id = 1
+        self.fill_seq = 0
+        # Shares of (email, symbol) promised to open sell orders and to
+        # sell fills not written yet
+        self.reserved = collections.Counter()
+        self._journal = None
+        self._journal_lock = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _log(self, record: dict) -> None:
+        """Appends a record to the journal, must be called with the lock held"""
+        if self._journal is not None:
+            self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+            # Handed to the OS so a crash of the process loses nothing
+            self._journal.flush()
+
+    def _get_quote(self, symbol: str) -> float:
+        try:
+            price = float(self.quote(symbol))
+        except Exception as e:
+            print(f"Failed to get quote of {symbol}: {e}")
+            return None
+        return None if math.isnan(price) else price
+
+    def _fill(
+        self, order: Order, price: float, quantity: int, date: str, trade: int
+    ) -> Fill:
+        """Records one side of a trade, must be called with the lock held"""
+        self.fill_seq += 1
+        fill = Fill(
+            self.fill_seq,
+            trade,
+            date,
+            order.email,
+            order.symbol,
+            order.side,
+            quantity,
+            price,
+            order.id,
+        )
+        self._log({"op": "fill", **fill._asdict()})
+        self.pending.append(fill)
+        if not order.is_open:
+            self.orders.pop(order.id, None)
+        return fill
+
+    def submit(
+        self, email: str, symbol: str, side: str, quantity: int, price: float = None
+    ) -> tuple:
+        """Places an order and matches it, what is left of a limit order
+        rests in the book and what is left of a market order is cancelled
+
+        Args:
+            email: User email id
+            symbol: Stock Symbol
+            side: BUY or SELL
+            quantity: Number of shares
+            price: Limit price, None for a market order
+
+        Returns:
+            tuple: (Order, list of Fill of this order)
+
+        Raises:
+            ValueError: The order is invalid or sells more shares than
+                the user has free
+        """
+        symbol = symbol.upper()
+        side = side.upper()
+        if side not in (BUY, SELL):
+            raise ValueError("Side must be BUY or SELL")
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        if price is not None:
+            price = round(float(price), 2)
+            if price <= 0:
+                raise ValueError("Limit price must be positive")
+
+        # Fetched before taking the lock, it may go to the network
+        quote = self._get_quote(symbol)
+        date = dt.datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+        with self._lock:
+            if side == SELL:
+                free = (
+                    stock.holding(email, symbol, self.path)
+                    - self.reserved[(email, symbol)]
+                )
+                if quantity > free:
+                    raise ValueError(
+                        f"You only have {max(free, 0)} {symbol} free to sell"
+                    )
+                self.reserved[(email, symbol)] += quantity
+
+            order = Order(self.next_id, email, symbol, side, quantity, price)
+            self.next_id += 1
+            self._log({"op": "add", **order.to_dict()})
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = OrderBook(symbol)
+
+            fills = []
+            for resting, fill_price, fill_quantity in book.match(order, quote):
+                trade = self.fill_seq + 1
+                if resting is not None:
+                    self._fill(resting, fill_price, fill_quantity, date, trade)
+                fills.append(self._fill(order, fill_price, fill_quantity, date, trade))
+
+            if order.remaining:
+                if price is None:
+                    self._cancel(order)
+                else:
+                    book.rest(order)
+                    self.orders[order.id] = order
+
+        if len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+        return order, fills
+
+    def _cancel(self, order: Order) -> None:
+        """Cancels an order, must be called with the lock held"""
+        order.cancelled = True
+        self.orders.pop(order.id, None)
+        if order.side == SELL:
+            self.reserved[(order.email, order.symbol)] -= order.remaining
+        self._log({"op": "cancel", "id": order.id})
+
+    def cancel(self, email: str, order_id: int) -> bool:
+        """Cancels an open order of a user
+
+        Args:
+            email: User email id
+            order_id: Order id
+
+        Returns:
+            bool: False if the user has no such open order
+        """
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or order.email != email:
+                return False
+            self._cancel(order)
+            return True
+
+    def sell(
+        self, email: str, symbol: str, quantity: int, price: float, date: str
+    ) -> bool:
+        """Sells shares at the market price outside the books
+        The free shares are checked and sold under the engine lock, so a
+        limit sell cannot reserve the same shares in between
+
+        Args:
+            email: User email id
+            symbol: Stock Symbol
+            quantity: Number of shares
+            price: Price per share
+            date: Date of the trade
+
+        Returns:
+            bool: False if the user does not have enough free shares
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            free = (
+                stock.holding(email, symbol, self.path) - self.reserved[(email, symbol)]
+            )
+            if quantity > free:
+                return False
+            return stock.sell(
+                "stock", (date, symbol, quantity, email, price), self.path
+            )
+
+    def open_orders(self, email: str) -> list:
+        """Lists the open orders of a user, oldest first
+
+        Args:
+            email: User email id
+
+        Returns:
+            list: Order
+        """
+        with self._lock:
+            return sorted(
+                (order for order in self.orders.values() if order.email == email),
+                key=lambda order: order.id,
+            )
+
+    def sweep(self, prices: dict) -> list:
+        """Fills the resting orders crossed by new quotes
+
+        Args:
+            prices: Quote per Stock Symbol
+
+        Returns:
+            list: Fill
+        """
+        date = dt.datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+        fills = []
+        with self._lock:
+            for symbol, price in prices.items():
+                book = self.books.get(symbol)
+                if book is None or price is None or math.isnan(price):
+                    continue
+                for resting, fill_price, fill_quantity in book.cross(float(price)):
+                    trade = self.fill_seq + 1
+                    fills.append(
+                        self._fill(resting, fill_price, fill_quantity, date, trade)
+                    )
+        if fills:
+            self._wakeup.set()
+        return fills
+
+    def sweep_quotes(self) -> list:
+        """Sweeps the books with the latest quotes of the symbols with open orders
+
+        Returns:
+            list: Fill
+        """
+        with self._lock:
+            symbols = sorted({order.symbol for order in self.orders.values()})
+        if not symbols:
+            return []
+        from utils import get_current_stock_prices
+
+        return self.sweep(get_current_stock_prices(symbols).to_dict())
+
+    def flush(self) -> int:
+        """Writes the pending fills to the ledger and holdings in one batch
+        The journal reaches the disk first, so a fill in the ledger is
+        always in the journal too
+
+        Returns:
+            int: Number of fills written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self.pending = self.pending, []
+                if self._journal is not None and batch:
+                    os.fsync(self._journal.fileno())
+            if not batch:
+                return 0
+            try:
+                written = stock.apply_fills(
+                    [fill[:8] for fill in batch], self.path, self.journal_name
+                )
+            except Exception as e:
+                print(f"Failed to write fills: {e}")
+                with self._lock:
+                    self.pending[:0] = batch
+                return 0
+            with self._lock:
+                for fill in batch:
+                    if fill.side == SELL:
+                        self.reserved[(fill.email, fill.symbol)] -= fill.quantity
+            return written
+
+    def recover(self) -> int:
+        """Rebuilds the books from the journal, writes the fills the last
+        process left pending and compacts the journal to the open orders
+
+        Returns:
+            int: Number of open orders recovered
+
+        Raises:
+            JournalLocked: Another process owns the journal
+        """
+        self._lock_journal()
+        orders = {}
+        pending = []
+        next_id = 1
+        fill_seq = stock.fill_watermark(self.path, self.journal_name)
+        if self.journal_path and os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write at the end of the journal
+                        break
+                    op = record.pop("op")
+                    if op == "add":
+                        order = Order(**record)
+                        orders[order.id] = order
+                        next_id = max(next_id, order.id + 1)
+                    elif op == "cancel":
+                        if record["id"] in orders:
+                            orders[record["id"]].cancelled = True
+                    elif op in ("fill", "pending"):
+                        fill = Fill(**record)
+                        if op == "fill" and fill.order_id in orders:
+                            orders[fill.order_id].remaining -= fill.quantity
+                        pending.append(fill)
+                        fill_seq = max(fill_seq, fill.seq)
+                    elif op == "counters":
+                        next_id = max(next_id, record["next_id"])
+                        fill_seq = max(fill_seq, record["fill_seq"])
+
+        with self._lock:
+            self.next_id = next_id
+            self.fill_seq = fill_seq
+            self.pending = pending
+            for order in sorted(orders.values(), key=lambda order: order.id):
+                # A market order is never left open, even if its cancel was lost
+                if order.is_open and order.price is not None:
+                    book = self.books.get(order.symbol)
+                    if book is None:
+                        book = self.books[order.symbol] = OrderBook(order.symbol)
+                    book.rest(order)
+                    self.orders[order.id] = order
+                    if order.side == SELL:
+                        self.reserved[(order.email, order.symbol)] += order.remaining
+            for fill in pending:
+                if fill.side == SELL:
+                    self.reserved[(fill.email, fill.symbol)] += fill.quantity
+
+        self.flush()
+        self._compact()
+        return len(self.orders)
+
+    def _lock_journal(self) -> None:
+        """Takes the exclusive lock on the journal, held until stop()
+        The lock is on a separate file because compacting replaces the journal
+        """
+        if not self.journal_path or self._journal_lock is not None:
+            return
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        f = open(self.journal_path + ".lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                raise JournalLocked(f"{self.journal_path} is used by another process")
+        self._journal_lock = f
+
+    def _journal_size(self) -> int:
+        with self._lock:
+            return self._journal.tell() if self._journal is not None else 0
+
+    def _compact(self) -> None:
+        """Rewrites the journal as the open orders and the fills still pending"""
+        if not self.journal_path:
+            return
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                records = [
+                    {
+                        "op": "counters",
+                        "next_id": self.next_id,
+                        "fill_seq": self.fill_seq,
+                    }
+                ]
+                records += [
+                    {"op": "add", **order.to_dict()} for order in self.orders.values()
+                ]
+                records += [
+                    {"op": "pending", **fill._asdict()} for fill in self.pending
+                ]
+                for record in records:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            self._journal = open(self.journal_path, "a")
+
+    def start(self) -> None:
+        """Starts the thread writing fills and sweeping the books
+
+        Returns:
+            None
+        """
+        self._thread = threading.Thread(target=self._run, name="orderbook", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops the thread and writes the pending fills
+
+        Args:
+            timeout: Seconds to wait for the thread
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._journal_lock is not None:
+                # Closing the file releases the lock
+                self._journal_lock.close()
+                self._journal_lock = None
+
+    def _run(self) -> None:
+        # Wakeups for full batches come early, the sweep follows the clock
+        last_sweep = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                try:
+                    if time.monotonic() - last_sweep >= self.sweep_interval:
+                        last_sweep = time.monotonic()
+                        self.sweep_quotes()
+                    self.flush()
+                    # Written fills and closed orders only grow the journal
+                    if self._journal_size() >= self.compact_size:
+                        self._compact()
+                except Exception as e:
+                    print(f"Order book worker failed: {e}")
+        finally:
+            db.close()
+
+
+def get_engine(path: str) -> MatchingEngine:
+    """Gets the process-wide matching engine, recovered from the journal
+    and started on first use
+    Only one process can own the journal, the others get None and try
+    again every LOCK_RETRY_INTERVAL seconds
+
+    Args:
+        path: Path to database
+
+    Returns:
+        MatchingEngine, or None if another process owns the books
+    """
+    global _engine, _retry_at
+    if _engine is None and time.monotonic() >= _retry_at:
+        with _lock:
+            if _engine is None and time.monotonic() >= _retry_at:
+                engine = MatchingEngine(path, JOURNAL_PATH)
+                try:
+                    engine.recover()
+                except JournalLocked as e:
+                    print(f"Order book disabled in this worker: {e}")
+                    _retry_at = time.monotonic() + LOCK_RETRY_INTERVAL
+                    return None
+                engine.start()
+                _engine = engine
+    return _engine
@@ -0,0 +1,160 @@
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+# Parameters used for new hashes, existing hashes keep their own
+SCHEME = os.getenv("PASSWORD_SCHEME", "pbkdf2-sha512")
+PBKDF2_ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", 100000))
+SCRYPT_N = int(os.getenv("SCRYPT_N", 2**14))
+SCRYPT_R = int(os.getenv("SCRYPT_R", 8))
+SCRYPT_P = int(os.getenv("SCRYPT_P", 1))
+
+# Hashing pool: HASH_WORKERS=0 hashes on the calling thread
+WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", 4 * WORKERS))
+TIMEOUT = float(os.getenv("HASH_TIMEOUT", 10))
+
+_pool = None
+_slots = threading.BoundedSemaphore(max(QUEUE_DEPTH, 1))
+_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """
+    Raised when too many hashes are already queued or a hash times out
+    """
+
+
+def _new_salt() -> str:
+    return hashlib.sha256(os.urandom(60)).hexdigest()
+
+
+def _pbkdf2(pwd: str, salt: str, iterations: int) -> str:
+    pwd_hash = hashlib.pbkdf2_hmac(
+        "sha512", pwd.encode("utf-8"), salt.encode("ascii"), iterations
+    )
+    return binascii.hexlify(pwd_hash).decode("ascii")
+
+
+def _scrypt(pwd: str, salt: str, n: int, r: int, p: int) -> str:
+    # OpenSSL asks for 128 * r * (n + p + 2) bytes, plus 1 MiB of slack
+    maxmem = min(128 * r * (n + p + 2) + 2**20, 2**31 - 1)
+    pwd_hash = hashlib.scrypt(
+        pwd.encode("utf-8"),
+        salt=salt.encode("ascii"),
+        n=n,
+        r=r,
+        p=p,
+        maxmem=maxmem,
+        dklen=64,
+    )
+    return binascii.hexlify(pwd_hash).decode("ascii")
+
+
+def hash_password(pwd: str) -> str:
+    """Hashes a password with the configured scheme and cost
+    The result records the algorithm and cost, e.g.
+    $pbkdf2-sha512$100000$<salt>$<hash> or $scrypt$16384,8,1$<salt>$<hash>
+
+    Args:
+        pwd: Password to be hashed
+
+    Returns:
+        str
+    """
+    salt = _new_salt()
+    if SCHEME == "scrypt":
+        params = f"{SCRYPT_N},{SCRYPT_R},{SCRYPT_P}"
+        return f"$scrypt${params}${salt}${_scrypt(pwd, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)}"
+    return f"$pbkdf2-sha512${PBKDF2_ITERATIONS}${salt}${_pbkdf2(pwd, salt, PBKDF2_ITERATIONS)}"
+
+
+def _parse(stored: str) -> tuple:
+    """Splits a stored hash into (scheme, params, salt, hash)
+    Hashes without a prefix are the original salt + PBKDF2-SHA512 format
+    """
+    if not stored.startswith("$"):
+        return "pbkdf2-sha512", "100000", stored[:64], stored[64:]
+    _, scheme, params, salt, pwd_hash = stored.split("$")
+    return scheme, params, salt, pwd_hash
+
+
+def verify_password(pwd: str, stored: str) -> bool:
+    """Verifies a password against a stored hash of any supported format
+
+    Args:
+        pwd: Password
+        stored: Stored hash
+
+    Returns:
+        bool
+    """
+    scheme, params, salt, pwd_hash = _parse(stored)
+    if scheme == "scrypt":
+        n, r, p = (int(x) for x in params.split(","))
+        candidate = _scrypt(pwd, salt, n, r, p)
+    elif scheme == "pbkdf2-sha512":
+        candidate = _pbkdf2(pwd, salt, int(params))
+    else:
+        raise ValueError(f"Unknown password scheme: {scheme}")
+    return hmac.compare_digest(candidate, pwd_hash)
+
+
+def needs_rehash(stored: str) -> bool:
+    """Checks if a stored hash was made with other than the current parameters
+
+    Args:
+        stored: Stored hash
+
+    Returns:
+        bool
+    """
+    scheme, params, _, _ = _parse(stored)
+    if SCHEME == "scrypt":
+        return (scheme, params) != ("scrypt", f"{SCRYPT_N},{SCRYPT_R},{SCRYPT_P}")
+    return stored[0] != "$" or (scheme, params) != (
+        "pbkdf2-sha512",
+        str(PBKDF2_ITERATIONS),
+    )
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=WORKERS)
+    return _pool
+
+
+def run(fn, *args):
+    """Runs a hashing function in the process pool and waits for it
+    Raises HashingBusy instead of queueing when QUEUE_DEPTH calls are
+    already waiting, so a burst of logins cannot starve other requests.
+    A call that times out keeps its slot until the pool finishes it
+
+    Args:
+        fn: hash_password or verify_password
+        args: Arguments of fn
+
+    Returns:
+        Result of fn
+    """
+    if WORKERS <= 0:
+        return fn(*args)
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy("Too many password hashes queued")
+    try:
+        future = _get_pool().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=TIMEOUT)
+    except FutureTimeout:
+        raise HashingBusy("Password hash timed out")
@@ -0,0 +1,237 @@
+"""
+Market data providers: quotes, daily history and exchange rates
+
+MARKET_DATA_PROVIDER chooses the provider used by the whole app:
+    yfinance  Yahoo Finance (default)
+    pynance   pynance quotes and history
+    replay    CSV files from REPLAY_DIR, no network at all
+"""
+
+import abc
+import datetime as dt
+import glob
+import json
+import os
+import threading
+
+import pandas as pd
+import requests
+
+# Settings are read on first use, after the app has loaded its .env file
+DEFAULT_PROVIDER = "yfinance"
+DEFAULT_REPLAY_DIR = os.path.join("tests", "data")
+FX_URL = "http://data.fixer.io/api/latest?access_key="
+# Used by the replay provider when REPLAY_DIR has no fx_rates.json (EUR based)
+REPLAY_RATES = {"EUR": 1.0, "USD": 1.18, "GBP": 0.86, "INR": 86.9, "JPY": 129.9}
+
+_provider = None
+_lock = threading.Lock()
+
+
+class Provider(abc.ABC):
+    """
+    Interface of a market data provider
+    History frames are indexed by date with Open, High, Low, Close and
+    Volume columns, quotes and rates are in the provider's currency units
+    """
+
+    name = None
+
+    @abc.abstractmethod
+    def quote(self, symbol: str) -> float:
+        """Gets the latest closing price of a stock
+
+        Args:
+            symbol: Stock Symbol
+
+        Returns:
+            float
+        """
+
+    def quotes(self, symbols: list) -> pd.Series:
+        """Gets the latest closing prices of many stocks
+
+        Args:
+            symbols: Stock Symbols
+
+        Returns:
+            pd.Series: Prices indexed by symbol, NaN if unavailable
+        """
+        prices = {}
+        for symbol in symbols:
+            try:
+                prices[symbol] = self.quote(symbol)
+            except Exception as e:
+                print(f"Failed to get quote of {symbol}: {e}")
+        return pd.Series(prices, index=pd.Index(symbols, dtype=object), dtype=float)
+
+    @abc.abstractmethod
+    def history(self, symbol: str, start: str) -> pd.DataFrame:
+        """Gets the daily bars of a stock from start until today
+
+        Args:
+            symbol: Stock Symbol
+            start: First day (YYYY-MM-DD)
+
+        Returns:
+            pd.DataFrame
+        """
+
+    def fx_rates(self) -> dict:
+        """Gets the latest exchange rates from fixer.io
+
+        Returns:
+            dict: base and rates (currency -> units per base unit)
+        """
+        url = FX_URL + str(os.getenv("FIXER_API_KEY"))
+        data = requests.get(url, timeout=10).json()
+        if "rates" not in data:
+            raise ValueError(f"No rates in response: {data.get('error')}")
+        return {"base": data.get("base", "EUR"), "rates": data["rates"]}
+
+    def symbols(self) -> list:
+        """Lists the symbols the provider has data for
+
+        Returns:
+            list: Stock Symbols, or None to use the exchange listing
+        """
+        return None
+
+
+class YFinanceProvider(Provider):
+    """
+    Yahoo Finance through yfinance, quotes are downloaded in batches
+    """
+
+    name = "yfinance"
+
+    def quote(self, symbol: str) -> float:
+        import yfinance as yf
+
+        todays_data = yf.Ticker(symbol).history(period="1d")
+        return float(todays_data["Close"].iloc[-1])
+
+    def quotes(self, symbols: list) -> pd.Series:
+        import yfinance as yf
+
+        data = yf.download(
+            symbols, period="5d", group_by="column", progress=False, threads=True
+        )
+        if data is None or data.empty:
+            # Nothing downloaded, every symbol is unavailable
+            return pd.Series(dtype=float)
+        close = data["Close"]
+        if isinstance(close, pd.Series):
+            close = close.to_frame(symbols[0])
+        return close.ffill().iloc[-1].reindex(symbols).astype(float)
+
+    def history(self, symbol: str, start: str) -> pd.DataFrame:
+        import yfinance as yf
+
+        return yf.download(symbol, start=start, progress=False, auto_adjust=False)
+
+
+class PynanceProvider(Provider):
+    """
+    pynance, one request per stock
+    """
+
+    name = "pynance"
+
+    def quote(self, symbol: str) -> float:
+        # Only the last few days are needed for the latest close
+        start = dt.date.today() - dt.timedelta(days=7)
+        return float(self.history(symbol, start)["Close"].iloc[-1])
+
+    def history(self, symbol: str, start) -> pd.DataFrame:
+        import pynance as pn
+
+        return pn.data.get(symbol, start=start, end=None).sort_index()
+
+
+class ReplayProvider(Provider):
+    """
+    Serves stored daily bars from <directory>/<SYMBOL>.csv files in the
+    Yahoo Finance download format (Date, Open, High, Low, Close,
+    Adj Close, Volume), so the app runs deterministically offline
+    """
+
+    name = "replay"
+
+    def __init__(self, directory: str = None, date: str = None):
+        self.directory = directory or os.getenv("REPLAY_DIR", DEFAULT_REPLAY_DIR)
+        if not os.path.isdir(self.directory):
+            raise ValueError(f"Replay directory not found: {self.directory}")
+        # Quotes are the closes of this day (YYYY-MM-DD), or of the last one
+        self.date = date or os.getenv("REPLAY_DATE")
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _frame(self, symbol: str) -> pd.DataFrame:
+        symbol = symbol.upper()
+        with self._lock:
+            df = self._frames.get(symbol)
+        if df is None:
+            path = os.path.join(self.directory, f"{symbol}.csv")
+            df = pd.read_csv(path, parse_dates=["Date"], index_col="Date").sort_index()
+            if self.date is not None:
+                df = df[df.index <= pd.Timestamp(self.date)]
+            with self._lock:
+                self._frames[symbol] = df
+        return df
+
+    def quote(self, symbol: str) -> float:
+        return float(self._frame(symbol)["Close"].iloc[-1])
+
+    def history(self, symbol: str, start: str) -> pd.DataFrame:
+        df = self._frame(symbol)
+        return df[df.index >= pd.Timestamp(start)]
+
+    def fx_rates(self) -> dict:
+        path = os.path.join(self.directory, "fx_rates.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {"base": "EUR", "rates": dict(REPLAY_RATES)}
+
+    def symbols(self) -> list:
+        paths = glob.glob(os.path.join(self.directory, "*.csv"))
+        return sorted(os.path.basename(path)[:-4].upper() for path in paths)
+
+
+PROVIDERS = {
+    "yfinance": YFinanceProvider,
+    "pynance": PynanceProvider,
+    "replay": ReplayProvider,
+}
+
+
+def get_provider() -> Provider:
+    """Gets the process-wide provider chosen by MARKET_DATA_PROVIDER
+
+    Returns:
+        Provider
+    """
+    global _provider
+    if _provider is None:
+        with _lock:
+            if _provider is None:
+                name = os.getenv("MARKET_DATA_PROVIDER", DEFAULT_PROVIDER)
+                if name not in PROVIDERS:
+                    raise ValueError(f"Unknown market data provider: {name}")
+                _provider = PROVIDERS[name]()
+    return _provider
+
+
+def set_provider(provider: Provider) -> None:
+    """Replaces the process-wide provider
+    Used for tests and offline runs
+
+    Args:
+        provider: Provider
+
+    Returns:
+        None
+    """
+    global _provider
+    _provider = provider
@@ -0,0 +1,142 @@
+import threading
+
+import numpy as np
+
+from services import history
+
+PERIODS = ("1wk", "1mo", "1y")
+
+
+def period_keys(dates: np.ndarray, period: str) -> np.ndarray:
+    """Maps dates to the week, month or year they fall in
+
+    Args:
+        dates: Dates in ms since the epoch
+        period: 1wk, 1mo or 1y
+
+    Returns:
+        np.ndarray: One integer key per date, equal within a period
+    """
+    days = (dates // 86400000).astype(np.int64)
+    if period == "1wk":
+        # The epoch is a Thursday, shift by 3 days so weeks start on Monday
+        return (days + 3) // 7
+    elif period == "1mo":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    elif period == "1y":
+        return days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def resample(bars: np.ndarray, period: str) -> tuple:
+    """Aggregates daily bars into weekly, monthly or yearly bars
+    Date and Open come from the first day, High is the maximum, Low the
+    minimum, Close comes from the last day and Volume is the sum
+
+    Args:
+        bars: (6, n) array in history.COLUMNS order
+        period: 1wk, 1mo or 1y
+
+    Returns:
+        tuple: (6, m) array of rollup bars and the daily index where
+        each of them starts
+    """
+    if bars.shape[1] == 0:
+        return np.empty((6, 0)), np.empty(0, dtype=np.int64)
+
+    keys = period_keys(bars[0], period)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+    ends = np.append(starts[1:], bars.shape[1]) - 1
+    rollup = np.vstack(
+        [
+            bars[0, starts],
+            bars[1, starts],
+            np.maximum.reduceat(bars[2], starts),
+            np.minimum.reduceat(bars[3], starts),
+            bars[4, ends],
+            np.add.reduceat(bars[5], starts),
+        ]
+    )
+    return rollup, starts
+
+
+class RollupCache:
+    """
+    Rollups per symbol and period, updated incrementally
+    When new daily bars are appended only the last (possibly partial)
+    period is aggregated again
+    """
+
+    def __init__(self):
+        # (symbol, period) -> (daily bars used, rollup bars, rollup starts)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, bars: np.ndarray, period: str) -> np.ndarray:
+        """Gets the rollup of a symbol's daily bars
+
+        Args:
+            symbol: Stock Symbol
+            bars: (6, n) daily bars, the stored history of symbol
+            period: 1wk, 1mo or 1y
+
+        Returns:
+            np.ndarray: (6, m) rollup bars
+        """
+        key = (symbol.upper(), period)
+        n = bars.shape[1]
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and entry[0] == n:
+            return entry[1]
+
+        if entry is None or entry[0] > n or entry[1].shape[1] == 0:
+            rollup, starts = resample(bars, period)
+        else:
+            # Only the last period can change, aggregate again from its start
+            used, rollup, starts = entry
+            first = int(starts[-1])
+            tail, tail_starts = resample(bars[:, first:], period)
+            rollup = np.concatenate([rollup[:, :-1], tail], axis=1)
+            starts = np.concatenate([starts[:-1], tail_starts + first])
+
+        with self._lock:
+            self._entries[key] = (n, rollup, starts)
+        return rollup
+
+    def invalidate(self, symbol: str = None) -> None:
+        """Drops the cached rollups of one symbol, or of every symbol
+
+        Args:
+            symbol: Stock Symbol
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == symbol.upper()]:
+                    del self._entries[key]
+
+
+rollup_cache = RollupCache()
+
+
+def get_rollup(symbol: str, period: str) -> np.ndarray:
+    """Gets weekly, monthly or yearly bars of a stock from the history store
+
+    Args:
+        symbol: Stock Symbol
+        period: 1wk, 1mo or 1y
+
+    Returns:
+        np.ndarray: (6, m) array in history.COLUMNS order, or None if
+        there is no history for the stock
+    """
+    bars = history.get_bars(symbol)
+    if bars is None:
+        return None
+    return rollup_cache.get(symbol, bars, period)
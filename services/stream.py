@@ -0,0 +1,199 @@
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+from utils import refresh_stock_prices
+
+# Seconds between two polls of the subscribed symbols
+INTERVAL = float(os.getenv("STREAM_INTERVAL", 15))
+# Updates buffered per client, the oldest is dropped for slow clients
+QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 16))
+
+_hub = None
+_lock = threading.Lock()
+
+
+class Subscription:
+    """
+    A client's subscription to the quotes of some symbols
+    Updates are dicts of symbol -> price, read with get
+    """
+
+    def __init__(self, symbols: frozenset, size: int = QUEUE_SIZE):
+        self.symbols = symbols
+        self.queue = queue.Queue(maxsize=size)
+
+    def put(self, quotes: dict) -> None:
+        """Queues an update, dropping the oldest one if the client lags behind
+
+        Args:
+            quotes: Prices of the subscribed symbols that changed
+
+        Returns:
+            None
+        """
+        while True:
+            try:
+                self.queue.put_nowait(quotes)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float = None) -> dict:
+        """Waits for the next update
+
+        Args:
+            timeout: Seconds to wait (forever if None)
+
+        Returns:
+            dict: Prices of the subscribed symbols that changed
+
+        Raises:
+            queue.Empty: If no update came in time
+        """
+        return self.queue.get(timeout=timeout)
+
+
+class QuoteHub:
+    """
+    One poller shared by every streaming client of the process
+    Each tick the distinct subscribed symbols are fetched from the provider
+    with one batched call, whatever the number of clients, and fanned out to
+    the subscribers. The quote cache is bypassed, so every tick sees new
+    prices, and refreshed with what was fetched.
+    Symbols are reference-counted and stop being polled once nobody
+    subscribes to them
+    """
+
+    def __init__(
+        self,
+        fetch=refresh_stock_prices,
+        interval: float = INTERVAL,
+        queue_size: int = QUEUE_SIZE,
+    ):
+        self.fetch = fetch
+        self.interval = interval
+        self.queue_size = queue_size
+        self.refcounts = {}
+        self.subscribers = set()
+        self.last = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+
+    def subscribe(self, symbols) -> Subscription:
+        """Subscribes to the quotes of some symbols
+        The last known prices are sent right away
+
+        Args:
+            symbols: Stock Symbols
+
+        Returns:
+            Subscription
+        """
+        sub = Subscription(frozenset(sym.upper() for sym in symbols), self.queue_size)
+        with self._lock:
+            for sym in sub.symbols:
+                self.refcounts[sym] = self.refcounts.get(sym, 0) + 1
+            self.subscribers.add(sub)
+            known = {sym: self.last[sym] for sym in sub.symbols if sym in self.last}
+            self._wake.notify()
+        if known:
+            sub.put(known)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        """Ends a subscription, idle symbols are no longer polled
+
+        Args:
+            sub: Subscription returned by subscribe
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if sub not in self.subscribers:
+                return
+            self.subscribers.discard(sub)
+            for sym in sub.symbols:
+                self.refcounts[sym] -= 1
+                if self.refcounts[sym] == 0:
+                    del self.refcounts[sym]
+                    self.last.pop(sym, None)
+
+    def poll_once(self) -> dict:
+        """Fetches every subscribed symbol once and fans out the changes
+
+        Returns:
+            dict: Prices that changed since the last poll
+        """
+        with self._lock:
+            symbols = list(self.refcounts)
+        if not symbols:
+            return {}
+
+        prices = self.fetch(symbols)
+        with self._lock:
+            changed = {
+                sym: round(float(price), 2)
+                for sym, price in prices.items()
+                if sym in self.refcounts
+                and not pd.isna(price)
+                and self.last.get(sym) != round(float(price), 2)
+            }
+            self.last.update(changed)
+            subscribers = list(self.subscribers)
+
+        for sub in subscribers:
+            quotes = {sym: changed[sym] for sym in sub.symbols if sym in changed}
+            if quotes:
+                sub.put(quotes)
+        return changed
+
+    def start(self) -> None:
+        """Starts the poller thread
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="quote-poller", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                # Sleep without polling while nobody is subscribed
+                while not self.refcounts:
+                    self._wake.wait()
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Failed to poll quotes: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+
+def get_hub() -> QuoteHub:
+    """Gets the process-wide quote hub, started on first use
+
+    Returns:
+        QuoteHub
+    """
+    global _hub
+    if _hub is None:
+        with _lock:
+            if _hub is None:
+                hub = QuoteHub()
+                hub.start()
+                _hub = hub
+    return _hub
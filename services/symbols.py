@@ -0,0 +1,226 @@
+import csv
+import datetime as dt
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+# List of stock symbols from URL containing NASDAQ listings
+URL = (
+    "https://pkgstore.datahub.io/core/nasdaq-listings/nasdaq-listed_csv/"
+    + "data/7665719fb51081ba0bd834fde71ce822/nasdaq-listed_csv.csv"
+)
+SNAPSHOT_PATH = os.path.join(os.getenv("DATA_DIR", "data"), "symbols.json")
+MAX_AGE = int(os.getenv("SYMBOLS_MAX_AGE", 7 * 24 * 60 * 60))
+# Seconds between download attempts while there are no symbols at all
+RETRY_INTERVAL = float(os.getenv("SYMBOLS_RETRY_INTERVAL", 60))
+
+_symbols = None
+_retry_at = 0.0
+_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def download(url: str = URL) -> list:
+    """Downloads the NASDAQ listing and extracts the stock symbols
+
+    Args:
+        url: URL of the NASDAQ listings CSV
+
+    Returns:
+        list: Sorted stock symbols
+    """
+    import requests
+
+    res = requests.get(url, timeout=30)
+    res.raise_for_status()
+    reader = csv.DictReader(io.StringIO(res.content.decode("utf-8")))
+    return sorted({row["Symbol"].strip().upper() for row in reader if row["Symbol"]})
+
+
+def read_snapshot(path: str = SNAPSHOT_PATH) -> dict:
+    """Reads the local symbol snapshot
+
+    Args:
+        path: Path to snapshot file
+
+    Returns:
+        dict: Snapshot with version, fetched_at and symbols keys,
+        or None if there is no snapshot
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(symbols: list, path: str = SNAPSHOT_PATH) -> dict:
+    """Writes a new version of the local symbol snapshot
+    The file is replaced atomically so readers never see a partial snapshot
+
+    Args:
+        symbols: Stock symbols
+        path: Path to snapshot file
+
+    Returns:
+        dict: The snapshot that was written
+    """
+    previous = read_snapshot(path) or {}
+    snapshot = {
+        "version": previous.get("version", 0) + 1,
+        "fetched_at": dt.datetime.utcnow().isoformat(timespec="seconds"),
+        "source": URL,
+        "symbols": symbols,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+def refresh(path: str = SNAPSHOT_PATH) -> dict:
+    """Downloads the NASDAQ listing, stores it as a new snapshot
+    and swaps it into the in-process registry
+
+    Args:
+        path: Path to snapshot file
+
+    Returns:
+        dict: The snapshot that was written
+    """
+    global _symbols
+    snapshot = write_snapshot(download(), path)
+    _symbols = frozenset(snapshot["symbols"])
+    return snapshot
+
+
+def _refresh_in_background(path: str) -> None:
+    """Refreshes the snapshot in a daemon thread, keeping the current
+    symbols if the download fails
+
+    Args:
+        path: Path to snapshot file
+
+    Returns:
+        None
+    """
+    if _refreshing.is_set():
+        return
+    _refreshing.set()
+
+    def run():
+        try:
+            refresh(path)
+        except Exception as e:
+            print(f"Failed to refresh stock symbols: {e}")
+        finally:
+            _refreshing.clear()
+
+    threading.Thread(target=run, name="symbols-refresh", daemon=True).start()
+
+
+def _is_stale(snapshot: dict) -> bool:
+    try:
+        fetched_at = dt.datetime.fromisoformat(snapshot["fetched_at"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    age = dt.datetime.utcnow() - fetched_at
+    return age.total_seconds() > MAX_AGE
+
+
+def load(path: str = SNAPSHOT_PATH) -> frozenset:
+    """Loads the symbol registry once per process
+    Uses the local snapshot if there is one (refreshing it in the
+    background when it is stale), otherwise downloads it.
+    Providers that list their own symbols are used instead
+
+    If there is no snapshot and the download fails nothing is cached:
+    lookups see no symbols and the download is retried on a lookup
+    at most once every RETRY_INTERVAL seconds
+
+    Args:
+        path: Path to snapshot file
+
+    Returns:
+        frozenset: Stock symbols
+    """
+    global _symbols, _retry_at
+    if _symbols is not None:
+        return _symbols
+    if time.monotonic() < _retry_at:
+        return frozenset()
+
+    # Imported on first lookup, not when the app starts
+    from services import providers
+
+    with _lock:
+        # Offline providers (e.g. replay) only know their own symbols
+        listed = providers.get_provider().symbols()
+        if _symbols is None and listed is not None:
+            _symbols = frozenset(listed)
+        elif _symbols is None:
+            # Another thread may have failed while we waited for the lock
+            if time.monotonic() < _retry_at:
+                return frozenset()
+            snapshot = read_snapshot(path)
+            if snapshot is None:
+                try:
+                    snapshot = write_snapshot(download(), path)
+                except Exception as e:
+                    print(f"Failed to download stock symbols: {e}")
+                    _retry_at = time.monotonic() + RETRY_INTERVAL
+                    return frozenset()
+            elif _is_stale(snapshot):
+                _refresh_in_background(path)
+            _symbols = frozenset(snapshot["symbols"])
+    return _symbols
+
+
+def set_symbols(new_symbols) -> None:
+    """Replaces the in-process registry without touching the snapshot
+    Used for tests and offline runs
+
+    Args:
+        new_symbols: Stock symbols
+
+    Returns:
+        None
+    """
+    global _symbols
+    _symbols = frozenset(symbol.upper() for symbol in new_symbols)
+
+
+def is_valid(symbol: str) -> bool:
+    """Checks if a stock symbol is listed
+
+    Args:
+        symbol: Stock Symbol
+
+    Returns:
+        bool
+    """
+    return symbol.upper() in load()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["refresh"]:
+        start = time.perf_counter()
+        snapshot = refresh()
+        print(
+            f"Stored {len(snapshot['symbols'])} symbols as version "
+            f"{snapshot['version']} in {time.perf_counter() - start:.2f}s"
+        )
+    else:
+        snapshot = read_snapshot()
+        if snapshot is None:
+            print("No symbol snapshot, run: python -m services.symbols refresh")
+        else:
+            print(
+                f"Version {snapshot['version']} fetched at {snapshot['fetched_at']} "
+                f"with {len(snapshot['symbols'])} symbols"
+            )
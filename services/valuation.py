@@ -0,0 +1,140 @@
+import collections
+import os
+
+import numpy as np
+import pandas as pd
+
+from services import fx
+from utils import get_current_stock_prices
+
+# Quotes are in US dollars, the dashboard may show another currency
+QUOTE_CURRENCY = "USD"
+CURRENCY = os.getenv("PORTFOLIO_CURRENCY", QUOTE_CURRENCY)
+
+Position = collections.namedtuple(
+    "Position",
+    ["symbol", "quantity", "price", "value", "cost", "pnl", "pnl_pct", "weight"],
+)
+
+
+class Portfolio:
+    """
+    Valued holdings of a user, one array entry per position
+    Positions without a current price have NaN values and are left out
+    of the totals and weights
+    """
+
+    def __init__(
+        self,
+        symbols: list,
+        quantity: np.ndarray,
+        price: np.ndarray,
+        cost: np.ndarray,
+        currency: str = QUOTE_CURRENCY,
+        rate: float = 1.0,
+    ):
+        self.symbols = symbols
+        self.quantity = quantity
+        self.price = price
+        self.cost = cost
+        self.currency = currency
+        # Units of currency per unit of QUOTE_CURRENCY, to convert live quotes
+        self.rate = rate
+
+        self.value = quantity * price
+        self.pnl = self.value - cost
+        priced = ~np.isnan(self.value)
+        self.total_value = float(self.value[priced].sum())
+        self.total_cost = float(cost[priced].sum())
+        self.total_pnl = self.total_value - self.total_cost
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.pnl_pct = np.where(cost > 0, self.pnl / cost * 100, np.nan)
+            self.weight = self.value / self.total_value * 100
+            self.total_pnl_pct = (
+                self.total_pnl / self.total_cost * 100 if self.total_cost else None
+            )
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def positions(self) -> list:
+        """Lists the positions for display
+
+        Returns:
+            list: One Position per holding, None where there is no price
+        """
+        # NaN becomes None in the object array, so templates can test for it
+        columns = [
+            np.where(np.isnan(column), None, column).tolist()
+            for column in (
+                self.price,
+                self.value,
+                self.cost,
+                self.pnl,
+                self.pnl_pct,
+                self.weight,
+            )
+        ]
+        return [
+            Position(symbol, quantity, *values)
+            for symbol, quantity, *values in zip(
+                self.symbols, self.quantity.tolist(), *columns
+            )
+        ]
+
+
+def value_holdings(
+    holdings: list, prices: pd.Series, currency: str = QUOTE_CURRENCY, rates=None
+) -> Portfolio:
+    """Values holdings at the given prices
+
+    Args:
+        holdings: Rows returned by stock.query
+            (Date, Stock_Symbol, Price, Quantity, Email, Cost)
+        prices: Current prices in QUOTE_CURRENCY, indexed by symbol
+        currency: Currency to value the holdings in
+        rates: fx.FxRates used when currency is not QUOTE_CURRENCY
+
+    Returns:
+        Portfolio
+    """
+    symbols = [row[1].upper() for row in holdings]
+    fill_price = np.array([row[2] for row in holdings], dtype=float)
+    quantity = np.array([row[3] for row in holdings], dtype=float)
+    cost = np.array([row[5] or 0 for row in holdings], dtype=float)
+    # Holdings bought before costs were tracked are valued at their last fill
+    cost = np.where(cost > 0, cost, fill_price * quantity)
+    price = prices.reindex(symbols).to_numpy(dtype=float)
+
+    rate = 1.0
+    if currency != QUOTE_CURRENCY:
+        rate = rates.rate(QUOTE_CURRENCY, currency)
+        price = price * rate
+        cost = cost * rate
+    return Portfolio(symbols, quantity, price, cost, currency, rate)
+
+
+def get_portfolio(holdings: list, currency: str = CURRENCY) -> Portfolio:
+    """Values holdings at current prices, fetched with one batched call
+
+    Args:
+        holdings: Rows returned by stock.query
+        currency: Currency to value the holdings in
+
+    Returns:
+        Portfolio, with NaN prices if quotes are unavailable, in
+        QUOTE_CURRENCY if exchange rates are unavailable
+    """
+    symbols = [row[1] for row in holdings]
+    try:
+        prices = get_current_stock_prices(symbols)
+    except Exception as e:
+        print(f"Failed to price holdings: {e}")
+        prices = pd.Series(dtype=float)
+
+    if currency != QUOTE_CURRENCY:
+        try:
+            return value_holdings(holdings, prices, currency, fx.get_rates())
+        except Exception as e:
+            print(f"Failed to convert holdings to {currency}: {e}")
+    return value_holdings(holdings, prices)
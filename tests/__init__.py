@@ -3,12 +3,48 @@ Test folder for all
 integration tests
 """
 
-from back import get_current_stock_price
+import os
+from unittest import mock
+
+from services import providers
+
+# Market data is replayed from tests/data, the tests never hit the network
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def replay(test) -> providers.ReplayProvider:
+    """Serves market data from tests/data until the test ends
+
+    Args:
+        test: unittest.TestCase
+
+    Returns:
+        providers.ReplayProvider
+    """
+    provider = providers.ReplayProvider(DATA_DIR)
+    patcher = mock.patch.object(providers, "_provider", provider)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return provider
+
+
+class Offline(providers.Provider):
+    """
+    A provider without any market data, tests override what they use
+    """
+
+    name = "offline"
+
+    def quote(self, symbol: str) -> float:
+        raise ConnectionError("offline")
+
+    def history(self, symbol: str, start: str):
+        raise ConnectionError("offline")
 
 
 class Base:
     def __init__(self) -> None:
-        test_price = float(get_current_stock_price("AAPL"))
+        test_price = float(providers.ReplayProvider(DATA_DIR).quote("AAPL"))
 
         self.stock_data = {
             "path": "app.db",
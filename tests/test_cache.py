@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+
+from services.cache import TTLCache
+
+
+class TestCache(unittest.TestCase):
+    def test_ttl_expiry(self):
+        cache = TTLCache(ttl=0.05)
+        cache.set("AAPL", 150.0)
+        self.assertEqual(cache.get("AAPL"), 150.0)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("AAPL"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("AAPL", 1)
+        cache.set("MSFT", 2)
+        cache.get("AAPL")
+        cache.set("NVDA", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("MSFT"))
+        self.assertEqual(cache.get("AAPL"), 1)
+
+    def test_single_flight(self):
+        cache = TTLCache()
+        calls = []
+        barrier = threading.Barrier(20)
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return 42.0
+
+        def worker(results):
+            barrier.wait()
+            results.append(cache.get_or_load("AAPL", loader))
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(results,)) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [42.0] * 20)
+        self.assertEqual(cache.get_or_load("AAPL", loader), 42.0)
+        self.assertEqual(cache.stats()["misses"], 20)
+
+    def test_loader_error_is_shared_and_not_cached(self):
+        cache = TTLCache()
+
+        def loader():
+            raise ValueError("upstream down")
+
+        with self.assertRaises(ValueError):
+            cache.get_or_load("AAPL", loader)
+        self.assertEqual(cache.get_or_load("AAPL", lambda: 1.0), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
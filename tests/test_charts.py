@@ -0,0 +1,116 @@
+import gzip
+import json
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import app as server
+from services import charts, history, symbols
+from services.cache import TTLCache
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def daily_bars(n: int) -> np.ndarray:
+    """(6, n) bars, one per day from the epoch"""
+    close = np.linspace(100.0, 200.0, n)
+    return np.vstack(
+        [np.arange(n) * DAY_MS, close, close + 1, close - 1, close, np.full(n, 1000.0)]
+    )
+
+
+class ChartTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bars = daily_bars(500)
+        patches = [
+            mock.patch.object(history, "get_bars", lambda symbol: self.bars),
+            mock.patch.object(symbols, "_symbols", frozenset(["AAPL"])),
+            mock.patch.object(charts, "payload_cache", TTLCache(maxsize=16, ttl=60)),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TestPayloadCache(ChartTestCase):
+    def test_same_request_is_served_from_the_cache(self):
+        self.assertIs(charts.get_payload("AAPL"), charts.get_payload("AAPL"))
+
+    def test_key_follows_the_parameters(self):
+        payloads = [
+            charts.get_payload("AAPL"),
+            charts.get_payload("AAPL", start=100 * DAY_MS),
+            charts.get_payload("AAPL", end=100 * DAY_MS),
+            charts.get_payload("AAPL", points=100),
+            charts.get_payload("AAPL", fmt="bin"),
+            charts.get_payload("AAPL", interval="1wk"),
+            charts.get_payload("AAPL", names=("sma20",)),
+        ]
+        self.assertEqual(len({payload.etag for payload in payloads}), len(payloads))
+        self.assertEqual(len(charts.payload_cache), len(payloads))
+
+    def test_key_follows_the_stored_history(self):
+        before = charts.get_payload("AAPL")
+        self.bars = daily_bars(501)
+        after = charts.get_payload("AAPL")
+        self.assertNotEqual(before.etag, after.etag)
+        self.assertEqual(len(json.loads(after.body)["res"]), 501)
+
+
+class TestPipe(ChartTestCase):
+    def setUp(self):
+        super().setUp()
+        users = TTLCache()
+        users.set("test@gmail.com", ("test@gmail.com", "Test"))
+        for patcher in (
+            mock.patch.object(server, "_initialized", True),
+            mock.patch.object(server, "user_cache", users),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client = server.create_app().test_client()
+        with self.client.session_transaction() as session:
+            session["user_email"] = "test@gmail.com"
+
+    def test_plain_body_without_gzip(self):
+        response = self.client.get("/pipe?symbol=AAPL")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(len(json.loads(response.data)["res"]), 500)
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+
+    def test_gzip_when_accepted(self):
+        plain = self.client.get("/pipe?symbol=AAPL")
+        response = self.client.get(
+            "/pipe?symbol=AAPL", headers={"Accept-Encoding": "gzip, deflate"}
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        # Both encodings share the ETag of the uncompressed body
+        self.assertEqual(response.headers["ETag"], plain.headers["ETag"])
+
+    def test_if_none_match(self):
+        etag = self.client.get("/pipe?symbol=AAPL").headers["ETag"]
+        response = self.client.get("/pipe?symbol=AAPL", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+        # A different request no longer matches the old ETag
+        response = self.client.get(
+            "/pipe?symbol=AAPL&points=100", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_stale_etag_after_new_history(self):
+        etag = self.client.get("/pipe?symbol=AAPL").headers["ETag"]
+        self.bars = daily_bars(501)
+        response = self.client.get("/pipe?symbol=AAPL", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
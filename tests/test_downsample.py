@@ -0,0 +1,36 @@
+import unittest
+
+import numpy as np
+
+from services.downsample import downsample, lttb, minmax
+
+
+class TestDownsample(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = np.arange(5000, dtype=float)
+        self.y = np.cumsum(rng.normal(size=5000))
+
+    def test_lttb_keeps_ends_and_threshold(self):
+        keep = lttb(self.x, self.y, 500)
+        self.assertEqual(len(keep), 500)
+        self.assertEqual((keep[0], keep[-1]), (0, 4999))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_lttb_keeps_extremes(self):
+        y = np.zeros(1000)
+        y[437] = 100.0
+        self.assertIn(437, lttb(np.arange(1000.0), y, 50))
+
+    def test_minmax_keeps_global_extremes(self):
+        keep = minmax(self.y, 200)
+        self.assertIn(np.argmax(self.y), keep)
+        self.assertIn(np.argmin(self.y), keep)
+
+    def test_short_series_untouched(self):
+        bars = np.vstack([self.x[:50]] * 6)
+        self.assertIs(downsample(bars, 100), bars)
+
+
+if __name__ == "__main__":
+    unittest.main()
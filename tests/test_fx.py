@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from functools import partial
+from unittest import mock
+
+from services import fx, providers
+from services.fx import FxRates
+from utils import Currency_Conversion
+
+from . import Offline
+
+RATES = {"EUR": 1.0, "USD": 1.1, "INR": 90.0, "GBP": 0.85}
+
+
+class FlakyRates(Offline):
+    """Rates that are unreachable until up is set"""
+
+    name = "flaky"
+    up = False
+
+    def fx_rates(self) -> dict:
+        if not self.up:
+            raise ConnectionError("rates down")
+        return {"base": "EUR", "rates": RATES}
+
+
+class TestFx(unittest.TestCase):
+    def test_convert_matches_rates(self):
+        c = Currency_Conversion(rates=RATES)
+        self.assertEqual(c.convert("USD", "INR", 100), round(100 / 1.1 * 90.0, 2))
+        self.assertEqual(c.convert("EUR", "GBP", 10), 8.5)
+        self.assertEqual(c.convert("INR", "INR", 12.345), 12.35)
+
+    def test_convert_many(self):
+        c = Currency_Conversion(rates=RATES)
+        converted = c.convert_many("USD", "INR", [1, 10, 100])
+        self.assertEqual(
+            list(converted),
+            [c.convert("USD", "INR", amount) for amount in (1, 10, 100)],
+        )
+
+    def test_load_from_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fx_rates.json")
+            with open(path, "w") as f:
+                json.dump({"fetched_at": "2021-09-19T00:00:00", "rates": RATES}, f)
+
+            rates = FxRates("http://localhost:1/unreachable", path=path)
+            rates.load()
+            self.assertEqual(rates.convert("EUR", "USD", 100), 110.0)
+            self.assertGreater(rates.age(), 0)
+
+    def test_starts_without_rates_and_retries(self):
+        provider = FlakyRates()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            providers, "_provider", provider
+        ), mock.patch.object(fx, "_service", None), mock.patch.object(
+            fx,
+            "FxRates",
+            partial(
+                FxRates, path=os.path.join(tmp, "fx_rates.json"), retry_interval=0.01
+            ),
+        ):
+            rates = fx.get_rates()
+            self.addCleanup(rates.stop)
+            self.assertIs(fx.get_rates(), rates)
+            with self.assertRaises(fx.RatesUnavailable):
+                rates.convert("EUR", "USD", 100)
+
+            provider.up = True
+            deadline = time.monotonic() + 5
+            while rates.converter is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(rates.convert("EUR", "USD", 100), 110.0)
+            self.assertTrue(os.path.exists(os.path.join(tmp, "fx_rates.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
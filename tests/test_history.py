@@ -0,0 +1,157 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from services import history, providers
+
+from . import Offline
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FakeHistory(Offline):
+    """Daily bars ending today, history calls are recorded"""
+
+    name = "fake"
+
+    def __init__(self, days: int = 30):
+        dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+        close = np.arange(1.0, days + 1)
+        self.frame = pd.DataFrame(
+            {
+                "Open": close,
+                "High": close,
+                "Low": close,
+                "Close": close,
+                "Volume": close,
+            },
+            index=dates,
+        )
+        self.starts = []
+        self.error = None
+
+    def history(self, symbol: str, start: str) -> pd.DataFrame:
+        self.starts.append(start)
+        if self.error is not None:
+            raise self.error
+        return self.frame[self.frame.index >= pd.Timestamp(start)]
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.provider = FakeHistory()
+        patcher = mock.patch.object(providers, "_provider", self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_stale(self):
+        old = time.time() - history.TTL - 1
+        os.utime(history._path("X", self.dir), (old, old))
+
+    def test_first_fetch_stores_everything(self):
+        bars = history.get_bars("X", self.dir)
+        self.assertEqual(self.provider.starts, [history.START])
+        self.assertEqual(bars.shape, (6, 30))
+        np.testing.assert_array_equal(history.load("X", self.dir), bars)
+
+    def test_fresh_store_is_not_fetched_again(self):
+        history.get_bars("X", self.dir)
+        history.get_bars("X", self.dir)
+        self.assertEqual(len(self.provider.starts), 1)
+
+    def test_incremental_append(self):
+        full = self.provider.frame
+        self.provider.frame = full.iloc[:25]
+        history.get_bars("X", self.dir)
+
+        self.provider.frame = full
+        self.make_stale()
+        bars = history.get_bars("X", self.dir)
+        # Only the days from the last stored bar on are asked for
+        self.assertEqual(self.provider.starts[-1], full.index[24].strftime("%Y-%m-%d"))
+        np.testing.assert_array_equal(bars, history.from_frame(full))
+
+    def test_partial_last_bar_is_replaced(self):
+        full = self.provider.frame
+        self.provider.frame = full.copy()
+        self.provider.frame.iloc[-1] = 0.5
+        history.get_bars("X", self.dir)
+
+        self.provider.frame = full
+        self.make_stale()
+        bars = history.get_bars("X", self.dir)
+        np.testing.assert_array_equal(bars, history.from_frame(full))
+
+    def test_no_new_bars_keeps_the_store(self):
+        self.provider.frame = self.provider.frame.iloc[:-1]
+        stored = history.get_bars("X", self.dir)
+        self.provider.frame = self.provider.frame.iloc[:0]
+        self.make_stale()
+        np.testing.assert_array_equal(history.get_bars("X", self.dir), stored)
+        self.assertFalse(history.is_stale("X", self.dir))
+
+    def test_empty_fetch_is_not_stored(self):
+        self.provider.frame = self.provider.frame.iloc[:0]
+        self.assertIsNone(history.get_bars("X", self.dir))
+        self.assertFalse(os.path.exists(history._path("X", self.dir)))
+        # Not marked fresh, the next request asks again
+        self.assertIsNone(history.get_bars("X", self.dir))
+        self.assertEqual(len(self.provider.starts), 2)
+
+    def test_failed_fetch(self):
+        self.provider.error = ConnectionError("provider down")
+        self.assertIsNone(history.get_bars("X", self.dir))
+
+        self.provider.error = None
+        stored = history.get_bars("X", self.dir)
+        self.make_stale()
+        self.provider.error = ConnectionError("provider down")
+        # The stored history is served as it is
+        np.testing.assert_array_equal(history.get_bars("X", self.dir), stored)
+
+    def test_concurrent_updates_append_once(self):
+        full = self.provider.frame
+        self.provider.frame = full.iloc[:20]
+        history.get_bars("X", self.dir)
+        self.provider.frame = full
+        self.make_stale()
+
+        threads = [
+            threading.Thread(target=history.update, args=("X", self.dir))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        bars = history.load("X", self.dir)
+        self.assertEqual(bars.shape[1], 30)
+        self.assertTrue(np.all(np.diff(bars[0]) > 0))
+
+    @unittest.skipIf(fcntl is None, "flock is not available")
+    def test_file_lock_is_exclusive(self):
+        path = history._path("X", self.dir)
+        with history._FileLock(path):
+            with open(path + ".lock", "a") as other:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with open(path + ".lock", "a") as other:
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+if __name__ == "__main__":
+    unittest.main()
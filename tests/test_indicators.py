@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from benchmarks._fixtures import synthetic_bars
+from services import charts, indicators
+from services.indicators import ROWS, IndicatorCache, compute
+
+
+class TestIndicators(unittest.TestCase):
+    def setUp(self):
+        self.bars = synthetic_bars(3000)
+        self.close = self.bars[4]
+        self.values = compute(self.close)
+
+    def row(self, name):
+        return self.values[ROWS.index(name)]
+
+    def test_matches_pandas(self):
+        s = pd.Series(self.close)
+        np.testing.assert_allclose(self.row("sma50"), s.rolling(50).mean())
+        np.testing.assert_allclose(
+            self.row("ema20"), s.ewm(span=20, adjust=False).mean()
+        )
+        macd = s.ewm(span=12, adjust=False).mean() - s.ewm(span=26, adjust=False).mean()
+        np.testing.assert_allclose(self.row("macd"), macd)
+        upper = s.rolling(20).mean() + 2 * s.rolling(20).std(ddof=0)
+        np.testing.assert_allclose(self.row("bb_upper"), upper)
+
+    def test_rsi_bounds(self):
+        rsi = self.row("rsi14")
+        self.assertTrue(np.isnan(rsi[:14]).all())
+        self.assertTrue(((rsi[14:] >= 0) & (rsi[14:] <= 100)).all())
+
+    def test_incremental_update_matches_full(self):
+        cache = IndicatorCache()
+        cache.get("X", self.bars[:, :2000])
+        cache.get("X", self.bars[:, :2001])
+        np.testing.assert_allclose(cache.get("X", self.bars), self.values, rtol=1e-9)
+
+    def test_changed_last_bar(self):
+        close = self.close.copy()
+        close[-1] *= 1.05
+        np.testing.assert_allclose(
+            compute(close, self.values), compute(close), rtol=1e-9
+        )
+
+    def test_binary_payload_carries_indicators(self):
+        names = ("sma20", "rsi14")
+        series = np.vstack([self.bars, indicators.select(self.values, names)])
+        decoded = charts.decode_binary(charts.encode_binary(series))
+        np.testing.assert_array_equal(decoded[6:], series[6:])
+
+
+if __name__ == "__main__":
+    unittest.main()
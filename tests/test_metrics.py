@@ -0,0 +1,71 @@
+import threading
+import unittest
+
+from services import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.histogram = metrics.Histogram(
+            "test_seconds", "Test", ("route",), buckets=(0.01, 0.1), register=False
+        )
+
+    def test_buckets_are_cumulative(self):
+        for seconds in (0.005, 0.01, 0.05, 2.0):
+            self.histogram.observe(seconds, "/trade")
+        lines = self.histogram.render()
+        self.assertIn('test_seconds_bucket{route="/trade",le="0.01"} 2', lines)
+        self.assertIn('test_seconds_bucket{route="/trade",le="0.1"} 3', lines)
+        self.assertIn('test_seconds_bucket{route="/trade",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_count{route="/trade"} 4', lines)
+        self.assertIn('test_seconds_sum{route="/trade"} 2.065', lines)
+
+    def test_label_values_are_escaped(self):
+        self.histogram.observe(0.001, 'a"b\\c')
+        self.assertIn(
+            'test_seconds_count{route="a\\"b\\\\c"} 1', self.histogram.render()
+        )
+
+    def test_wrong_labels(self):
+        with self.assertRaises(ValueError):
+            self.histogram.observe(0.001, "/trade", "POST")
+
+    def test_timed_names_series_after_function(self):
+        @metrics.timed(self.histogram)
+        def check(fail):
+            if fail:
+                raise RuntimeError("fail")
+            return 1
+
+        self.assertEqual(check(False), 1)
+        with self.assertRaises(RuntimeError):
+            check(True)
+        self.assertIn(
+            'test_seconds_count{route="test_metrics.check"} 2', self.histogram.render()
+        )
+
+    def test_timer_and_concurrent_observations(self):
+        def observe():
+            for _ in range(1000):
+                with self.histogram.time("/pipe"):
+                    pass
+
+        threads = [threading.Thread(target=observe) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn('test_seconds_count{route="/pipe"} 4000', self.histogram.render())
+
+    def test_render_exports_registered_histograms(self):
+        metrics.MODEL_SECONDS.observe(0.001, "users.get_user")
+        text = metrics.render()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn(
+            'model_call_duration_seconds_count{function="users.get_user"}', text
+        )
+        self.assertNotIn("test_seconds", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
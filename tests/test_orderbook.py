@@ -0,0 +1,272 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import models.stock as st
+from models import db, migrations
+from services import orderbook, symbols
+from services.orderbook import (
+    BUY,
+    SELL,
+    JournalLocked,
+    MatchingEngine,
+    Order,
+    OrderBook,
+)
+
+
+class TestOrderBook(unittest.TestCase):
+    def test_price_time_priority(self):
+        book = OrderBook("AAPL")
+        for id, price in ((1, 101.0), (2, 100.0), (3, 100.0)):
+            book.rest(Order(id, "s@gmail.com", "AAPL", SELL, 5, price))
+        trades = book.match(Order(4, "b@gmail.com", "AAPL", BUY, 12, 101.0))
+        self.assertEqual(
+            [(resting.id, price, quantity) for resting, price, quantity in trades],
+            [(2, 100.0, 5), (3, 100.0, 5), (1, 101.0, 2)],
+        )
+        self.assertEqual(book.best_ask().remaining, 3)
+
+    def test_limit_is_respected(self):
+        book = OrderBook("AAPL")
+        book.rest(Order(1, "s@gmail.com", "AAPL", SELL, 5, 101.0))
+        order = Order(2, "b@gmail.com", "AAPL", BUY, 5, 100.0)
+        self.assertEqual(book.match(order, quote=102.0), [])
+        self.assertEqual(order.remaining, 5)
+
+    def test_book_before_quote(self):
+        book = OrderBook("AAPL")
+        book.rest(Order(1, "s@gmail.com", "AAPL", SELL, 3, 99.0))
+        book.rest(Order(2, "s@gmail.com", "AAPL", SELL, 3, 100.5))
+        trades = book.match(Order(3, "b@gmail.com", "AAPL", BUY, 5, None), quote=100.0)
+        # The ask above the quote is left for the market to beat
+        self.assertEqual(
+            [
+                (resting and resting.id, price, quantity)
+                for resting, price, quantity in trades
+            ],
+            [(1, 99.0, 3), (None, 100.0, 2)],
+        )
+
+    def test_cross(self):
+        book = OrderBook("AAPL")
+        book.rest(Order(1, "b@gmail.com", "AAPL", BUY, 2, 95.0))
+        book.rest(Order(2, "b@gmail.com", "AAPL", BUY, 2, 90.0))
+        trades = book.cross(94.0)
+        self.assertEqual(
+            [(resting.id, price) for resting, price, _ in trades], [(1, 94.0)]
+        )
+        self.assertEqual(book.best_bid().id, 2)
+
+
+class TestMatchingEngine(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(symbols, "_symbols", frozenset(["AAPL"]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "orders.db")
+        self.journal = os.path.join(self.tmp.name, "orderbook.journal")
+        self.prices = {"AAPL": 100.0}
+        migrations.migrate(self.path)
+        st.buy("stock", ("19-09-2021", "AAPL", 90.0, 10, "s@gmail.com"), self.path)
+
+    def tearDown(self):
+        db.close()
+        self.tmp.cleanup()
+
+    def engine(self) -> MatchingEngine:
+        engine = MatchingEngine(self.path, self.journal, quote=self.prices.get)
+        engine.recover()
+        return engine
+
+    def crash(self, engine: MatchingEngine) -> None:
+        """Drops the engine like a killed process, nothing is flushed"""
+        engine._journal.close()
+        engine._journal_lock.close()
+
+    def test_limit_orders_match_each_other(self):
+        engine = self.engine()
+        self.prices["AAPL"] = None
+        sell, fills = engine.submit("s@gmail.com", "AAPL", SELL, 4, 101.0)
+        self.assertEqual(fills, [])
+        buy, fills = engine.submit("b@gmail.com", "aapl", BUY, 6, 102.0)
+        self.assertEqual(
+            [(f.side, f.quantity, f.price) for f in fills], [(BUY, 4, 101.0)]
+        )
+        self.assertEqual(engine.open_orders("b@gmail.com"), [buy])
+        self.assertEqual(engine.flush(), 2)
+        self.assertEqual(st.holding("s@gmail.com", "AAPL", self.path), 6)
+        self.assertEqual(st.holding("b@gmail.com", "AAPL", self.path), 4)
+        engine.stop()
+
+    def test_market_orders_never_rest(self):
+        engine = self.engine()
+        self.prices["AAPL"] = None
+        order, fills = engine.submit("b@gmail.com", "AAPL", BUY, 5)
+        self.assertEqual(fills, [])
+        self.assertTrue(order.cancelled)
+        self.assertEqual(engine.open_orders("b@gmail.com"), [])
+        engine.stop()
+
+    def test_sells_are_reserved(self):
+        engine = self.engine()
+        engine.submit("s@gmail.com", "AAPL", SELL, 8, 120.0)
+        with self.assertRaises(ValueError):
+            engine.submit("s@gmail.com", "AAPL", SELL, 3, 120.0)
+        (order,) = engine.open_orders("s@gmail.com")
+        self.assertFalse(engine.cancel("b@gmail.com", order.id))
+        self.assertTrue(engine.cancel("s@gmail.com", order.id))
+        engine.submit("s@gmail.com", "AAPL", SELL, 3, 120.0)
+        engine.stop()
+
+    def test_sweep_fills_crossed_orders(self):
+        engine = self.engine()
+        engine.submit("b@gmail.com", "AAPL", BUY, 2, 95.0)
+        (fill,) = engine.sweep({"AAPL": 94.5})
+        self.assertEqual((fill.quantity, fill.price), (2, 94.5))
+        self.assertEqual(engine.open_orders("b@gmail.com"), [])
+        engine.stop()
+
+    def test_recovery(self):
+        engine = self.engine()
+        engine.submit("s@gmail.com", "AAPL", SELL, 4, 110.0)
+        engine.submit("b@gmail.com", "AAPL", BUY, 1, 101.0)
+        # Crash: the buy filled against the quote but was never written
+        self.crash(engine)
+
+        engine = self.engine()
+        (order,) = engine.open_orders("s@gmail.com")
+        self.assertEqual((order.price, order.remaining), (110.0, 4))
+        self.assertEqual(st.holding("b@gmail.com", "AAPL", self.path), 1)
+        self.assertEqual(engine.reserved[("s@gmail.com", "AAPL")], 4)
+        engine.stop()
+
+        # Recovered again, the fill is not written twice
+        engine = self.engine()
+        self.assertEqual(st.holding("b@gmail.com", "AAPL", self.path), 1)
+        order, _ = engine.submit("b@gmail.com", "AAPL", BUY, 1, 101.0)
+        self.assertEqual(order.id, 3)
+        engine.stop()
+
+    def test_torn_journal_line_is_ignored(self):
+        engine = self.engine()
+        engine.submit("b@gmail.com", "AAPL", BUY, 1, 90.0)
+        engine._journal.write('{"op":"add","id":')
+        self.crash(engine)
+        engine = self.engine()
+        self.assertEqual(len(engine.open_orders("b@gmail.com")), 1)
+        engine.stop()
+
+    def test_fills_are_written_once(self):
+        fills = [
+            (1, 1, "19-09-2021", "b@gmail.com", "AAPL", BUY, 2, 100.0),
+            (2, 2, "19-09-2021", "s@gmail.com", "AAPL", SELL, 2, 100.0),
+        ]
+        self.assertEqual(st.apply_fills(fills, self.path), 2)
+        self.assertEqual(st.apply_fills(fills, self.path), 0)
+        self.assertEqual(st.fill_watermark(self.path), 2)
+        self.assertEqual(st.holding("b@gmail.com", "AAPL", self.path), 2)
+        self.assertEqual(st.holding("s@gmail.com", "AAPL", self.path), 8)
+
+    def test_failed_trades_are_dropped_whole(self):
+        fills = [
+            (1, 1, "19-09-2021", "s@gmail.com", "AAPL", SELL, 20, 100.0),
+            (2, 1, "19-09-2021", "b@gmail.com", "AAPL", BUY, 20, 100.0),
+            (3, 3, "19-09-2021", "b2@gmail.com", "AAPL", BUY, 1, 100.0),
+        ]
+        # s@gmail.com only owns 10, b@gmail.com gets nothing
+        self.assertEqual(st.apply_fills(fills, self.path), 1)
+        self.assertEqual(st.fill_watermark(self.path), 3)
+        self.assertEqual(st.holding("b@gmail.com", "AAPL", self.path), 0)
+        self.assertEqual(st.holding("s@gmail.com", "AAPL", self.path), 10)
+        self.assertEqual(st.holding("b2@gmail.com", "AAPL", self.path), 1)
+
+    def test_market_sell_respects_reservations(self):
+        engine = self.engine()
+        engine.submit("s@gmail.com", "AAPL", SELL, 8, 120.0)
+        self.assertFalse(engine.sell("s@gmail.com", "AAPL", 3, 100.0, "20-09-2021"))
+        self.assertTrue(engine.sell("s@gmail.com", "AAPL", 2, 100.0, "20-09-2021"))
+        self.assertEqual(st.holding("s@gmail.com", "AAPL", self.path), 8)
+        engine.stop()
+
+    def test_early_wakeups_do_not_sweep(self):
+        engine = MatchingEngine(
+            self.path,
+            None,
+            quote=self.prices.get,
+            flush_interval=0.05,
+            sweep_interval=0.5,
+        )
+        with mock.patch.object(engine, "sweep_quotes") as sweep:
+            engine.start()
+            # Wakeups for full batches, far more often than the flush interval
+            deadline = time.monotonic() + 0.3
+            while time.monotonic() < deadline:
+                engine._wakeup.set()
+                time.sleep(0.001)
+            self.assertEqual(sweep.call_count, 0)
+            time.sleep(0.4)
+            engine.stop(1)
+        self.assertEqual(sweep.call_count, 1)
+
+    def test_worker_compacts_the_journal(self):
+        engine = MatchingEngine(
+            self.path,
+            self.journal,
+            quote=self.prices.get,
+            flush_interval=0.05,
+            compact_size=1024,
+        )
+        engine.recover()
+        engine.start()
+        for _ in range(20):
+            order, _ = engine.submit("b@gmail.com", "AAPL", BUY, 1, 90.0)
+            engine.cancel("b@gmail.com", order.id)
+        engine.submit("s@gmail.com", "AAPL", SELL, 4, 110.0)
+        deadline = time.monotonic() + 2
+        while os.path.getsize(self.journal) >= 1024 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        engine._stop.set()
+        engine._thread.join(1)
+        self.crash(engine)
+
+        with open(self.journal) as f:
+            # The counters and the open sell
+            self.assertEqual(len(f.readlines()), 2)
+        engine = self.engine()
+        (order,) = engine.open_orders("s@gmail.com")
+        self.assertEqual((order.id, order.remaining), (21, 4))
+        engine.stop()
+
+    def test_journal_has_one_owner(self):
+        engine = self.engine()
+        with self.assertRaises(JournalLocked):
+            self.engine()
+        engine.stop()
+        self.engine().stop()
+
+    def test_get_engine(self):
+        orderbook._engine = None
+        journal_path, orderbook.JOURNAL_PATH = orderbook.JOURNAL_PATH, self.journal
+        try:
+            owner = self.engine()
+            # Another process owns the books
+            self.assertIsNone(orderbook.get_engine(self.path))
+            owner.stop()
+            self.assertIsNone(orderbook.get_engine(self.path))
+
+            orderbook._retry_at = 0.0
+            engine = orderbook.get_engine(self.path)
+            self.assertIs(orderbook.get_engine(self.path), engine)
+        finally:
+            engine.stop()
+            orderbook._retry_at = 0.0
+            orderbook._engine = None
+            orderbook.JOURNAL_PATH = journal_path
+
+
+if __name__ == "__main__":
+    unittest.main()
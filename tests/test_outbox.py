@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+
+from models import db, migrations, outbox
+from services.mailer import MailgunTransport, OutboxWorkers
+
+
+class MailgunStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the Mailgun messages endpoint"""
+
+    received = []
+    fail = False
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        form = parse_qs(self.rfile.read(length).decode())
+        if MailgunStandIn.fail:
+            self.send_response(503)
+        else:
+            MailgunStandIn.received.append(form["to"][0])
+            self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOutbox(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("localhost", 0), MailgunStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://localhost:{cls.server.server_port}/messages"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        MailgunStandIn.received = []
+        MailgunStandIn.fail = False
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "outbox.db")
+        migrations.migrate(self.path)
+        self.workers = OutboxWorkers(
+            self.path,
+            transport=MailgunTransport(self.url, "test@localhost", "key"),
+            batch_size=3,
+            max_attempts=2,
+            retry_delay=0,
+        )
+
+    def tearDown(self):
+        db.close()
+        self.tmp.cleanup()
+
+    def test_mails_are_delivered(self):
+        for i in range(5):
+            outbox.enqueue(self.path, f"user{i}@gmail.com", "Subject", "Body")
+        self.assertEqual(self.workers.drain_once(), 3)
+        self.assertEqual(self.workers.drain_once(), 2)
+        self.assertEqual(self.workers.drain_once(), 0)
+        self.assertEqual(len(MailgunStandIn.received), 5)
+        self.assertEqual(outbox.counts(self.path), {"sent": 5})
+
+    def test_failures_are_retried_then_dead_lettered(self):
+        MailgunStandIn.fail = True
+        outbox.enqueue(self.path, "test@gmail.com", "Subject", "Body")
+        self.workers.drain_once()
+        self.assertEqual(outbox.counts(self.path), {"pending": 1})
+        self.workers.drain_once()
+        self.assertEqual(outbox.counts(self.path), {"dead": 1})
+        self.assertEqual(self.workers.drain_once(), 0)
+
+    def test_retry_succeeds(self):
+        MailgunStandIn.fail = True
+        outbox.enqueue(self.path, "test@gmail.com", "Subject", "Body")
+        self.workers.drain_once()
+        MailgunStandIn.fail = False
+        self.workers.drain_once()
+        self.assertEqual(MailgunStandIn.received, ["test@gmail.com"])
+        self.assertEqual(outbox.counts(self.path), {"sent": 1})
+
+    def test_expired_lease_cannot_be_marked(self):
+        mail_id = outbox.enqueue(self.path, "test@gmail.com", "Subject", "Body")
+        # The first worker stalls past its lease, a second one claims the mail
+        self.assertEqual(len(outbox.claim(self.path, 1, -1, "first")), 1)
+        self.assertEqual(len(outbox.claim(self.path, 1, 60, "second")), 1)
+
+        self.assertEqual(outbox.mark_sent(self.path, [mail_id], "first"), 0)
+        self.assertFalse(outbox.mark_failed(self.path, mail_id, "first", "timeout"))
+        self.assertEqual(outbox.counts(self.path), {"sending": 1})
+
+        self.assertEqual(outbox.mark_sent(self.path, [mail_id], "second"), 1)
+        self.assertEqual(outbox.counts(self.path), {"sent": 1})
+        self.assertFalse(outbox.mark_failed(self.path, mail_id, "second", "late"))
+        self.assertEqual(outbox.counts(self.path), {"sent": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
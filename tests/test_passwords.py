@@ -0,0 +1,70 @@
+import binascii
+import hashlib
+import time
+import unittest
+from unittest import mock
+
+from services import passwords
+
+
+def legacy_hash(pwd: str) -> str:
+    """A hash in the original salt + PBKDF2-SHA512 format"""
+    salt = "a" * 64
+    pwd_hash = hashlib.pbkdf2_hmac(
+        "sha512", pwd.encode("utf-8"), salt.encode("ascii"), 100000
+    )
+    return salt + binascii.hexlify(pwd_hash).decode("ascii")
+
+
+class TestPasswords(unittest.TestCase):
+    def test_hash_records_scheme_and_cost(self):
+        stored = passwords.hash_password("abc123ABC")
+        self.assertTrue(
+            stored.startswith(f"$pbkdf2-sha512${passwords.PBKDF2_ITERATIONS}$")
+        )
+        self.assertTrue(passwords.verify_password("abc123ABC", stored))
+        self.assertFalse(passwords.verify_password("abc123ABc", stored))
+        self.assertFalse(passwords.needs_rehash(stored))
+
+    def test_legacy_hashes_still_verify(self):
+        stored = legacy_hash("test123")
+        self.assertTrue(passwords.verify_password("test123", stored))
+        self.assertFalse(passwords.verify_password("test124", stored))
+        self.assertTrue(passwords.needs_rehash(stored))
+
+    def test_scrypt_hashes_verify(self):
+        stored = "$scrypt$1024,8,1$" + "b" * 64 + "$"
+        stored += passwords._scrypt("test123", "b" * 64, 1024, 8, 1)
+        self.assertTrue(passwords.verify_password("test123", stored))
+        self.assertTrue(passwords.needs_rehash(stored))
+
+    def test_scrypt_parallel_cost(self):
+        for n, r, p in ((1024, 8, 2), (16, 1, 32)):
+            expected = hashlib.scrypt(
+                b"test123", salt=b"b" * 64, n=n, r=r, p=p, maxmem=2**26, dklen=64
+            )
+            stored = f"$scrypt${n},{r},{p}$" + "b" * 64 + "$"
+            stored += passwords._scrypt("test123", "b" * 64, n, r, p)
+            self.assertTrue(stored.endswith(binascii.hexlify(expected).decode("ascii")))
+            self.assertTrue(passwords.verify_password("test123", stored))
+
+    def test_pool_runs_hashes(self):
+        stored = passwords.run(passwords.hash_password, "test123")
+        self.assertTrue(passwords.run(passwords.verify_password, "test123", stored))
+
+    def test_timeout_keeps_the_slot_until_done(self):
+        slots = passwords.threading.BoundedSemaphore(1)
+        with mock.patch.object(passwords, "_slots", slots), mock.patch.object(
+            passwords, "TIMEOUT", 0.05
+        ):
+            with self.assertRaises(passwords.HashingBusy):
+                passwords.run(time.sleep, 0.5)
+            # Still hashing, no slot for another call
+            with self.assertRaises(passwords.HashingBusy):
+                passwords.run(time.sleep, 0)
+            time.sleep(1)
+            self.assertIsNone(passwords.run(time.sleep, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
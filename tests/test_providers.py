@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import app as server
+from services import history, providers, symbols
+from services.cache import TTLCache
+from utils import get_current_stock_prices, quote_cache
+
+from . import DATA_DIR, Offline, replay
+
+
+class TestReplayProvider(unittest.TestCase):
+    def setUp(self):
+        self.provider = replay(self)
+        quote_cache.invalidate()
+
+    def test_quote_is_last_close(self):
+        self.assertEqual(self.provider.quote("aapl"), 141.01)
+
+    def test_replay_date(self):
+        provider = providers.ReplayProvider(DATA_DIR, date="2021-01-05")
+        self.assertEqual(provider.quote("AAPL"), 128.66)
+
+    def test_unknown_symbol_is_nan(self):
+        prices = get_current_stock_prices(["AAPL", "MSFT"])
+        self.assertEqual(prices["AAPL"], 141.01)
+        self.assertTrue(np.isnan(prices["MSFT"]))
+
+    def test_history_store_fills_from_replay(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            bars = history.update("AAPL", tmp)
+        self.assertEqual(bars.shape, (6, 185))
+        self.assertEqual(bars[4, -1], 141.01)
+
+    def test_symbols_and_rates(self):
+        self.assertEqual(self.provider.symbols(), ["AAPL"])
+        self.assertIn("USD", self.provider.fx_rates()["rates"])
+
+    def test_missing_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                providers.ReplayProvider(os.path.join(tmp, "missing"))
+
+
+class TestYFinanceProvider(unittest.TestCase):
+    def test_empty_download(self):
+        import yfinance
+
+        with mock.patch.object(yfinance, "download", return_value=pd.DataFrame()):
+            prices = providers.YFinanceProvider().quotes(["AAPL", "MSFT"])
+        self.assertTrue(prices.empty)
+
+
+class Unreachable(Offline):
+    name = "unreachable"
+
+    def quotes(self, symbols: list):
+        raise ConnectionError("provider down")
+
+
+class TestQuotesApi(unittest.TestCase):
+    def setUp(self):
+        replay(self)
+        users = TTLCache()
+        users.set("test@gmail.com", ("test@gmail.com", "Test"))
+        for patcher in (
+            mock.patch.object(server, "_initialized", True),
+            mock.patch.object(server, "user_cache", users),
+            mock.patch.object(symbols, "_symbols", frozenset(["AAPL"])),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        quote_cache.invalidate()
+
+        self.client = server.create_app().test_client()
+        with self.client.session_transaction() as session:
+            session["user_email"] = "test@gmail.com"
+
+    def test_quotes(self):
+        response = self.client.get("/api/quotes?symbols=AAPL")
+        self.assertEqual(response.get_json(), {"quotes": {"AAPL": 141.01}})
+
+    def test_provider_failure(self):
+        with mock.patch.object(providers, "_provider", Unreachable()):
+            response = self.client.get("/api/quotes?symbols=AAPL")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("error", response.get_json())
+
+
+if __name__ == "__main__":
+    unittest.main()
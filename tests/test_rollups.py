@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from benchmarks._fixtures import synthetic_bars
+from services import history
+from services.rollups import RollupCache, resample
+
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.bars = synthetic_bars(3000)
+
+    def test_matches_pandas_resample(self):
+        df = history.to_frame(self.bars)
+        df.index = pd.to_datetime(df["Date"], unit="ms")
+        agg = {
+            "Date": "first",
+            "Open": "first",
+            "High": "max",
+            "Low": "min",
+            "Close": "last",
+            "Volume": "sum",
+        }
+        for period, rule in (("1wk", "W-SUN"), ("1mo", "MS"), ("1y", "YS")):
+            expected = df.resample(rule).agg(agg).dropna().to_numpy().T
+            rollup, _ = resample(self.bars, period)
+            np.testing.assert_allclose(rollup, expected)
+
+    def test_incremental_update_matches_full(self):
+        cache = RollupCache()
+        for period in ("1wk", "1mo", "1y"):
+            cache.get("X", self.bars[:, :2000], period)
+            cache.get("X", self.bars[:, :2003], period)
+            full, _ = resample(self.bars, period)
+            np.testing.assert_array_equal(cache.get("X", self.bars, period), full)
+
+    def test_empty_history(self):
+        rollup, starts = resample(np.empty((6, 0)), "1mo")
+        self.assertEqual(rollup.shape, (6, 0))
+        self.assertEqual(len(starts), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
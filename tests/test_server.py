@@ -1,39 +1,31 @@
-import os
 import unittest
 
+from services import providers
 from utils import Currency_Conversion, get_current_stock_price
-from dotenv import load_dotenv
 
-from . import Base
+from . import Base, replay
 
 data = Base()
 
 
 class TestServer(unittest.TestCase):
+    def setUp(self):
+        replay(self)
+
     def test_stock_price(self):
-        with self.assertWarns(ResourceWarning):
-            try:
-                assert (
-                    type(get_current_stock_price(data.stock_data["stock_symbol"]))
-                    == float
-                )
-            except Exception as e:
-                return (False, str(e))
+        price = get_current_stock_price(data.stock_data["stock_symbol"])
+        self.assertEqual(type(price), float)
+        self.assertEqual(price, data.stock_data["price"])
 
     def test_currency_conversion(self):
-        load_dotenv()
-        try:
-            url = str.__add__(
-                "http://data.fixer.io/api/latest?access_key=",
-                os.getenv("FIXER_API_KEY"),
-            )
-        except Exception as e:
-            return (False, str(e))
-        c = Currency_Conversion(url)
+        # Rates of the replay provider, the tests never reach fixer.io
+        c = Currency_Conversion(rates=providers.get_provider().fx_rates()["rates"])
         from_country = "USD"
         to_country = "INR"
         amount = 100
-        assert type(c.convert(from_country, to_country, amount)) == float
+        converted = c.convert(from_country, to_country, amount)
+        self.assertEqual(type(converted), float)
+        self.assertGreater(converted, amount)
 
 
 if __name__ == "__main__":
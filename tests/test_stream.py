@@ -0,0 +1,85 @@
+import queue
+import unittest
+
+import pandas as pd
+
+from services.stream import QuoteHub, Subscription
+from utils import get_current_stock_price, quote_cache
+
+from . import replay
+
+
+class FakeQuotes:
+    """Counts upstream fetches, prices move by one every call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbols):
+        self.calls.append(sorted(symbols))
+        return pd.Series({sym: 100.0 + len(self.calls) for sym in symbols})
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        self.fetch = FakeQuotes()
+        # The poller thread is not started, ticks are driven by poll_once
+        self.hub = QuoteHub(fetch=self.fetch)
+
+    def test_fetches_each_symbol_once_per_tick(self):
+        subs = [self.hub.subscribe(["AAPL", "MSFT"]) for _ in range(100)]
+        self.fetch.calls.clear()
+        self.hub.poll_once()
+        self.assertEqual(self.fetch.calls, [["AAPL", "MSFT"]])
+        for sub in subs:
+            self.assertEqual(set(sub.get(timeout=1)), {"AAPL", "MSFT"})
+
+    def test_fan_out_only_subscribed_symbols(self):
+        aapl = self.hub.subscribe(["AAPL"])
+        msft = self.hub.subscribe(["msft"])
+        self.hub.poll_once()
+        self.assertEqual(list(aapl.get(timeout=1)), ["AAPL"])
+        self.assertEqual(list(msft.get(timeout=1)), ["MSFT"])
+
+    def test_idle_symbols_stop_being_polled(self):
+        first = self.hub.subscribe(["AAPL", "MSFT"])
+        second = self.hub.subscribe(["AAPL"])
+        self.hub.unsubscribe(first)
+        self.hub.unsubscribe(first)
+        self.assertEqual(self.hub.refcounts, {"AAPL": 1})
+        self.hub.unsubscribe(second)
+        self.fetch.calls.clear()
+        self.assertEqual(self.hub.poll_once(), {})
+        self.assertEqual(self.fetch.calls, [])
+
+    def test_unchanged_prices_are_not_sent(self):
+        sub = self.hub.subscribe(["AAPL"])
+        self.hub.poll_once()
+        sub.get(timeout=1)
+        self.hub.fetch = lambda symbols: pd.Series({"AAPL": 101.0})
+        self.hub.poll_once()
+        self.assertEqual(self.hub.poll_once(), {})
+
+    def test_ticks_bypass_the_quote_cache(self):
+        replay(self)
+        price = get_current_stock_price("AAPL")
+        quote_cache.set("AAPL", 1.0)
+        try:
+            hub = QuoteHub()
+            hub.subscribe(["AAPL"])
+            self.assertEqual(hub.poll_once(), {"AAPL": round(price, 2)})
+            self.assertEqual(quote_cache.get("AAPL"), price)
+        finally:
+            quote_cache.invalidate("AAPL")
+
+    def test_slow_client_keeps_latest_updates(self):
+        sub = Subscription(frozenset(["AAPL"]), size=2)
+        for price in (1, 2, 3):
+            sub.put({"AAPL": price})
+        self.assertEqual(sub.get(timeout=1), {"AAPL": 2})
+        self.assertEqual(sub.get(timeout=1), {"AAPL": 3})
+        self.assertRaises(queue.Empty, sub.get, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from services import providers, symbols
+
+from . import Offline
+
+
+class TestSymbols(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "symbols.json")
+        self.download = mock.Mock(return_value=["AAPL", "MSFT"])
+        for patcher in (
+            # The exchange listing is used, not the symbols of the provider
+            mock.patch.object(providers, "_provider", Offline()),
+            mock.patch.object(symbols, "download", self.download),
+            mock.patch.object(symbols, "_symbols", None),
+            mock.patch.object(symbols, "_retry_at", 0.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_loads_the_snapshot(self):
+        symbols.write_snapshot(["AAPL", "NVDA"], self.path)
+        self.assertEqual(symbols.load(self.path), frozenset(["AAPL", "NVDA"]))
+        self.download.assert_not_called()
+
+    def test_downloads_without_a_snapshot(self):
+        self.assertEqual(symbols.load(self.path), frozenset(["AAPL", "MSFT"]))
+        self.assertEqual(symbols.read_snapshot(self.path)["symbols"], ["AAPL", "MSFT"])
+        # Loaded once per process
+        symbols.load(self.path)
+        self.assertEqual(self.download.call_count, 1)
+
+    def test_snapshot_versions(self):
+        self.assertEqual(symbols.write_snapshot(["AAPL"], self.path)["version"], 1)
+        self.assertEqual(symbols.write_snapshot(["AAPL"], self.path)["version"], 2)
+
+    def test_stale_snapshot_is_refreshed_in_background(self):
+        with open(self.path, "w") as f:
+            json.dump({"fetched_at": "2021-09-19T00:00:00", "symbols": ["AAPL"]}, f)
+        with mock.patch.object(symbols, "_refresh_in_background") as refresh:
+            self.assertEqual(symbols.load(self.path), frozenset(["AAPL"]))
+        refresh.assert_called_once_with(self.path)
+        self.download.assert_not_called()
+
+    def test_failed_first_download_is_not_cached(self):
+        self.download.side_effect = ConnectionError("listing down")
+        self.assertEqual(symbols.load(self.path), frozenset())
+        self.assertIsNone(symbols._symbols)
+
+        # Lookups within the retry interval do not download again
+        self.assertEqual(symbols.load(self.path), frozenset())
+        self.assertEqual(self.download.call_count, 1)
+
+        self.download.side_effect = None
+        symbols._retry_at = 0.0
+        self.assertEqual(symbols.load(self.path), frozenset(["AAPL", "MSFT"]))
+        self.assertEqual(self.download.call_count, 2)
+        self.assertEqual(symbols.read_snapshot(self.path)["symbols"], ["AAPL", "MSFT"])
+
+
+if __name__ == "__main__":
+    unittest.main()
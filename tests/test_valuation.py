@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from services import fx, valuation
+from services.fx import FxRates
+
+RATES = {"EUR": 1.0, "USD": 1.1, "INR": 90.0}
+
+HOLDINGS = [
+    ("09/19/2021, 10:00:00", "AAPL", 150.0, 10, "a@gmail.com", 1400.0),
+    ("09/19/2021, 10:00:00", "MSFT", 300.0, 2, "a@gmail.com", 0),
+    ("09/19/2021, 10:00:00", "GONE", 10.0, 5, "a@gmail.com", 50.0),
+]
+PRICES = pd.Series({"AAPL": 160.0, "MSFT": 250.0})
+
+
+class TestValuation(unittest.TestCase):
+    def test_values_and_pnl(self):
+        portfolio = valuation.value_holdings(HOLDINGS, PRICES)
+        np.testing.assert_allclose(portfolio.value[:2], [1600.0, 500.0])
+        # MSFT has no tracked cost and is valued against its last fill
+        np.testing.assert_allclose(portfolio.pnl[:2], [200.0, -100.0])
+        self.assertEqual(portfolio.total_value, 2100.0)
+        self.assertEqual(portfolio.total_pnl, 100.0)
+        self.assertAlmostEqual(np.nansum(portfolio.weight), 100.0)
+
+    def test_unpriced_position(self):
+        position = valuation.value_holdings(HOLDINGS, PRICES).positions()[2]
+        self.assertEqual(position.symbol, "GONE")
+        self.assertIsNone(position.price)
+        self.assertIsNone(position.weight)
+
+    def test_worthless_portfolio_has_no_weights(self):
+        prices = pd.Series({"AAPL": 0.0, "MSFT": 0.0})
+        positions = valuation.value_holdings(HOLDINGS, prices).positions()
+        self.assertEqual(positions[0].value, 0.0)
+        self.assertIsNone(positions[0].weight)
+
+    def test_other_currency(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fx_rates.json")
+            with open(path, "w") as f:
+                json.dump({"fetched_at": "2021-09-19T00:00:00", "rates": RATES}, f)
+            rates = FxRates("http://localhost:1/unreachable", path=path)
+            rates.load()
+
+            usd = valuation.value_holdings(HOLDINGS, PRICES)
+            inr = valuation.value_holdings(HOLDINGS, PRICES, "INR", rates)
+        self.assertAlmostEqual(inr.total_value, usd.total_value * 90.0 / 1.1)
+        np.testing.assert_allclose(inr.weight, usd.weight)
+
+    def test_without_rates_values_in_quote_currency(self):
+        # Rates never loaded, conversions raise RatesUnavailable
+        rates = FxRates("http://localhost:1/unreachable", path="")
+        with mock.patch.object(
+            valuation, "get_current_stock_prices", return_value=PRICES
+        ), mock.patch.object(fx, "get_rates", return_value=rates):
+            portfolio = valuation.get_portfolio(HOLDINGS, "INR")
+        self.assertEqual(portfolio.currency, valuation.QUOTE_CURRENCY)
+        self.assertEqual(portfolio.total_value, 2100.0)
+
+    def test_no_holdings(self):
+        portfolio = valuation.value_holdings([], pd.Series(dtype=float))
+        self.assertEqual(len(portfolio), 0)
+        self.assertEqual(portfolio.total_value, 0)
+        self.assertEqual(portfolio.positions(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,51 @@
 import os
 
-import pynance as pn
+import numpy as np
+import pandas as pd
 import requests
-import yfinance as yf
+
+from services import metrics, providers
+from services.cache import TTLCache
+
+# Latest closing prices, shared by every quote function
+quote_cache = TTLCache(
+    maxsize=int(os.getenv("QUOTE_CACHE_SIZE", 2048)),
+    ttl=float(os.getenv("QUOTE_TTL", 60)),
+)
 
 
 class Currency_Conversion:
     """
     API Class for currency conversion
+    Rates are kept as a cross-rate matrix so a conversion is
+    one lookup and one multiplication
     """
 
     rates = {}
 
-    def __init__(self, url):
-        data = requests.get(url).json()
-        self.rates = data["rates"]
+    def __init__(self, url: str = None, rates: dict = None):
+        if rates is None:
+            with metrics.EXTERNAL_SECONDS.time("fixer"):
+                data = requests.get(url).json()
+            rates = data["rates"]
+        self.rates = rates
+        codes = sorted(rates)
+        values = np.array([rates[code] for code in codes], dtype=float)
+        self.index = {code: i for i, code in enumerate(codes)}
+        # matrix[i, j] converts one unit of codes[i] into codes[j]
+        self.matrix = values[np.newaxis, :] / values[:, np.newaxis]
+
+    def rate(self, from_currency, to_currency) -> float:
+        """Gets the exchange rate between two currencies
+
+        Args:
+            from_currency: Currency to be converted from
+            to_currency: Currency to be converted to
+
+        Returns:
+            float: Units of to_currency per unit of from_currency
+        """
+        return float(self.matrix[self.index[from_currency], self.index[to_currency]])
 
     def convert(self, from_currency, to_currency, amount) -> float:
         """Converts one currency to another
@@ -27,16 +58,26 @@ class Currency_Conversion:
         Returns:
             float: Converted amount
         """
-        initial_amount = amount
-        if from_currency != "EUR":
-            amount = amount / self.rates[from_currency]
+        return round(float(amount) * self.rate(from_currency, to_currency), 2)
+
+    def convert_many(self, from_currency, to_currency, amounts) -> np.ndarray:
+        """Converts an array of amounts from one currency to another
 
-        amount = round(amount * self.rates[to_currency], 2)
-        return amount
+        Args:
+            from_currency: Currency to be converted from
+            to_currency: Currency to be converted to
+            amounts: Array of amounts to be converted
+
+        Returns:
+            np.ndarray: Converted amounts
+        """
+        amounts = np.asarray(amounts, dtype=float)
+        return np.round(amounts * self.rate(from_currency, to_currency), 2)
 
 
 def get_current_price(symbol: str) -> float:
-    """Gets current closing price of stock using Ticker method
+    """Gets current closing price of stock from the market data provider
+    Prices are cached for QUOTE_TTL seconds
 
     Args:
         symbol: Stock Symbol
@@ -44,14 +85,20 @@ def get_current_price(symbol: str) -> float:
     Returns:
         float: Closing Stock price
     """
-    ticker = yf.Ticker(symbol)
-    todays_data = ticker.history(period="1d")
-    return float(todays_data["Close"][0])
+    symbol = symbol.upper()
+    return quote_cache.get_or_load(symbol, lambda: _quote(symbol))
+
+
+def _quote(symbol: str) -> float:
+    provider = providers.get_provider()
+    with metrics.EXTERNAL_SECONDS.time(f"{provider.name}.quote"):
+        return provider.quote(symbol)
 
 
 def get_current_stock_price(symbol: str) -> float:
     """Gets current closing price of stock
     (Substitute for init function error)
+    Prices are cached for QUOTE_TTL seconds
 
     Args:
         symbol: Stock Symbol
@@ -59,33 +106,50 @@ def get_current_stock_price(symbol: str) -> float:
     Returns:
         float: Closing Stock price
     """
-    data = pn.data.get(symbol, start=None, end=None)
-    return float(data["Close"][0])
+    return get_current_price(symbol)
+
+
+def get_current_stock_prices(symbols: list) -> pd.Series:
+    """Gets current closing prices of many stocks with one provider call
+    Prices already in the quote cache are not fetched again
+
+    Args:
+        symbols: Stock Symbols
+
+    Returns:
+        pd.Series: Closing Stock prices indexed by symbol (NaN if unavailable)
+    """
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    cached = [quote_cache.get(symbol) for symbol in symbols]
+    missing = [symbol for symbol, price in zip(symbols, cached) if price is None]
+    # Built in one go, setting cached prices one by one is slow for big portfolios
+    prices = pd.Series(
+        [float("nan") if price is None else price for price in cached],
+        index=pd.Index(symbols, dtype=object),
+        dtype=float,
+    )
+
+    if missing:
+        latest = refresh_stock_prices(missing)
+        prices[latest.index] = latest.to_numpy(dtype=float)
+
+    return prices
 
 
-def send_mail(email: str, subject: str, body: str) -> None:
-    """Sends mail for resetting password to the user
+def refresh_stock_prices(symbols: list) -> pd.Series:
+    """Fetches current closing prices of many stocks with one provider call,
+    bypassing the quote cache, and stores them in the cache
 
     Args:
-        path: Database path
-        email: User email id
+        symbols: Stock Symbols
 
     Returns:
-        None
+        pd.Series: Closing Stock prices indexed by symbol (NaN if unavailable)
     """
-    MAILGUN_EMAIL = os.getenv("MAILGUN_EMAIL")
-    MAILGUN_PASSWD = os.getenv("MAILGUN_PASSWD")
-
-    try:
-        requests.post(
-            f"https://api.mailgun.net/v3/{MAILGUN_EMAIL}.mailgun.org/messages",
-            data={
-                "from": f"Mailgun Sandbox <postmaster@{MAILGUN_EMAIL}.mailgun.org>",
-                "to": email,
-                "subject": subject,
-                "text": body,
-            },
-            auth=("api", MAILGUN_PASSWD),
-        )
-    except:
-        print("Error Sending Mail")
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    provider = providers.get_provider()
+    with metrics.EXTERNAL_SECONDS.time(f"{provider.name}.quotes"):
+        latest = provider.quotes(symbols).reindex(symbols)
+    for symbol, price in latest.dropna().items():
+        quote_cache.set(symbol, float(price))
+    return latest